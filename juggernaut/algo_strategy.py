@@ -4,12 +4,17 @@ import math
 import warnings
 from sys import maxsize
 import json
+import os
 from collections import deque
 
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
-        seed = random.randrange(maxsize)
+        # run_arena.py passes the seed of a game in ALGO_SEED, so games can be replayed with the same seeds
+        try:
+            seed = int(os.environ["ALGO_SEED"])
+        except (KeyError, ValueError):
+            seed = random.randrange(maxsize)
         random.seed(seed)
         self.lastRoundEnemyHealth = 30
         self.side = 'right'
@@ -1,7 +1,12 @@
-import json
+import time
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .message import GameMessage, load_message, CONFIG, TURN, ACTION_FRAME, END
+from .planner import BackgroundPlanner
+from .profiling import Profiler
+from .timing import TurnTimer, DEFAULT_TURN_LIMIT, set_turn_timer, submit
+from .world_model import WorldModel
+from .util import get_command, debug_write, BANNER_TEXT
 
 class AlgoCore(object):
     """
@@ -10,10 +15,104 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * turn_timer (:obj: TurnTimer): The timer of the current turn, started when the turn message is received
+        * turn_timings (list): For each turn played, a dict with its turn number, elapsed and budget time in seconds,
+          whether the fallback turn was used, and engine_time, the time in milliseconds reported by the engine, once known
+        * world_model (:obj: WorldModel): The model kept up to date with the action frames, None until enable_world_model is called
 
     """
+    # Every action frame is passed on until subscribe_action_frames is called
+    __frame_events = ()
+    __frame_interval = None
+    __last_frame = False
+    __all_frames = True
+    __planner = None
+    __turn_budget = None
+    __fallback_margin = None
+    __profiler = None
+    __profile_path = None
+
     def __init__(self):
         self.config = None
+        self.turn_timer = None
+        self.turn_timings = []
+        self.world_model = None
+
+    def subscribe_action_frames(self, events=None, every=None, last_frame=False):
+        """
+        Chooses which action frames are passed to on_action_frame. By default, every frame is. \n
+        When any option is given, a frame is passed on if it matches at least one of them, and
+        the other frames are read from the engine without being decoded.
+        Call it from your algo's __init__ or on_game_start.
+
+        Args:
+            events: Names of event lists, such as ["breach", "death"]. Frames where any of them is not empty are passed on
+            every: Pass on one frame out of every this many, starting with the first frame of each action phase
+            last_frame: Pass on the last frame of each action phase, just before the next on_turn
+        """
+        self.__frame_events = tuple(events) if events else ()
+        self.__frame_interval = every if every and every > 0 else None
+        self.__last_frame = last_frame
+        self.__all_frames = not (self.__frame_events or self.__frame_interval or last_frame)
+
+    def configure_turn_timer(self, budget=None, fallback_margin=None):
+        """
+        Sets up the timer started at the beginning of each turn. \n
+        By default, turns are timed against waitTimeBotSoft from the config and nothing is submitted automatically.
+
+        Args:
+            budget: The time allowed for each turn in seconds, None to use waitTimeBotSoft
+            fallback_margin: If given, the turn registered with turn_timer.set_fallback, or an empty turn, is
+                submitted this many seconds before the deadline if on_turn has not submitted by then
+        """
+        self.__turn_budget = budget
+        self.__fallback_margin = fallback_margin
+
+    def enable_profiling(self, path=None):
+        """
+        Counts and times calls to the main GameState functions, grouped by turn, and writes
+        a summary when the game ends. Profiling has no cost until this is called.
+
+        Args:
+            path: The file to write the summary to, None to write it to the debug output
+
+        Returns:
+            The Profiler collecting the calls
+        """
+        if self.__profiler is None:
+            self.__profiler = Profiler()
+            self.__profiler.enable()
+        self.__profile_path = path
+        return self.__profiler
+
+    def __start_turn_timer(self, message, received):
+        budget = self.__turn_budget
+        if budget is None:
+            timing = (self.config or {}).get("timingAndReplay", {})
+            budget = timing.get("waitTimeBotSoft", DEFAULT_TURN_LIMIT) / 1000
+        turn_number = message.turn_info[1] if len(message.turn_info) > 1 else -1
+        self.turn_timer = TurnTimer(turn_number, budget, self.__fallback_margin, received)
+        set_turn_timer(self.turn_timer)
+
+    def __finish_turn_timer(self, message):
+        timer = self.turn_timer
+        timer.finish()
+        self.turn_timings.append({"turn": timer.turn_number, "elapsed": timer.submitted_at - timer.started,
+            "budget": timer.budget, "used_fallback": timer.used_fallback, "engine_time": None})
+        if len(self.turn_timings) > 1:
+            # Each turn message holds the time the engine measured for the previous turn
+            try:
+                self.turn_timings[-2]["engine_time"] = float(load_message(message)["p1Stats"][3])
+            except (ValueError, KeyError, IndexError, TypeError):
+                pass
+
+    def __wants_action_frame(self, message):
+        if self.__all_frames:
+            return True
+        if self.__frame_interval is not None and message.turn_info is not None and len(message.turn_info) > 2:
+            if message.turn_info[2] % self.__frame_interval == 0:
+                return True
+        return bool(self.__frame_events) and message.has_events(self.__frame_events)
 
     def on_game_start(self, config):
         """
@@ -27,12 +126,12 @@ class AlgoCore(object):
         """
         This step function is called at the start of each turn.
         It is passed the current game state, which can be used to initiate a new GameState object. 
+        The game state is a GameMessage: a string that decodes its JSON once and shares it with GameState.
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
         """
-        send_command("[]")
-        send_command("[]")
+        submit("[]", "[]")
     
     def on_action_frame(self, action_frame_game_state):
         """
@@ -40,10 +139,72 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        Each frame is a GameMessage, use load_message or its data attribute to decode it only once.
         """
         pass
 
 
+    def enable_world_model(self):
+        """
+        Keeps a WorldModel up to date with every action frame, whether or not it is passed to on_action_frame.
+        Call it from on_game_start, after the config is set. \n
+        In on_turn, use self.world_model.start_turn(turn_state) in place of GameState(self.config, turn_state)
+        to get the game state from the model, which only rebuilds the locations the action frames got wrong.
+
+        Returns:
+            The WorldModel
+        """
+        if self.world_model is None:
+            self.world_model = WorldModel(self.config)
+        return self.world_model
+
+    def start_planning(self, function, *args):
+        """
+        Runs a planning function in a background thread, usually started right after submitting a turn
+        so that it can work while the engine plays out the action phase. \n
+        The function is called as function(planner, *args) with a BackgroundPlanner, which it can use to
+        read the action frames as they arrive. Any planner still running is cancelled.
+
+        Args:
+            function: The planning function. Its return value is returned by collect_planning
+            args: Extra arguments for the function. Pass copies, such as a GameState.fork, not objects the algo keeps using
+
+        Returns:
+            The BackgroundPlanner running the function
+        """
+        self.cancel_planning()
+        self.__planner = BackgroundPlanner(function, *args)
+        self.__planner.start()
+        return self.__planner
+
+    def collect_planning(self, timeout=0):
+        """
+        Gets the result of the planning function started with start_planning, usually at the start of on_turn.
+        If the function has not returned within the timeout, it is cancelled.
+
+        Args:
+            timeout: The longest time to wait for the function to return, in seconds
+
+        Returns:
+            The value returned by the planning function, or None if there is none
+        """
+        planner = self.__planner
+        if planner is None:
+            return None
+        self.__planner = None
+        result = planner.collect(timeout)
+        if not planner.done:
+            planner.cancel()
+        return result
+
+    def cancel_planning(self):
+        """
+        Cancels the planning function started with start_planning, if any
+        """
+        if self.__planner is not None:
+            self.__planner.cancel()
+            self.__planner = None
+
     def start(self):
         """ 
         Start the parsing loop.
@@ -52,42 +213,69 @@ class AlgoCore(object):
         The algo continues this loop until it recieves the "End" turn message from the game.
         """
         debug_write(BANNER_TEXT)
+        # The latest frame that was not passed on, kept in case it turns out to be the last one
+        pending_frame = None
 
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
-            game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            line = get_command()
+            received = time.monotonic()
+            game_state_string = GameMessage(line)
+            message_type = game_state_string.message_type
+            if message_type == ACTION_FRAME:
+                if self.__planner is not None:
+                    self.__planner.feed(game_state_string)
+            elif self.__planner is not None:
+                self.__planner.end_of_frames()
+            if pending_frame is not None and message_type != ACTION_FRAME:
+                self.on_action_frame(pending_frame)
+                pending_frame = None
+            if message_type == CONFIG:
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
-                    """
-                    This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
-                    deploy phase. Printing is handled by the provided functions.
-                    """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
+                self.on_game_start(game_state_string.data)
+            elif message_type == TURN:
+                """
+                This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
+                deploy phase. Printing is handled by the provided functions.
+                """
+                self.__start_turn_timer(game_state_string, received)
+                if self.__profiler is not None:
+                    self.__profiler.start_turn(self.turn_timer.turn_number)
+                self.on_turn(game_state_string)
+                if self.__profiler is not None:
+                    self.__profiler.end_turn()
+                self.__finish_turn_timer(game_state_string)
+            elif message_type == ACTION_FRAME:
+                """
+                If stateType == 1, this game_state_string string represents a single frame of an action phase
+                """
+                if self.world_model is not None:
+                    self.world_model.apply_frame(game_state_string)
+                if self.__wants_action_frame(game_state_string):
                     self.on_action_frame(game_state_string)
-                elif stateType == 2:
-                    """
-                    This is the end game message. This means the game is over so break and finish the program.
-                    """
-                    debug_write("Got end state, game over. Stopping algo.")
-                    break
-                else:
-                    """
-                    Something is wrong? Received an incorrect or improperly formatted string.
-                    """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                    pending_frame = None
+                elif self.__last_frame:
+                    pending_frame = game_state_string
+            elif message_type == END:
+                """
+                This is the end game message. This means the game is over so break and finish the program.
+                """
+                debug_write("Got end state, game over. Stopping algo.")
+                self.cancel_planning()
+                set_turn_timer(None)
+                if self.__profiler is not None:
+                    self.__profiler.write_summary(self.__profile_path)
+                    self.__profiler.disable()
+                    self.__profiler = None
+                break
+            elif game_state_string.turn_info is not None:
+                """
+                Something is wrong? Received an incorrect or improperly formatted string.
+                """
+                debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
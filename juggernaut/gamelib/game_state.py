@@ -3,9 +3,16 @@ import json
 import sys
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .threat_map import ThreatMap
+from .util import debug_write
+from .message import load_message
+from .timing import submit
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, EDGE_LOCATIONS, EDGE_LOCATION_SETS, BOTTOM_LEFT, BOTTOM_RIGHT
+
+# The number of distance fields find_path_to_edge keeps before starting over
+PATH_CACHE_SIZE = 64
+FRIENDLY_EDGE_LOCATIONS = EDGE_LOCATION_SETS[BOTTOM_LEFT] | EDGE_LOCATION_SETS[BOTTOM_RIGHT]
 
 def is_stationary(unit_type):
     """
@@ -52,7 +59,8 @@ class GameState:
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              A GameMessage is only decoded once, however many GameStates are created from it.
 
         """
         self.serialized_string = serialized_string
@@ -91,6 +99,9 @@ class GameState:
 
         self.game_map = GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
+        self._path_cache = {}
+        self._threat_map = None
+        self._checkpoints = []
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
@@ -103,8 +114,19 @@ class GameState:
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
         state_line is the game state as a json string.
         """
-        state = json.loads(state_line)
+        state = load_message(state_line)
+        self._parse_stats(state)
+
+        p1units = state["p1Units"]
+        p2units = state["p2Units"]
 
+        self.__create_parsed_units(p1units, 0)
+        self.__create_parsed_units(p2units, 1)
+
+    def _parse_stats(self, state):
+        """
+        Reads the turn number, health, time and resources of both players from a decoded game state.
+        """
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
 
@@ -120,12 +142,6 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
-
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
-
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -145,9 +161,10 @@ class GameState:
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].upgrade()
+                        self.game_map.refresh_location([x,y])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map.place_unit(unit)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -174,11 +191,54 @@ class GameState:
     def submit_turn(self):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            A turn is only sent once, later calls during the same turn do nothing.
         """
         build_string = json.dumps(self._build_stack)
         deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        if not submit(build_string, deploy_string):
+            self.warn("This turn was already submitted, possibly by the turn timer's fallback. Ignoring submit_turn")
+
+    def fork(self):
+        """Creates an independent copy of the game state, for trying out hypothetical moves
+
+        The copy shares the config and pathing caches with this game state, and its map is a
+        GameMap.fork of this one, so forking costs a small fraction of a deep copy. Spawns,
+        upgrades and removals on the copy do not affect this game state or the turn you submit.
+
+        Returns:
+            A new GameState with the same map, resources and pending moves as this one
+
+        """
+        forked = GameState.__new__(GameState)
+        forked.__dict__.update(self.__dict__)
+        forked.game_map = self.game_map.fork()
+        forked._threat_map = None
+        forked._build_stack = list(self._build_stack)
+        forked._deploy_stack = list(self._deploy_stack)
+        forked._player_resources = [dict(resources) for resources in self._player_resources]
+        forked._checkpoints = []
+        return forked
+
+    def checkpoint(self):
+        """Saves the map, resources and pending moves so that rollback can return to them.
+        Checkpoints can be nested, each rollback returns to the most recent one.
+        """
+        self._checkpoints.append((list(self._build_stack), list(self._deploy_stack),
+            [dict(resources) for resources in self._player_resources], self.my_health, self.enemy_health))
+        self.game_map.checkpoint()
+
+    def rollback(self):
+        """Undoes every change made since the most recent checkpoint, and removes that checkpoint
+
+        Returns:
+            True if the game state was rolled back, False if there was no checkpoint
+
+        """
+        if not self._checkpoints:
+            self.warn("Called rollback without a checkpoint to return to")
+            return False
+        self._build_stack, self._deploy_stack, self._player_resources, self.my_health, self.enemy_health = self._checkpoints.pop()
+        return self.game_map.rollback()
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -333,7 +393,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = tuple(location) in FRIENDLY_EDGE_LOCATIONS
 
         if self.enable_warnings:
             fail_reason = ""
@@ -373,23 +433,75 @@ class GameState:
       
         if type(locations[0]) == int:
             locations = [locations]
-        spawned_units = 0
-        for location in locations:
-            for i in range(num):
-                if self.can_spawn(unit_type, location, 1):
-                    x, y = map(int, location)
-                    costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
-                    self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
-                    else:
-                        self._deploy_stack.append((unit_type, x, y))
-                    spawned_units += 1
-                else:
-                    break
-        return spawned_units
+        results = self.attempt_spawn_batch([(unit_type, location, num) for location in locations])
+        return sum(spawned for spawned, _ in results)
+
+    def attempt_spawn_batch(self, requests):
+        """Attempts to spawn several groups of units, checking and paying for each group at once.
+
+        Each request is handled like attempt_spawn would handle it for a single location, in order,
+        so earlier requests are paid for first. Instead of trying units one at a time, the number
+        of units that can be spawned is worked out from the location and the resources left.
+
+        Args:
+            requests: A list of (unit_type, location, num) tuples
+
+        Returns:
+            A list with a (spawned, reason) tuple for each request, where spawned is the number of units
+            spawned and reason explains why fewer than num were spawned, or is None if they all were
+
+        """
+        results = []
+        for unit_type, location, num in requests:
+            if unit_type not in ALL_UNITS:
+                self._invalid_unit(unit_type)
+                results.append((0, "Invalid unit."))
+                continue
+            if num < 1:
+                self.warn("Attempted to spawn fewer than one units! ({})".format(num))
+                results.append((0, "Fewer than one unit requested."))
+                continue
+            if not self.game_map.in_arena_bounds(location):
+                self.warn("Could not spawn {} at location {}. Location invalid.".format(unit_type, location))
+                results.append((0, "Location invalid."))
+                continue
+
+            x, y = map(int, location)
+            stationary = is_stationary(unit_type)
+            affordable = self.number_affordable(unit_type)
+            fail_reason = ""
+            if self.game_map.get_structure([x, y]) is not None or (stationary and len(self.game_map[x, y]) > 0):
+                fail_reason = fail_reason + " Location is blocked."
+            if not y < self.HALF_ARENA:
+                fail_reason = fail_reason + " Location in enemy territory."
+            if not (stationary or (x, y) in FRIENDLY_EDGE_LOCATIONS):
+                fail_reason = fail_reason + " Information units must be deployed on the edge."
+
+            if fail_reason:
+                spawned = 0
+                if affordable < 1:
+                    fail_reason = " Not enough resources." + fail_reason
+            else:
+                # A structure blocks its own location, so at most one can be spawned
+                spawned = min(1 if stationary else num, affordable)
+                if spawned < num:
+                    if affordable - spawned < 1:
+                        fail_reason = fail_reason + " Not enough resources."
+                    if stationary and spawned > 0:
+                        fail_reason = fail_reason + " Location is blocked."
+
+            if spawned > 0:
+                costs = self.type_cost(unit_type)
+                self.__set_resource(SP, 0 - costs[SP] * spawned)
+                self.__set_resource(MP, 0 - costs[MP] * spawned)
+                for _ in range(spawned):
+                    self.game_map.add_unit(unit_type, [x, y], 0)
+                stack = self._build_stack if stationary else self._deploy_stack
+                stack.extend([(unit_type, x, y)] * spawned)
+            if fail_reason:
+                self.warn("Could not spawn {} at location {}.{}".format(unit_type, location, fail_reason))
+            results.append((spawned, fail_reason.strip() or None))
+        return results
 
     def attempt_remove(self, locations):
         """Attempts to remove existing friendly structures in the given locations.
@@ -446,6 +558,7 @@ class GameState:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
                         existing_unit.upgrade()
+                        self.game_map.refresh_location([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -495,8 +608,60 @@ class GameState:
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
-        end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        field = self._get_distance_field(target_edge)
+        return self._shortest_path_finder.navigate_distance_field(start_location, field)
+
+    def find_paths_to_edges(self, start_locations=None, target_edge=None):
+        """Gets the paths units would take from many starting locations at once.
+        Each target edge is searched only once, then every path is walked from the shared result,
+        so this is much faster than calling find_path_to_edge for every location.
+
+        Args:
+            start_locations: A list of locations of hypothetical units. Defaults to all of our edge locations, BOTTOM_LEFT then BOTTOM_RIGHT
+            target_edge: The edge the units want to reach. Induced from each start location if None.
+
+        Returns:
+            A list with one dict per start location, in the same order, with the keys
+                * location: The start location
+                * path: The path the unit would take, as returned by find_path_to_edge, or None if the location is blocked
+                * length: The number of moves in the path, or None if the location is blocked
+                * end_point: The last location of the path, or None if the location is blocked
+                * self_destructs: True if the path ends before reaching the target edge
+
+        """
+        if start_locations is None:
+            start_locations = [list(location) for location in EDGE_LOCATIONS[BOTTOM_LEFT] + EDGE_LOCATIONS[BOTTOM_RIGHT]]
+
+        results = []
+        for location in start_locations:
+            result = {'location': location, 'path': None, 'length': None, 'end_point': None, 'self_destructs': False}
+            results.append(result)
+            if not self.game_map.in_arena_bounds(location) or self.contains_stationary_unit(location):
+                continue
+
+            edge = self.get_target_edge(location) if target_edge is None else target_edge
+            path = self._shortest_path_finder.navigate_distance_field(location, self._get_distance_field(edge))
+            result['path'] = path
+            result['length'] = len(path) - 1
+            result['end_point'] = path[-1]
+            result['self_destructs'] = tuple(path[-1]) not in EDGE_LOCATION_SETS[edge]
+        return results
+
+    def _get_distance_field(self, target_edge):
+        """
+        Gets the validated pathlengths towards an edge for the current board.
+        Fields are cached by the board's blocking signature, so they are reused until a structure
+        is added to or removed from the map, and reused again if the board returns to that state.
+        """
+        key = (self.game_map.get_blocking_signature(), target_edge)
+        field = self._path_cache.get(key)
+        if field is None:
+            if len(self._path_cache) >= PATH_CACHE_SIZE:
+                self._path_cache.clear()
+            end_points = self.game_map.get_edge_locations(target_edge)
+            field = self._shortest_path_finder.get_distance_field(end_points, key[0])
+            self._path_cache[key] = field
+        return field
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -512,10 +677,8 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
-        for unit in self.game_map[x,y]:
-            if unit.stationary:
-                return unit
-        return False
+        unit = self.game_map.get_structure([x, y])
+        return unit if unit is not None else False
 
     def warn(self, message):
         """ Used internally by game_state to print warnings
@@ -614,6 +777,20 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_threat_map(self):
+        """Gets the ThreatMap for the current map, building it the first time it is needed.
+        The threat map stays up to date as units are spawned, upgraded or added to and removed from the map.
+
+        Returns:
+            A ThreatMap holding, for each player and tile, the enemy units attacking it and the damage they deal per frame
+
+        """
+        if self._threat_map is None or self._threat_map.game_map is not self.game_map:
+            if self._threat_map is not None:
+                self._threat_map.detach()
+            self._threat_map = ThreatMap(self.game_map)
+        return self._threat_map
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
@@ -630,6 +807,8 @@ class GameState:
             self._invalid_player_index(player_index)
         if not self.game_map.in_arena_bounds(location):
             self.warn("Location {} is not in the arena bounds.".format(location))
+        elif player_index == 0 or player_index == 1:
+            return self.get_threat_map().get_attackers(location, player_index)
 
         attackers = []
         """
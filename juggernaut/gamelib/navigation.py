@@ -1,24 +1,51 @@
-import heapq
-import math
 import sys
-import queue
+from array import array
+from collections import deque
+from .game_map import ARENA_SIZE, HALF_ARENA, IN_ARENA
 from .util import debug_write
 
-class Node:
-    """A pathfinding node
+# Pathfinding works on grid indices, x * ARENA_SIZE + y, so that every per-tile
+# buffer is a flat array and neighbors can be looked up in a precomputed table.
+NUM_GRID_TILES = ARENA_SIZE * ARENA_SIZE
+# The x and y coordinate of each grid index
+GRID_X = tuple(index // ARENA_SIZE for index in range(NUM_GRID_TILES))
+GRID_Y = tuple(index % ARENA_SIZE for index in range(NUM_GRID_TILES))
+
+def _in_arena_neighbors(x, y):
+    neighbors = []
+    # Units consider their neighbors in the order up, down, right, left
+    for nx, ny in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+        if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_ARENA[nx * ARENA_SIZE + ny]:
+            neighbors.append(nx * ARENA_SIZE + ny)
+    return tuple(neighbors)
+
+# The in bounds neighbors of each grid index
+NEIGHBORS = tuple(_in_arena_neighbors(GRID_X[index], GRID_Y[index]) for index in range(NUM_GRID_TILES))
+
+_UNVISITED = array('i', [-1]) * NUM_GRID_TILES
+
+
+class DistanceField:
+    """The validated pathlengths towards a set of end points on a given board
+
+    Because every tile has a different idealness, the tile a unit self destructs at only
+    depends on the pocket of open tiles it starts in, so results for units that can't
+    reach the edge are shared by every starting location in the same pocket.
 
     Attributes :
-        * visited_idealness (bool): Have we visited this node during the idealness search step?
-        * visited_validate (bool): Have we visited this node during the validation step?
-        * blocked (bool): Is there a structures at this node's location
-        * pathlength: The distance between this node and the target location
+        * blocked (bytes): The blocking signature of the board the field was computed for
+        * edge_pathlength (array): For each grid index, the distance to the end points, or -1 if they can't be reached
+        * ideal_tiles (dict): Maps grid indices that can't reach the end points to their self destruct tile
+        * self_destruct_pathlengths (dict): Maps self destruct tiles to the pathlengths towards them
 
     """
-    def __init__(self):
-        self.visited_idealness = False
-        self.visited_validate = False
-        self.blocked = False
-        self.pathlength = -1
+    def __init__(self, blocked, targets):
+        self.blocked = blocked
+        self.targets = targets
+        self.edge_pathlength = array('i', _UNVISITED)
+        self.ideal_tiles = {}
+        self.self_destruct_pathlengths = {}
+
 
 """
 This class helps with pathfinding. We guarantee the results will
@@ -28,18 +55,25 @@ code to maximise time efficiency
 class ShortestPathFinder:
     """Handles pathfinding
 
+    The finder keeps its buffers between calls, so a single instance can be reused
+    for every path computed during a turn without allocating a node per tile.
+
     Attributes :
         * HORIZONTAL (int): A constant representing a horizontal movement
         * VERTICAL (int): A constant representing a vertical movement
 
-        * game_state (:obj: GameState): The current gamestate
-        * game_map (:obj: GameMap): The current gamemap
+        * game_state (:obj: GameState): The gamestate the finder was last initialized with
 
     """
     def __init__(self):
         self.HORIZONTAL = 1
         self.VERTICAL = 2
         self.initialized = False
+        self.game_state = None
+        self._blocked = bytes(NUM_GRID_TILES)
+        self._visited = bytearray(NUM_GRID_TILES)
+        self._pathlength = array('i', _UNVISITED)
+        self._targets = {}
 
     def initialize_map(self, game_state):
         """Initializes the map
@@ -47,10 +81,10 @@ class ShortestPathFinder:
         Args:
             game_state: A GameState object representing the gamestate we want to traverse
         """
-        #Initialize map 
         self.initialized = True
         self.game_state = game_state
-        self.game_map = [[Node() for x in range(self.game_state.ARENA_SIZE)] for y in range(self.game_state.ARENA_SIZE)]
+        self._blocked = game_state.game_map.get_blocking_signature()
+        self._pathlength[:] = _UNVISITED
 
     def navigate_multiple_endpoints(self, start_point, end_points, game_state):
         """Finds the path a unit would take to reach a set of endpoints
@@ -68,58 +102,140 @@ class ShortestPathFinder:
         if game_state.contains_stationary_unit(start_point):
             return
 
-        #Initialize map 
         self.initialize_map(game_state)
-        #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
-        #Do pathfinding
-        ideal_endpoints = self._idealness_search(start_point, end_points)
-        self._validate(ideal_endpoints, end_points)
-        return self._get_path(start_point, end_points)
-
-    def _idealness_search(self, start, end_points):
+        targets = self._get_targets(end_points)
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        ideal_tile = self._idealness_search(start, targets)
+        self._validate(ideal_tile, targets)
+        return self._get_path(start_point, targets)
+
+    def get_distance_field(self, end_points, blocking_signature):
+        """Validates the pathlengths towards a set of endpoints once, so that paths from
+        any number of starting locations can be extracted from it with navigate_distance_field
+
+        Args:
+            * end_points: The end points of the units, should be a list of edge locations
+            * blocking_signature: The blocked tiles of the board, from GameMap.get_blocking_signature
+
+        Returns:
+            A DistanceField for the given end points and board
+
+        """
+        field = DistanceField(blocking_signature, self._get_targets(end_points))
+        self._blocked = blocking_signature
+        # Validating from any end point seeds all of them, as when the edge is the ideal tile
+        self._validate(field.targets[0][0], field.targets, field.edge_pathlength)
+        return field
+
+    def navigate_distance_field(self, start_point, field):
+        """Finds the path a unit would take using a precomputed DistanceField
+
+        Args:
+            * start_point: The starting location of the unit, which must not be blocked
+            * field: A DistanceField from get_distance_field
+
+        Returns:
+            The same path navigate_multiple_endpoints would return for the board and end points of the field
+
+        """
+        self._blocked = field.blocked
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        return self._get_path(start_point, field.targets, self._get_field_pathlength(start, field))
+
+    def get_next_move(self, start, previous_move_direction, field):
+        """Finds the single step a unit would take next, for callers that move units one tile at a time
+
+        Args:
+            * start: The grid index (x * ARENA_SIZE + y) of the unit, which must not be blocked
+            * previous_move_direction: The direction of the unit's last move, HORIZONTAL, VERTICAL or 0 if it has not moved yet
+            * field: A DistanceField from get_distance_field
+
+        Returns:
+            The grid index of the next tile, or start if the unit has reached its edge or self destruct tile
+
         """
-        Finds the most ideal tile in our 'pocket' of pathable space. 
+        self._blocked = field.blocked
+        pathlength = self._get_field_pathlength(start, field)
+        if pathlength[start] == 0:
+            return start
+        return self._choose_next_move(start, previous_move_direction, field.targets[3], pathlength)
+
+    def _get_field_pathlength(self, start, field):
+        """Gets the pathlengths a unit at start follows, towards the edge or its self destruct tile
+
+        """
+        if field.edge_pathlength[start] != -1:
+            return field.edge_pathlength
+
+        # The edge can't be reached, so the unit self destructs at the most ideal tile of its pocket
+        ideal_tile = field.ideal_tiles.get(start)
+        if ideal_tile is None:
+            ideal_tile = self._idealness_search(start, field.targets)
+            for index in range(NUM_GRID_TILES):
+                if self._visited[index]:
+                    field.ideal_tiles[index] = ideal_tile
+        pathlength = field.self_destruct_pathlengths.get(ideal_tile)
+        if pathlength is None:
+            pathlength = self._validate(ideal_tile, field.targets, array('i', _UNVISITED))
+            field.self_destruct_pathlengths[ideal_tile] = pathlength
+        return pathlength
+
+    def _get_targets(self, end_points):
+        """Gets the grid indices, idealness of every tile and direction for a set of end points.
+        These only depend on the end points, so they are computed once and reused.
+        """
+        key = tuple((int(x), int(y)) for x, y in end_points)
+        targets = self._targets.get(key)
+        if targets is None:
+            end_indices = tuple(x * ARENA_SIZE + y for x, y in key)
+            direction = self._get_direction_from_endpoints(end_points)
+            idealness = [self._get_idealness_for_direction(GRID_X[index], GRID_Y[index], direction) for index in range(NUM_GRID_TILES)]
+            for index in end_indices:
+                idealness[index] = sys.maxsize
+            targets = (end_indices, frozenset(end_indices), idealness, direction)
+            self._targets[key] = targets
+        return targets
+
+    def _idealness_search(self, start, targets):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space.
         The edge if it is available, or the best self destruct location otherwise
         """
-        current = queue.Queue()
-        current.put(start)
-        best_idealness = self._get_idealness(start, end_points)
-        self.game_map[start[0]][start[1]].visited_idealness = True
-        most_ideal = start
+        blocked = self._blocked
+        visited = self._visited
+        visited[:] = bytes(NUM_GRID_TILES)
+        idealness = targets[2]
 
-        while not current.empty():
-            search_location = current.get()
-            for neighbor in self._get_neighbors(search_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        visited[start] = 1
+        best_idealness = idealness[start]
+        most_ideal = start
+        if best_idealness == sys.maxsize:
+            return most_ideal
+
+        current = deque([start])
+        while current:
+            search_location = current.popleft()
+            for neighbor in NEIGHBORS[search_location]:
+                if blocked[neighbor] or visited[neighbor]:
                     continue
+                visited[neighbor] = 1
 
-                x, y = neighbor
-                current_idealness = self._get_idealness(neighbor, end_points)
-
+                current_idealness = idealness[neighbor]
                 if current_idealness > best_idealness:
                     best_idealness = current_idealness
                     most_ideal = neighbor
-
-                if not self.game_map[x][y].visited_idealness and not self.game_map[x][y].blocked:
-                    self.game_map[x][y].visited_idealness = True
-                    current.put(neighbor)
+                    # Nothing beats reaching the edge, and ties keep the first tile found
+                    if best_idealness == sys.maxsize:
+                        return most_ideal
+                current.append(neighbor)
 
         return most_ideal
 
-    def _get_neighbors(self, location):
-        """Get the locations adjacent to a location
-        """
-        x, y = location
-        return [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]
-
     def _get_direction_from_endpoints(self, end_points):
-        """Prints a message to the games debug output
+        """Gets the direction of an edge
 
         Args:
-            * end_points: A set of endpoints, should be an edge 
+            * end_points: A set of endpoints, should be an edge
 
         Returns:
             A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
@@ -128,163 +244,131 @@ class ShortestPathFinder:
         point = end_points[0]
         x, y = point
         direction = [1, 1]
-        if x < self.game_state.HALF_ARENA:
+        if x < HALF_ARENA:
            direction[0] = -1
-        if y < self.game_state.HALF_ARENA:
+        if y < HALF_ARENA:
             direction[1] = -1
         return direction
 
-    def _get_idealness(self, location, end_points):
-        """Get the idealness of a tile, the reachable tile the unit most wants to path to.
-        Better self destruct locations are more ideal. The endpoints are perfectly ideal. 
-
-        Returns:
-            A location the unit will attempt to reach
+    def _get_idealness_for_direction(self, x, y, direction):
+        """Get the idealness of a tile that is not an end point.
+        Better self destruct locations are more ideal.
         """
-        if location in end_points:
-            return sys.maxsize
-
-        direction = self._get_direction_from_endpoints(end_points)
-
         idealness = 0
         if direction[1] == 1:
-            idealness += 28 * location[1]
-        else: 
-            idealness += 28 * (27 - location[1])
+            idealness += 28 * y
+        else:
+            idealness += 28 * (27 - y)
         if direction[0] == 1:
-            idealness += location[0]
-        else: 
-            idealness += (27 - location[0])
+            idealness += x
+        else:
+            idealness += (27 - x)
 
         return idealness
 
-    def _validate(self, ideal_tile, end_points):
-        """Breadth first search of the grid, setting the pathlengths of each node
+    def _validate(self, ideal_tile, targets, pathlength=None):
+        """Breadth first search of the grid, setting the pathlengths of each tile
 
         """
-        #VALDIATION
+        blocked = self._blocked
+        if pathlength is None:
+            pathlength = self._pathlength
+        pathlength[:] = _UNVISITED
+
         #Add our most ideal tiles to current
-        current = queue.Queue()
-        if ideal_tile in end_points:
-            for location in end_points:
-               current.put(location)
-               #Set current pathlength to 0
-               self.game_map[location[0]][location[1]].pathlength = 0
-               self.game_map[location[0]][location[1]].visited_validate = True
+        end_indices, end_set = targets[0], targets[1]
+        if ideal_tile in end_set:
+            current = deque(end_indices)
+            for index in end_indices:
+                pathlength[index] = 0
         else:
-            current.put(ideal_tile)
-            self.game_map[ideal_tile[0]][ideal_tile[1]].pathlength = 0
-            self.game_map[ideal_tile[0]][ideal_tile[1]].visited_validate = True
-
-        #While current is not empty
-        while not current.empty():
-            current_location = current.get()
-            current_node = self.game_map[current_location[0]][current_location[1]]
-            for neighbor in self._get_neighbors(current_location):
-                if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
-                    continue
+            current = deque([ideal_tile])
+            pathlength[ideal_tile] = 0
 
-                neighbor_node = self.game_map[neighbor[0]][neighbor[1]]
-                if not neighbor_node.visited_validate and not current_node.blocked:
-                    neighbor_node.pathlength = current_node.pathlength + 1
-                    neighbor_node.visited_validate = True
-                    current.put(neighbor)
-
-        #debug_write("Print after validate")
-        #self.print_map()
-        return
+        while current:
+            current_location = current.popleft()
+            if blocked[current_location]:
+                continue
+            next_pathlength = pathlength[current_location] + 1
+            for neighbor in NEIGHBORS[current_location]:
+                if blocked[neighbor] or pathlength[neighbor] != -1:
+                    continue
+                pathlength[neighbor] = next_pathlength
+                current.append(neighbor)
+        return pathlength
 
-    def _get_path(self, start_point, end_points):
-        """Once all nodes are validated, and a target is found, the unit can path to its target
+    def _get_path(self, start_point, targets, pathlength=None):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
 
         """
-        #GET THE PATH
+        if pathlength is None:
+            pathlength = self._pathlength
+        direction = targets[3]
         path = [start_point]
-        current = start_point
+        current = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
         move_direction = 0
 
-        while not self.game_map[current[0]][current[1]].pathlength == 0:
-            #debug_write("current tile {} has cost {}".format(current, self.game_map[current[0]][current[1]].pathlength))
-            next_move = self._choose_next_move(current, move_direction, end_points)
-            #debug_write(next_move)
+        while not pathlength[current] == 0:
+            next_move = self._choose_next_move(current, move_direction, direction, pathlength)
 
-            if current[0] == next_move[0]:
+            if GRID_X[current] == GRID_X[next_move]:
                 move_direction = self.VERTICAL
             else:
                 move_direction = self.HORIZONTAL
-            path.append(next_move)
+            path.append([GRID_X[next_move], GRID_Y[next_move]])
             current = next_move
-        
-        #debug_write(path)
+
         return path
-  
-    def _choose_next_move(self, current_point, previous_move_direction, end_points):
+
+    def _choose_next_move(self, current_point, previous_move_direction, direction, pathlength):
         """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
         """
-        neighbors = self._get_neighbors(current_point)
-        #debug_write("Unit at {} previously moved {} and has these neighbors {}".format(current_point, previous_move_direction, neighbors))
-
+        blocked = self._blocked
         ideal_neighbor = current_point
-        best_pathlength = self.game_map[current_point[0]][current_point[1]].pathlength
-        for neighbor in neighbors:
-            #debug_write("Comparing champ {} and contender {}".format(ideal_neighbor, neighbor))
-            if not self.game_state.game_map.in_arena_bounds(neighbor) or self.game_map[neighbor[0]][neighbor[1]].blocked:
+        best_pathlength = pathlength[current_point]
+        for neighbor in NEIGHBORS[current_point]:
+            if blocked[neighbor]:
                 continue
 
-            new_best = False
-            x, y = neighbor
-            current_pathlength = self.game_map[x][y].pathlength
+            current_pathlength = pathlength[neighbor]
 
             #Filter by pathlength
             if current_pathlength > best_pathlength:
                 continue
-            elif current_pathlength < best_pathlength:
-                #debug_write("Contender has better pathlength at {} vs champs {}".format(current_pathlength, best_pathlength))
-                new_best = True
-
             #Filter by direction based on prev move
-            if not new_best and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, end_points):
+            if current_pathlength == best_pathlength and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, direction):
                 continue
 
             ideal_neighbor = neighbor
             best_pathlength = current_pathlength
 
-        #debug_write("Gave unit at {} new tile {}".format(current_point, ideal_neighbor))
         return ideal_neighbor
 
-    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, end_points):
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
         """Compare two tiles and return True if the unit would rather move to the new one
 
         """
         #True if we are moving in a different direction than prev move and prev is not
         #If we previously moved horizontal, and now one of our options has a different x position then the other (the two options are not up/down)
-        if previous_move_direction == self.HORIZONTAL and not new_tile[0] == prev_best[0]:
+        if previous_move_direction == self.HORIZONTAL and not GRID_X[new_tile] == GRID_X[prev_best]:
             #We want to go up now. If we have not changed our y, we are not going up
-            if prev_tile[1] == new_tile[1]:
-                return False 
-            return True
-        if previous_move_direction == self.VERTICAL and not new_tile[1] == prev_best[1]:
-            if prev_tile[0] == new_tile[0]:
-                #debug_write("contender {} has the same x coord as prev tile {} so we will keep best move {}".format(new_tile, prev_tile, prev_best))
-                return False
-            return True
-        if previous_move_direction == 0: 
-            if prev_tile[1] == new_tile[1]: 
-                return False
-            return True
-        
-        #To make it here, both moves are on the same axis 
-        direction = self._get_direction_from_endpoints(end_points)
-        if new_tile[1] == prev_best[1]: #If they both moved horizontal...
-            if direction[0] == 1 and new_tile[0] > prev_best[0]: #If we moved right and right is our direction, we moved towards our direction
-                return True 
-            if direction[0] == -1 and new_tile[0] < prev_best[0]: #If we moved left and left is our direction, we moved towards our direction
-                return True 
-            return False 
-        if new_tile[0] == prev_best[0]: #If they both moved vertical...
-            if direction[1] == 1 and new_tile[1] > prev_best[1]: #If we moved up and up is our direction, we moved towards our direction
+            return not GRID_Y[prev_tile] == GRID_Y[new_tile]
+        if previous_move_direction == self.VERTICAL and not GRID_Y[new_tile] == GRID_Y[prev_best]:
+            return not GRID_X[prev_tile] == GRID_X[new_tile]
+        if previous_move_direction == 0:
+            return not GRID_Y[prev_tile] == GRID_Y[new_tile]
+
+        #To make it here, both moves are on the same axis
+        if GRID_Y[new_tile] == GRID_Y[prev_best]: #If they both moved horizontal...
+            if direction[0] == 1 and GRID_X[new_tile] > GRID_X[prev_best]: #If we moved right and right is our direction, we moved towards our direction
+                return True
+            if direction[0] == -1 and GRID_X[new_tile] < GRID_X[prev_best]: #If we moved left and left is our direction, we moved towards our direction
+                return True
+            return False
+        if GRID_X[new_tile] == GRID_X[prev_best]: #If they both moved vertical...
+            if direction[1] == 1 and GRID_Y[new_tile] > GRID_Y[prev_best]: #If we moved up and up is our direction, we moved towards our direction
                 return True
-            if direction[1] == -1 and new_tile[1] < prev_best[1]: #If we moved down and down is our direction, we moved towards our direction
+            if direction[1] == -1 and GRID_Y[new_tile] < GRID_Y[prev_best]: #If we moved down and down is our direction, we moved towards our direction
                 return True
             return False
         return True
@@ -299,9 +383,9 @@ class ShortestPathFinder:
 
         for y in range(28):
             for x in range(28):
-                node = self.game_map[x][28 - y - 1]
-                if not node.blocked and not node.pathlength == -1:
-                    self._print_justified(node.pathlength)
+                index = x * ARENA_SIZE + 28 - y - 1
+                if not self._blocked[index] and not self._pathlength[index] == -1:
+                    self._print_justified(self._pathlength[index])
                 else:
                     sys.stderr.write("   ")
             debug_write("")
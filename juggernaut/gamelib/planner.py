@@ -0,0 +1,111 @@
+import queue
+import threading
+
+from .util import debug_write
+
+
+class BackgroundPlanner:
+    """Runs a planning function in a worker thread while the engine plays out the action phase
+
+    The algo spends the action phase waiting for frames from the engine, so a planner started
+    after submitting a turn can search for the next turn in that time. AlgoCore passes every
+    action frame to the running planner, and the function reads them with next_frame.
+    The function runs alongside the rest of the algo, so it should work on its own copy of the
+    game, for example from GameState.fork, rather than on a game state the algo keeps using.
+
+    Attributes :
+        * function: The planning function, called as function(planner, *args)
+        * args: The extra arguments passed to the function
+
+    """
+    def __init__(self, function, *args):
+        """Creates a planner, use start to run it
+
+        Args:
+            function: The planning function. Its return value is the result returned by collect
+            args: Extra arguments passed to the function after the planner
+
+        """
+        self.function = function
+        self.args = args
+        self.__frames = queue.Queue()
+        self.__cancelled = threading.Event()
+        self.__done = threading.Event()
+        self.__result = None
+        self.__thread = threading.Thread(target=self.__run, name="BackgroundPlanner", daemon=True)
+
+    def __run(self):
+        try:
+            self.__result = self.function(self, *self.args)
+        except Exception as error:
+            debug_write("Background planning failed: {}".format(repr(error)))
+        finally:
+            self.__done.set()
+
+    def start(self):
+        """Starts running the planning function in the worker thread
+        """
+        self.__thread.start()
+
+    def feed(self, frame):
+        """Passes an action frame to the planning function. Called by AlgoCore for every frame
+
+        Args:
+            frame: A GameMessage holding an action frame
+
+        """
+        self.__frames.put(frame)
+
+    def end_of_frames(self):
+        """Tells the planning function the action phase is over. Called by AlgoCore when the next turn starts
+        """
+        self.__frames.put(None)
+
+    def next_frame(self, timeout=None):
+        """Waits for the next action frame. To be called from the planning function
+
+        Args:
+            timeout: The longest time to wait in seconds, or None to wait until a frame arrives
+
+        Returns:
+            The next frame as a GameMessage, or None if the action phase is over, the planner was cancelled or the timeout expired
+
+        """
+        if self.__cancelled.is_set():
+            return None
+        try:
+            return self.__frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    @property
+    def cancelled(self):
+        """True once the result is no longer wanted. Long running planning functions should check it and return early
+        """
+        return self.__cancelled.is_set()
+
+    @property
+    def done(self):
+        """True once the planning function has returned
+        """
+        return self.__done.is_set()
+
+    def cancel(self):
+        """Asks the planning function to stop. The worker thread is not interrupted, the function has to check cancelled
+        """
+        self.__cancelled.set()
+        self.__frames.put(None)
+
+    def collect(self, timeout=0):
+        """Gets the result of the planning function
+
+        Args:
+            timeout: The longest time to wait for the function to return, in seconds
+
+        Returns:
+            The value returned by the planning function, or None if it failed or has not returned yet
+
+        """
+        if not self.__done.wait(timeout):
+            return None
+        return self.__result
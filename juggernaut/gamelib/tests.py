@@ -1,7 +1,16 @@
 import unittest
 import json
+import io
+import sys
+import time
 from .game_state import GameState
+from .algocore import AlgoCore
+from .timing import TurnTimer, TurnTimeout, get_turn_timer
+from .profiling import Profiler
 from .unit import GameUnit
+from .simulator import ActionSimulator
+from .world_model import WorldModel
+from .message import GameMessage, load_message, CONFIG, TURN, ACTION_FRAME, END, UNKNOWN
 
 class BasicTests(unittest.TestCase):
 
@@ -195,6 +204,178 @@ class BasicTests(unittest.TestCase):
     def test_basic(self):
         self.assertEqual(True, True, "It's the end of the world as we know it, and I feel fine")
 
+    def test_game_message(self):
+        turn = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,3,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[[13,10,90.0,"1"]],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        message = GameMessage(turn)
+        self.assertEqual(TURN, message.message_type)
+        self.assertEqual([0, 3, -1], message.turn_info)
+        self.assertEqual(turn, message, "A message should still be the raw string")
+        game = GameState(self.make_turn_0_map().config, message)
+        self.assertEqual(3, game.turn_number)
+        self.assertTrue(game.contains_stationary_unit([13, 10]))
+        self.assertIs(message.data, load_message(message), "A message should only be decoded once")
+
+        self.assertEqual(ACTION_FRAME, GameMessage(turn.replace("[0,3,-1]", "[1, 3, 7]")).message_type)
+        self.assertEqual(END, GameMessage(turn.replace("[0,3,-1]", "[2,3,-1]")).message_type)
+        self.assertEqual(CONFIG, GameMessage('{"timingAndReplay":{"replaySave":1}}').message_type)
+        self.assertEqual(UNKNOWN, GameMessage("not a message").message_type)
+
+    def run_algo(self, algo, messages):
+        stdin, stdout = sys.stdin, sys.stdout
+        sys.stdin = io.StringIO("".join(message + "\n" for message in messages))
+        sys.stdout = io.StringIO()
+        try:
+            algo.start()
+            return sys.stdout.getvalue()
+        finally:
+            sys.stdin, sys.stdout = stdin, stdout
+
+    def test_action_frame_subscription(self):
+        class RecordingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.frames = []
+            def on_turn(self, game_state):
+                self.frames.append("turn")
+            def on_action_frame(self, game_state):
+                self.frames.append(game_state.turn_info[2])
+
+        frame = """{"turnInfo":[1,0,FRAME],"events":{"breach":[],"death":[]}}"""
+        breach = """{"turnInfo":[1,0,FRAME],"events":{"breach":[[[3,10],1.0,3,"5",2]],"death":[]}}"""
+        messages = ["""{"turnInfo":[0,0,-1]}"""]
+        for index in range(7):
+            messages.append((breach if index == 2 else frame).replace("FRAME", str(index)))
+        messages += ["""{"turnInfo":[0,1,-1]}""", """{"turnInfo":[2,1,-1]}"""]
+
+        algo = RecordingAlgo()
+        self.run_algo(algo, messages)
+        self.assertEqual(["turn", 0, 1, 2, 3, 4, 5, 6, "turn"], algo.frames, "Every frame should be passed on by default")
+
+        algo = RecordingAlgo()
+        algo.subscribe_action_frames(events=["breach"], every=4, last_frame=True)
+        self.run_algo(algo, messages)
+        self.assertEqual(["turn", 0, 2, 4, 6, "turn"], algo.frames)
+
+        algo = RecordingAlgo()
+        algo.subscribe_action_frames(last_frame=True)
+        self.run_algo(algo, messages[:-2] + messages[-1:])
+        self.assertEqual(["turn", 6], algo.frames, "The last frame should be passed on before the game ends")
+        self.assertTrue(GameMessage(breach).has_events(["death", "breach"]))
+        self.assertFalse(GameMessage(frame).has_events(["breach"]))
+
+    def test_background_planning(self):
+        class PlanningAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.plans = []
+            def on_turn(self, game_state):
+                self.plans.append(self.collect_planning(timeout=5))
+                self.start_planning(self.count_frames, game_state.turn_info[1])
+            def count_frames(self, planner, turn):
+                frames = 0
+                while planner.next_frame(timeout=5) is not None:
+                    frames += 1
+                return (turn, frames)
+
+        messages = ["""{"turnInfo":[0,0,-1]}"""]
+        messages += ["""{"turnInfo":[1,0,%d],"events":{}}""" % index for index in range(5)]
+        messages += ["""{"turnInfo":[0,1,-1]}""", """{"turnInfo":[2,1,-1]}"""]
+        algo = PlanningAlgo()
+        algo.subscribe_action_frames(events=["breach"])
+        self.run_algo(algo, messages)
+        self.assertEqual([None, (0, 5)], algo.plans, "The planner should see every frame, even those not passed on")
+        self.assertIsNone(algo.collect_planning(), "Planning should be cancelled when the game ends")
+
+    def test_world_model(self):
+        turn = """{"p2Units":[[],[],[[13,16,90.0,"2"]],[],[],[],[],[]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[13,12,%s,"1"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        frame = """{"turnInfo":[1,1,%d],"events":{"spawn":%s,"move":%s,"damage":%s,"death":%s}}"""
+        model = WorldModel(self.make_turn_0_map().config)
+        game = model.start_turn(turn % "75.0")
+        self.assertIsNone(model.patched, "The first turn should be built from scratch")
+        game.attempt_spawn("FF", [12, 12])
+        self.assertFalse(model.game_state.contains_stationary_unit([12, 12]), "Spawning on the turn's game state should not change the model")
+
+        model.apply_frame(frame % (0, '[[[13,0],3,"3",1]]', "[]", '[[[13,12],10.0,0,"1",1]]', '[[[13,16],2,"2",2,false]]'))
+        model.apply_frame(frame % (1, "[]", '[[[13,0],[13,1],[],3,"3",1]]', "[]", "[]"))
+        self.assertEqual(1, len(model.game_state.game_map[13, 1]), "The scout should have moved")
+        model.apply_frame(frame % (2, "[]", "[]", "[]", '[[[13,1],3,"3",1,false]]'))
+        self.assertEqual(0, model.unmatched_events)
+
+        game = model.start_turn((turn % "65.0").replace("[0,1,-1]", "[0,2,-1]").replace('[[13,16,90.0,"2"]]', "[]"))
+        self.assertEqual([], model.patched, "The action frames should have kept the model in line with the turn")
+        self.assertEqual(2, game.turn_number)
+        self.assertEqual(65, game.game_map[13, 12][0].health)
+        self.assertFalse(game.contains_stationary_unit([13, 16]))
+        self.assertEqual(0, len(game.game_map[13, 1]))
+
+        game = model.start_turn((turn % "40.0").replace("[0,1,-1]", "[0,3,-1]"))
+        self.assertEqual([[13, 12], [13, 16]], model.patched, "Locations the model got wrong should be rebuilt")
+        self.assertEqual(40, game.game_map[13, 12][0].health)
+        self.assertEqual("DF", game.game_map[13, 16][0].unit_type)
+
+        class ModelAlgo(AlgoCore):
+            def on_game_start(self, config):
+                self.config = config
+                self.enable_world_model()
+                self.subscribe_action_frames(events=["breach"])
+            def on_turn(self, turn_state):
+                self.game_state = self.world_model.start_turn(turn_state)
+                self.game_state.submit_turn()
+        algo = ModelAlgo()
+        self.run_algo(algo, [json.dumps(model.config), turn % "75.0", frame % (0, "[]", "[]", '[[[13,12],10.0,0,"1",1]]', "[]"),
+            (turn % "65.0").replace("[0,1,-1]", "[0,2,-1]"), """{"turnInfo":[2,2,-1]}"""])
+        self.assertEqual([], algo.world_model.patched, "Frames should reach the model even when they are not passed on")
+
+    def test_turn_timer(self):
+        timer = TurnTimer(3, 10)
+        self.assertGreater(timer.time_left(), 9)
+        timer.check()
+        with self.assertRaises(TurnTimeout):
+            timer.check(reserve=20)
+
+        config = self.make_turn_0_map().config
+        class SlowAlgo(AlgoCore):
+            def on_turn(self, turn_state):
+                game_state = GameState(config, turn_state)
+                game_state.attempt_spawn("FF", [13, 0])
+                self.turn_timer.set_fallback(game_state)
+                game_state.attempt_spawn("FF", [14, 0])
+                time.sleep(0.2)
+                game_state.submit_turn()
+
+        turn = """{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[0,0,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        algo = SlowAlgo()
+        algo.configure_turn_timer(budget=0.1, fallback_margin=0.05)
+        output = self.run_algo(algo, [turn, turn.replace("[0,0,-1]", "[0,1,-1]").replace("5.0,0]", "5.0,123]"), """{"turnInfo":[2,1,-1]}"""])
+        self.assertEqual('[["FF", 13, 0]]\n[]\n' * 2, output, "Only the fallback turn should be sent")
+        self.assertTrue(algo.turn_timings[0]["used_fallback"])
+        self.assertEqual(123, algo.turn_timings[0]["engine_time"])
+        self.assertIsNone(get_turn_timer(), "The timer should be cleared when the game ends")
+
+    def test_profiling(self):
+        original = GameState.can_spawn
+        profiler = Profiler()
+        profiler.enable()
+        try:
+            self.assertIsNot(original, GameState.can_spawn)
+            profiler.start_turn(0)
+            game = self.make_turn_0_map()
+            game.attempt_spawn("PI", [13, 0], 3)
+            game.can_spawn("PI", [13, 0])
+            game.find_path_to_edge([13, 0])
+            profiler.end_turn()
+        finally:
+            profiler.disable()
+        self.assertIs(original, GameState.can_spawn, "Disabling should restore the original functions")
+        turn_number, _, stats = profiler.turns[0]
+        self.assertEqual(0, turn_number)
+        self.assertEqual(1, stats["parse_state"][0])
+        self.assertEqual(1, stats["attempt_spawn"][0])
+        self.assertEqual(1, stats["attempt_spawn_batch"][0])
+        self.assertEqual(1, stats["can_spawn"][0])
+        self.assertEqual(1, stats["find_path_to_edge"][0])
+        self.assertIn("attempt_spawn", profiler.summary())
+
     def test_simple_fields(self):
         game = self.make_turn_0_map()
         self.assertEqual(5, game.get_resource(game.MP), "I should have 5 MP")
@@ -225,6 +406,18 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(0, len(game.game_map.get_locations_in_range([-500,-500], 10)), "Invalid tiles are being marked as in range")
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "A location should be in range of itself")
     
+    def test_arena_tables(self):
+        game = self.make_turn_0_map()
+        locations = list(game.game_map)
+        self.assertEqual(420, len(locations), "The board should have 420 tiles")
+        self.assertEqual([13, 0], locations[0], "Iteration should start at the bottom corner")
+        self.assertEqual([14, 27], locations[-1], "Iteration should end at the top corner")
+        self.assertTrue(all(game.game_map.in_arena_bounds(location) for location in locations), "Iterated over an out of bounds tile")
+        self.assertFalse(game.game_map.in_arena_bounds([0, 0]), "The corners of the square are not on the board")
+        self.assertFalse(game.game_map.in_arena_bounds([-1, 13]), "Negative coordinates are not on the board")
+        self.assertEqual([13, 0], game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT)[0], "Wrong first bottom left edge location")
+        self.assertEqual([27, 13], game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)[-1], "Wrong last bottom right edge location")
+
     def test_get_units(self):
         game = self.make_turn_0_map()
         self.assertEqual(0, len(game.game_map[13,13]), "There should not be a unit on this location")
@@ -235,10 +428,39 @@ class BasicTests(unittest.TestCase):
             game.game_map.add_unit("FF", [13,13])
         self.assertEqual(1, len(game.game_map[13,13]), "Towers seem to be stacking")
         
+    def test_occupancy_grids(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        index = 13 * game.ARENA_SIZE + 12
+        self.assertEqual(-1, game_map.get_structure_grid()[index], "An empty tile should have no structure")
+        game_map.add_unit("DF", [13,12], 1)
+        self.assertEqual(2, game_map.get_structure_grid()[index], "The structure grid should hold the turret's type index")
+        self.assertEqual(1, game_map.get_owner_grid()[index], "The owner grid should hold the turret's owner")
+        self.assertEqual(90, game_map.get_health_grid()[index], "The health grid should hold the turret's health")
+        self.assertTrue(game.contains_stationary_unit([13,12]), "The turret should block its location")
+        game_map.remove_unit([13,12])
+        self.assertEqual(-1, game_map.get_structure_grid()[index], "Removing a unit should clear the structure grid")
+        self.assertFalse(game.contains_stationary_unit([13,12]), "The location should no longer be blocked")
+        for _ in range(3):
+            game_map.add_unit("PI", [13,12], 0)
+        self.assertEqual(3, game_map.get_mobile_count_grid(0)[index], "Mobile units should be counted per player")
+        self.assertEqual(0, game_map.get_mobile_count_grid(1)[index], "The enemy has no mobile units here")
+
+    def test_occupancy_grids_after_upgrade(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("FF", [13,6])
+        game.attempt_upgrade([13,6])
+        self.assertEqual(1, game.game_map.get_upgraded_grid()[13 * game.ARENA_SIZE + 6], "The upgraded grid should follow attempt_upgrade")
+        with self.assertRaises(TypeError):
+            game.game_map.get_structure_grid()[0] = 1
+
     def test_get_units_in_range(self):
         game = self.make_turn_0_map()
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
+        indices = game.game_map.get_locations_in_range([13,13], 3.5, as_indices=True)
+        self.assertEqual([x * game.ARENA_SIZE + y for x, y in game.game_map.get_locations_in_range([13,13], 3.5)], indices, "Indices should match locations")
+        self.assertEqual(9, len(game.game_map.get_locations_in_range([13,0], 2.5)), "Locations off the board should be clipped")
 
     def _test_get_attackers(self):
         game = self.make_turn_0_map()
@@ -256,6 +478,221 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_find_path_to_edge(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([13, 0], path[0], "Paths should start at the starting location")
+        self.assertIn(path[-1], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), "An open board should let us reach the edge")
+        self.assertEqual(29, len(path), "Wrong path length on an open board")
+        for i in range(1, len(path)):
+            self.assertEqual(1, game.game_map.distance_between_locations(path[i - 1], path[i]), "Units move one tile at a time")
+
+        for x in range(28):
+            if game.game_map.in_arena_bounds([x, 13]):
+                game.game_map.add_unit("FF", [x, 13], 0)
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual([26, 12], path[-1], "A walled in unit should self destruct at its most ideal tile")
+        self.assertIsNone(game.find_path_to_edge([0, 13]), "Pathing from a blocked location should fail")
+
+    def test_path_cache_follows_structures(self):
+        game = self.make_turn_0_map()
+        open_path = game.find_path_to_edge([13, 0])
+        self.assertEqual(open_path, game.find_path_to_edge([13, 0]), "Cached paths should not change")
+        self.assertEqual(1, len(game._path_cache), "Both calls should share one distance field")
+        blocker = open_path[5]
+        game.attempt_spawn("FF", blocker)
+        self.assertNotIn(blocker, game.find_path_to_edge([13, 0]), "Paths should avoid a structure spawned after caching")
+        game.game_map.remove_unit(blocker)
+        self.assertEqual(open_path, game.find_path_to_edge([13, 0]), "Removing the structure should restore the path")
+
+    def test_find_paths_to_edges(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("FF", [0, 13])
+        results = game.find_paths_to_edges()
+        self.assertEqual(28, len(results), "There should be a result for each of our edge locations")
+        for result in results:
+            if result['location'] == [0, 13]:
+                self.assertIsNone(result['path'], "Blocked locations have no path")
+                continue
+            self.assertEqual(game.find_path_to_edge(result['location']), result['path'], "Batch paths should match single paths")
+            self.assertEqual(len(result['path']) - 1, result['length'], "Length should count the moves in the path")
+            self.assertFalse(result['self_destructs'], "An open board should not cause self destructs")
+
+        for x in range(28):
+            if game.game_map.in_arena_bounds([x, 13]) and not game.contains_stationary_unit([x, 13]):
+                game.game_map.add_unit("FF", [x, 13], 0)
+        results = game.find_paths_to_edges([[13, 0]])
+        self.assertTrue(results[0]['self_destructs'], "A walled in unit should self destruct")
+        self.assertEqual([26, 12], results[0]['end_point'], "Wrong self destruct location")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        threat_map = game.get_threat_map()
+        self.assertEqual(0, threat_map.get_attacker_count([13, 13], 0), "Are we being attacked by a ghost?")
+        game.game_map.add_unit("DF", [13, 15], 1)
+        self.assertEqual(1, threat_map.get_attacker_count([13, 13], 0), "A new enemy turret should be tracked")
+        self.assertEqual(0, threat_map.get_attacker_count([13, 13], 1), "Turrets don't attack their own side")
+        self.assertEqual(5, threat_map.get_mobile_damage([13, 13], 0), "Wrong damage per frame to mobile units")
+        self.assertEqual(0, threat_map.get_structure_damage([13, 13], 0), "Turrets don't damage structures")
+        self.assertEqual(0, threat_map.get_attacker_count([13, 12], 0), "This location is out of the turret's range")
+        game.game_map[13, 15][0].upgrade()
+        game.game_map.refresh_location([13, 15])
+        self.assertEqual(15, threat_map.get_mobile_damage([13, 12], 0), "Upgrades should extend range and damage")
+        self.assertEqual(game.game_map[13, 15], game.get_attackers([13, 12], 0), "get_attackers should read the threat map")
+        game.game_map.remove_unit([13, 15])
+        self.assertEqual(0, threat_map.get_attacker_count([13, 13], 0), "Removed turrets should no longer attack")
+
+    def test_attempt_spawn_batch(self):
+        game = self.make_turn_0_map()
+        game.enable_warnings = False
+        results = game.attempt_spawn_batch([("DF", [13, 10], 2), ("FF", [13, 20], 1), ("PI", [13, 0], 3), ("EI", [14, 0], 2)])
+        self.assertEqual((1, "Location is blocked."), results[0], "Only one structure fits on a location")
+        self.assertEqual((0, "Location in enemy territory."), results[1])
+        self.assertEqual((3, None), results[2])
+        self.assertEqual((0, "Not enough resources."), results[3], "The earlier requests should be paid for first")
+        self.assertEqual([("DF", 13, 10)], game._build_stack)
+        self.assertEqual([("PI", 13, 0)] * 3, game._deploy_stack)
+        self.assertEqual(3, len(game.game_map[13, 0]))
+        self.assertEqual(2, game.get_resource(game.MP))
+        self.assertEqual(2, game.attempt_spawn("PI", [[13, 0], [14, 0]]), "attempt_spawn should still count spawned units")
+
+    def test_shared_unit_stats(self):
+        game = self.make_turn_0_map()
+        first = GameUnit("DF", game.config, 0, None, 13, 10)
+        second = GameUnit("DF", game.config, 1, None, 14, 17)
+        self.assertIs(first.stats, second.stats, "Units of the same type should share their stats")
+        first.upgrade()
+        self.assertTrue(first.upgraded)
+        self.assertFalse(second.upgraded, "Upgrading a unit should not change other units")
+        self.assertEqual(3.5, first.attackRange)
+        self.assertEqual(2.5, second.attackRange)
+        self.assertEqual([6, 0], first.cost)
+        with self.assertRaises(AttributeError):
+            first.damage_i = 100
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [13, 10], 0)
+        forked = game.fork()
+        self.assertEqual(1, forked.attempt_upgrade([13, 10]), "The fork should be able to upgrade")
+        self.assertFalse(game.game_map[13, 10][0].upgraded, "Upgrading on a fork should not change the original")
+        self.assertTrue(forked.game_map[13, 10][0].upgraded)
+        self.assertEqual(0, game.game_map.get_upgraded_grid()[13 * 28 + 10])
+        self.assertEqual(1, forked.game_map.get_upgraded_grid()[13 * 28 + 10])
+        self.assertEqual([], game._build_stack, "The fork should keep its own build stack")
+        self.assertNotEqual(game.get_resource(game.SP), forked.get_resource(game.SP))
+
+        game.game_map[13, 10][0].health = 1
+        self.assertEqual(90, forked.game_map[13, 10][0].health, "Changes to the original should not reach the fork")
+        forked.game_map.remove_unit([13, 10])
+        self.assertIsNotNone(game.game_map.get_structure([13, 10]))
+
+    def test_checkpoint_rollback(self):
+        game = self.make_turn_0_map()
+        threat_map = game.get_threat_map()
+        resources = game.get_resources()
+        game.checkpoint()
+        game.attempt_spawn("DF", [13, 3])
+        game.checkpoint()
+        game.attempt_spawn("FF", [14, 3])
+        self.assertEqual(1, threat_map.get_attacker_count([13, 4], 1))
+        self.assertTrue(game.rollback())
+        self.assertFalse(game.contains_stationary_unit([14, 3]), "Rolling back should remove the wall")
+        self.assertTrue(game.contains_stationary_unit([13, 3]), "The turret was spawned before the last checkpoint")
+        self.assertTrue(game.rollback())
+        self.assertFalse(game.contains_stationary_unit([13, 3]))
+        self.assertEqual(resources, game.get_resources(), "Rolling back should refund resources")
+        self.assertEqual([], game._build_stack)
+        self.assertEqual(0, threat_map.get_attacker_count([13, 4], 1), "The threat map should follow rollbacks")
+        self.assertFalse(game.rollback(), "There are no checkpoints left")
+
+    def test_rollback_threat_map(self):
+        def threats(game):
+            threat_map = game.get_threat_map()
+            return [(threat_map.get_attacker_count([x, y], 0), threat_map.get_mobile_damage([x, y], 0),
+                [(unit.unit_type, unit.x, unit.y, unit.upgraded) for unit in game.get_attackers([x, y], 0)]) for x, y in game.game_map]
+
+        def fresh_state(upgraded):
+            game = self.make_turn_0_map()
+            game.game_map.add_unit("DF", [13, 15], 1)
+            game.game_map.add_unit("DF", [16, 16], 1)
+            if upgraded:
+                game.game_map[16, 16][0].upgrade()
+                game.game_map.refresh_location([16, 16])
+            return game
+
+        game = fresh_state(False)
+        expected = threats(game)
+        self.assertEqual(1, game.get_threat_map().get_attacker_count([13, 13], 0))
+        self.assertEqual(5, game.get_threat_map().get_mobile_damage([13, 13], 0))
+        for change in ("remove", "upgrade"):
+            game.checkpoint()
+            if change == "remove":
+                game.game_map.remove_unit([13, 15])
+            else:
+                game.game_map[16, 16][0].upgrade()
+                game.game_map.refresh_location([16, 16])
+                self.assertEqual(threats(fresh_state(True)), threats(game), "The threat map should follow the upgrade")
+            game.rollback()
+            self.assertEqual(expected, threats(game), "Rolling back a {} should give the threats of the original board".format(change))
+        self.assertEqual(1, game.get_threat_map().get_attacker_count([13, 13], 0), "Attackers should not be counted twice after a rollback")
+
+        # Nested checkpoints: the outer snapshot still shares the locations the inner rollback restores
+        game.checkpoint()
+        game.game_map.remove_unit([16, 16])
+        game.checkpoint()
+        game.game_map.remove_unit([13, 15])
+        game.rollback()
+        game.game_map[13, 15][0].health = 1
+        game.rollback()
+        self.assertEqual(expected, threats(game), "Changing a unit between rollbacks should not reach the outer checkpoint")
+        self.assertEqual(90, game.game_map[13, 15][0].health)
+
+        # A fork made after a checkpoint holds on to the units the rollback returns to
+        game.checkpoint()
+        forked = game.game_map.fork()
+        game.rollback()
+        game.game_map[13, 15][0].health = 1
+        self.assertEqual(90, forked[13, 15][0].health, "Changing a unit after a rollback should not change a fork")
+
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        simulator = ActionSimulator(game)
+        result = simulator.simulate([("PI", 13, 0)] * 3, record_events=True)
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(len(path) - 1, result.frames, "Scouts should move once per frame")
+        self.assertEqual(path[1:], [frame["move"][0][1] for frame in result.events], "Units should follow find_path_to_edge")
+        self.assertEqual(3, len(result.breaches), "Every scout should reach the edge")
+        self.assertEqual([game.my_health, game.enemy_health - 3], result.player_health, "Each breach should deal damage")
+        self.assertEqual([0, 0], result.surviving_units)
+
+        game.game_map.add_unit("DF", [24, 15], 1)
+        game.game_map.add_unit("FF", [26, 14], 1)
+        game.game_map.add_unit("FF", [27, 14], 1)
+        simulator.refresh()
+        result = simulator.simulate([("PI", 13, 0)] * 6)
+        self.assertEqual(5, len(result.breaches), "The turret should only kill one scout")
+        self.assertEqual(60, result.structure_damage[0], "Scouts should attack the nearest structure")
+        self.assertEqual(75, game.game_map[26, 14][0].health, "Simulating should not change the game state")
+
+        for x in range(28):
+            if game.game_map.in_arena_bounds([x, 13]) and not game.game_map[x, 13]:
+                game.game_map.add_unit("FF", [x, 13], 0)
+        simulator.refresh()
+        result = simulator.simulate([("PI", 13, 0)])
+        self.assertEqual([[26, 12, 3, 0]], result.self_destructs, "A walled in scout should self destruct")
+        self.assertEqual([], result.breaches)
+
+    def test_simulator_ignores_invalid_units(self):
+        game = self.make_turn_0_map()
+        simulator = ActionSimulator(game)
+        for shorthand in ("FF", "RM", "XX"):
+            result = simulator.simulate([(shorthand, 13, 0)], [(shorthand, 14, 27)])
+            self.assertEqual(0, result.frames, "{} is not a mobile unit and should be ignored".format(shorthand))
+            self.assertEqual([0, 0], result.surviving_units)
+        result = simulator.simulate([("FF", 13, 0), ("PI", 13, 0)])
+        self.assertEqual(1, len(result.breaches), "Mobile units should still be simulated next to ignored ones")
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -1,3 +1,5 @@
+from collections import namedtuple
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,9 +11,76 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+class UnitStats(namedtuple("UnitStats", ("unit_type", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+        "shieldRange", "max_health", "shieldPerUnit", "shieldBonusPerY", "cost", "upgraded"))):
+    """The stats shared by every unit of a type, built once per config by get_unit_stats
+
+    Records are immutable, so a single record is referenced by all the units it describes.
+    The fields have the same meaning as the GameUnit attributes of the same name.
+
+    """
+    __slots__ = ()
+
+# Maps id(config) to the config and its stat records, so that each config is only read once
+_STATS_BY_CONFIG = {}
+
+def _build_unit_stats(type_config):
+    base = UnitStats(
+        unit_type=type_config["shorthand"],
+        stationary=type_config["unitCategory"] == 0,
+        speed=type_config.get("speed", 0),
+        damage_f=type_config.get("attackDamageTower", 0),
+        damage_i=type_config.get("attackDamageWalker", 0),
+        attackRange=type_config.get("attackRange", 0),
+        shieldRange=type_config.get("shieldRange", 0),
+        max_health=type_config.get("startHealth", 0),
+        shieldPerUnit=type_config.get("shieldPerUnit", 0),
+        shieldBonusPerY=type_config.get("shieldBonusPerY", 0),
+        cost=(type_config.get("cost1", 0), type_config.get("cost2", 0)),
+        upgraded=False)
+    upgrade_config = type_config.get("upgrade", {})
+    upgraded = base._replace(
+        speed=upgrade_config.get("speed", base.speed),
+        damage_f=upgrade_config.get("attackDamageTower", base.damage_f),
+        damage_i=upgrade_config.get("attackDamageWalker", base.damage_i),
+        attackRange=upgrade_config.get("attackRange", base.attackRange),
+        shieldRange=upgrade_config.get("shieldRange", base.shieldRange),
+        max_health=upgrade_config.get("startHealth", base.max_health),
+        shieldPerUnit=upgrade_config.get("shieldPerUnit", base.shieldPerUnit),
+        shieldBonusPerY=upgrade_config.get("shieldBonusPerY", base.shieldBonusPerY),
+        cost=(upgrade_config.get("cost1", 0) + base.cost[0], upgrade_config.get("cost2", 0) + base.cost[1]),
+        upgraded=True)
+    return base, upgraded
+
+def get_unit_stats(config, unit_type, upgraded=False):
+    """Gets the shared stats of a unit type
+
+    Args:
+        config: The game config
+        unit_type: The shorthand of a unit type, WALL, SCOUT, etc.
+        upgraded: If True, gets the stats of an upgraded unit
+
+    Returns:
+        The UnitStats of the unit type
+
+    """
+    cached = _STATS_BY_CONFIG.get(id(config))
+    if cached is None or cached[0] is not config:
+        stats = {}
+        for type_config in config["unitInformation"]:
+            if "unitCategory" in type_config and type_config["shorthand"] not in stats:
+                stats[type_config["shorthand"]] = _build_unit_stats(type_config)
+        cached = (config, stats)
+        _STATS_BY_CONFIG[id(config)] = cached
+    return cached[1][unit_type][1 if upgraded else 0]
+
+
 class GameUnit:
     """Holds information about a Unit. 
 
+    The stats of a unit are read-only and come from a UnitStats record shared by every unit of
+    the same type, so creating a unit only sets the few attributes that differ between units.
+
     Attributes :
         * unit_type (string): This unit's type
         * config (JSON): Contains information about the game
@@ -30,8 +99,11 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * stats (:obj: UnitStats): The shared stats of this unit's type
 
     """
+    __slots__ = ("unit_type", "config", "player_index", "pending_removal", "x", "y", "health", "stats")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
@@ -40,41 +112,31 @@ class GameUnit:
         self.config = config
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.stats = get_unit_stats(config, unit_type)
+        self.health = self.stats.max_health if not health else health
 
+    def __copy__(self):
+        unit = GameUnit.__new__(GameUnit)
+        for name in GameUnit.__slots__:
+            setattr(unit, name, getattr(self, name))
+        return unit
 
-    def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
+    stationary = property(lambda self: self.stats.stationary)
+    speed = property(lambda self: self.stats.speed)
+    damage_f = property(lambda self: self.stats.damage_f)
+    damage_i = property(lambda self: self.stats.damage_i)
+    attackRange = property(lambda self: self.stats.attackRange)
+    shieldRange = property(lambda self: self.stats.shieldRange)
+    max_health = property(lambda self: self.stats.max_health)
+    shieldPerUnit = property(lambda self: self.stats.shieldPerUnit)
+    shieldBonusPerY = property(lambda self: self.stats.shieldBonusPerY)
+    upgraded = property(lambda self: self.stats.upgraded)
+    cost = property(lambda self: list(self.stats.cost))
 
+    def upgrade(self):
+        self.stats = get_unit_stats(self.config, self.unit_type, True)
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
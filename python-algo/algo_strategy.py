@@ -4,6 +4,7 @@ import math
 import warnings
 from sys import maxsize
 import json
+import os
 
 
 """
@@ -16,13 +17,18 @@ Advanced strategy tips:
 
   - The GameState.map object can be manually manipulated to create hypothetical 
   board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  the actual current map state. GameState.fork() makes a cheap copy, and
+  GameState.checkpoint() and rollback() undo changes made in between.
 """
 
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
-        seed = random.randrange(maxsize)
+        # run_arena.py passes the seed of a game in ALGO_SEED, so games can be replayed with the same seeds
+        try:
+            seed = int(os.environ["ALGO_SEED"])
+        except (KeyError, ValueError):
+            seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
 
@@ -43,6 +49,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         SP = 0
         # This is a good place to do initial setup
         self.scored_on_locations = []
+        # on_action_frame only looks at breaches, so skip the frames without any
+        self.subscribe_action_frames(events=["breach"])
 
     def on_turn(self, turn_state):
         """
@@ -196,12 +204,15 @@ class AlgoStrategy(gamelib.AlgoCore):
         return location_options[damages.index(min(damages))]
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
+        # The structure and owner grids let us check each tile without looking at its units
+        structures = game_state.game_map.get_structure_grid()
+        owners = game_state.game_map.get_owner_grid()
+        type_index = None if unit_type is None else game_state.game_map.get_unit_type_index(unit_type)
         total_units = 0
         for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
+            index = location[0] * game_state.ARENA_SIZE + location[1]
+            if structures[index] >= 0 and owners[index] == 1 and (type_index is None or structures[index] == type_index) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
+                total_units += 1
         return total_units
         
     def filter_blocked_locations(self, locations, game_state):
@@ -219,7 +230,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
+        state = gamelib.load_message(turn_string)
         events = state["events"]
         breaches = events["breach"]
         for breach in breaches:
@@ -16,6 +16,27 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The BackgroundPlanner class in planner.py runs a planning function in a worker thread while the engine plays out the action phase. 
+AlgoCore.start_planning() starts one and AlgoCore.collect_planning() gets its result. \n
+
+The Profiler class in profiling.py times calls to the main GameState functions for each turn. 
+It is off by default, AlgoCore.enable_profiling() turns it on and prints a summary at the end of the game. \n
+
+The ActionSimulator class in simulator.py plays out the action phase frame by frame for a planned set of deploys. 
+It returns the breaches, destroyed structures and final board, which lets an algo compare attack options. \n
+
+The ThreatMap class in threat_map.py holds, for every tile, the units that can attack it and the damage they deal. 
+GameState.get_threat_map() builds one for the current map and get_attackers uses it. \n
+
+The GameMessage class in message.py wraps each message from the game engine. It is still a string, but it knows its turnInfo 
+without being decoded and decodes its JSON at most once. load_message() decodes either a GameMessage or a plain string. \n
+
+The TurnTimer class in timing.py tracks the time left in a turn. AlgoCore starts one when each turn message arrives 
+and can submit a fallback turn before the time limit, see AlgoCore.configure_turn_timer(). \n
+
+The WorldModel class in world_model.py keeps a GameState up to date with the events of the action frames, so that each turn 
+only rebuilds the locations the turn message disagrees with. AlgoCore.enable_world_model() sets one up. \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
@@ -24,6 +45,7 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .message import GameMessage, load_message
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "game_state", "game_map", "message", "navigation", "planner", "profiling", "simulator", "threat_map", "timing", "unit", "util", "world_model"]
  
\ No newline at end of file
@@ -1,7 +1,81 @@
+import copy
 import math
+from array import array
 from .unit import GameUnit
 from .util import debug_write
 
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+TOP_RIGHT = 0
+TOP_LEFT = 1
+BOTTOM_LEFT = 2
+BOTTOM_RIGHT = 3
+
+def _diamond_contains(x, y):
+    """Checks a location against the diamond geometry of the board, used to build IN_ARENA
+    """
+    row_size = y + 1
+    startx = HALF_ARENA - row_size
+    endx = startx + (2 * row_size) - 1
+    top_half_check = (y < HALF_ARENA and x >= startx and x <= endx)
+
+    row_size = (ARENA_SIZE - 1 - y) + 1
+    startx = HALF_ARENA - row_size
+    endx = startx + (2 * row_size) - 1
+    bottom_half_check = (y >= HALF_ARENA and x >= startx and x <= endx)
+
+    return bottom_half_check or top_half_check
+
+# These tables are computed once when gamelib is imported and shared by every GameMap.
+# Tiles are addressed either by their grid index, x * ARENA_SIZE + y, which covers the whole
+# 28x28 square, or by their tile index, their position in ARENA_TILES, which only covers the board.
+
+# For each grid index, True if the location is on the board
+IN_ARENA = tuple(_diamond_contains(x, y) for x in range(ARENA_SIZE) for y in range(ARENA_SIZE))
+# The (x, y) of every location on the board, in the order GameMap iterates over them
+ARENA_TILES = tuple((x, y) for y in range(ARENA_SIZE) for x in range(ARENA_SIZE) if IN_ARENA[x * ARENA_SIZE + y])
+# For each grid index, the tile index of the location, or -1 if it is off the board
+TILE_INDEX = [-1] * (ARENA_SIZE * ARENA_SIZE)
+for _tile_index, (_x, _y) in enumerate(ARENA_TILES):
+    TILE_INDEX[_x * ARENA_SIZE + _y] = _tile_index
+TILE_INDEX = tuple(TILE_INDEX)
+del _tile_index, _x, _y
+# The (x, y) locations along each edge, indexed by TOP_RIGHT, TOP_LEFT, BOTTOM_LEFT and BOTTOM_RIGHT
+EDGE_LOCATIONS = (
+    tuple((HALF_ARENA + num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA - 1 - num, num) for num in range(HALF_ARENA)),
+    tuple((HALF_ARENA + num, num) for num in range(HALF_ARENA)))
+# The same locations as EDGE_LOCATIONS, as sets for fast membership checks
+EDGE_LOCATION_SETS = tuple(frozenset(edge) for edge in EDGE_LOCATIONS)
+# Relative offsets of the locations in range, keyed by (radius, hit radius). See get_range_stencil
+_RANGE_STENCILS = {}
+
+def get_range_stencil(radius, hit_radius):
+    """Gets the offsets of every location within range of a location, computed once per radius
+
+    Args:
+        radius: The radius of the search area
+        hit_radius: The getHitRadius of the config, added to the radius
+
+    Returns:
+        A tuple of (dx, dy) offsets in the order get_locations_in_range returns locations
+
+    """
+    key = (radius, hit_radius)
+    stencil = _RANGE_STENCILS.get(key)
+    if stencil is None:
+        search_radius = math.ceil(radius)
+        stencil = tuple((dx, dy)
+            for dx in range(-search_radius, search_radius + 1)
+            for dy in range(-search_radius, search_radius + 1)
+            if math.sqrt(dx**2 + dy**2) < radius + hit_radius)
+        _RANGE_STENCILS[key] = stencil
+    return stencil
+
+# Maps the bytes of the structure type array (-1 is 0xFF) to 1 for blocked tiles and 0 for open ones
+_BLOCKED_TABLE = bytes([1] * 255 + [0])
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -9,6 +83,13 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    Alongside the lists of units, the map keeps flat per-tile arrays describing
+    the structure (type, owner, health, upgraded) and the number of mobile units
+    of each player on every tile. They are kept in sync by add_unit, remove_unit,
+    place_unit and __setitem__, and can be read through the get_*_grid functions.
+    If you modify the list returned by game_map[x, y] directly, call
+    refresh_location to bring the arrays up to date.
+
     Attributes :
         * config (JSON): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
@@ -29,43 +110,50 @@ class GameMap:
         """
         self.config = config
         self.enable_warnings = True
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
-        self.TOP_RIGHT = 0
-        self.TOP_LEFT = 1
-        self.BOTTOM_LEFT = 2
-        self.BOTTOM_RIGHT = 3
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
+        self.TOP_RIGHT = TOP_RIGHT
+        self.TOP_LEFT = TOP_LEFT
+        self.BOTTOM_LEFT = BOTTOM_LEFT
+        self.BOTTOM_RIGHT = BOTTOM_RIGHT
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__type_index = {}
+        for index, unit_information in enumerate(self.config["unitInformation"]):
+            self.__type_index.setdefault(unit_information.get("shorthand"), index)
+        num_tiles = self.ARENA_SIZE * self.ARENA_SIZE
+        self.__structure_type = array('b', [-1]) * num_tiles
+        self.__owner = array('b', [-1]) * num_tiles
+        self.__health = array('d', [0.0]) * num_tiles
+        self.__upgraded = bytearray(num_tiles)
+        self.__mobile_count = [array('H', [0]) * num_tiles, array('H', [0]) * num_tiles]
+        self.__blocking_signature = None
+        self.__change_listeners = []
+        # Tiles whose unit lists may be shared with a fork, copied before they are handed out or changed
+        self.__shared = bytearray(num_tiles)
+        self.__checkpoints = []
+        self.__hit_radius = self.config["unitInformation"][0].get('getHitRadius', 0)
+        for unit_information in self.config["unitInformation"]:
+            for stats in (unit_information, unit_information.get("upgrade", {})):
+                for key in ("attackRange", "shieldRange", "selfDestructRange"):
+                    if stats.get(key, 0) > 0:
+                        get_range_stencil(stats[key], self.__hit_radius)
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
             x,y = location
-            return self.__map[x][y]
+            return self.__tile(x, y)
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
             self.__map[location[0]][location[1]] = val
+            self.__shared[location[0] * self.ARENA_SIZE + location[1]] = 0
+            self.__refresh_location(location[0], location[1])
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        return ([x, y] for x, y in ARENA_TILES)
 
     def __empty_grid(self):
         grid = []
@@ -75,6 +163,114 @@ class GameMap:
                 grid[x].append([])
         return grid
 
+    def __tile(self, x, y):
+        # Gets the units at a location, copying them first if they are shared with a fork
+        index = x * self.ARENA_SIZE + y
+        if not self.__shared[index]:
+            return self.__map[x][y]
+        self.__shared[index] = 0
+        # Copying does not change what is at the location, so listeners are not called
+        tile = [copy.copy(unit) for unit in self.__map[x][y]]
+        self.__map[x][y] = tile
+        return tile
+
+    def _units_at(self, x, y):
+        # Gets the units at a location without copying them if they are shared with a fork, for readers that do not modify them
+        return self.__map[x][y]
+
+    def fork(self):
+        """Creates an independent copy of the map, for building hypothetical board states
+
+        The copy shares the config and, until either map changes a location, the units at it,
+        so forking is much cheaper than a deep copy. Units are copied the first time a location
+        is accessed through game_map[x, y] or changed on either map, so units retrieved before
+        forking should not be modified afterwards. Listeners registered with add_change_listener
+        are not carried over to the fork.
+
+        Returns:
+            A new GameMap holding the same units as this one
+
+        """
+        # The fork may hold on to the units a rollback returns to, so they are shared after it too
+        for snapshot, shared in self.__checkpoints:
+            shared[:] = bytearray(b'\x01') * len(shared)
+        return self.__fork()
+
+    def __fork(self):
+        forked = GameMap.__new__(GameMap)
+        forked.__dict__.update(self.__dict__)
+        forked.__map = [column[:] for column in self.__map]
+        forked.__structure_type = array('b', self.__structure_type)
+        forked.__owner = array('b', self.__owner)
+        forked.__health = array('d', self.__health)
+        forked.__upgraded = bytearray(self.__upgraded)
+        forked.__mobile_count = [array('H', counts) for counts in self.__mobile_count]
+        forked.__change_listeners = []
+        forked.__checkpoints = []
+        self.__shared = bytearray(b'\x01') * len(self.__shared)
+        forked.__shared = bytearray(self.__shared)
+        return forked
+
+    def checkpoint(self):
+        """Saves the current state of the map so that rollback can return to it.
+        Checkpoints can be nested, each rollback returns to the most recent one.
+        """
+        # Locations not shared before the checkpoint are only shared with the snapshot, which rollback discards
+        shared = bytearray(self.__shared)
+        self.__checkpoints.append((self.__fork(), shared))
+
+    def rollback(self):
+        """Returns the map to the state it had at the most recent checkpoint, and removes that checkpoint.
+        Change listeners are called for every location that changed since the checkpoint.
+
+        Returns:
+            True if the map was rolled back, False if there was no checkpoint
+        """
+        if not self.__checkpoints:
+            self.warn("Called rollback without a checkpoint to return to")
+            return False
+        snapshot, shared = self.__checkpoints.pop()
+        # Every location changed since the checkpoint was given a new list of units
+        changed = [(x, y) for x, y in ARENA_TILES if self.__map[x][y] is not snapshot.__map[x][y]]
+        self.__map = snapshot.__map
+        self.__structure_type = snapshot.__structure_type
+        self.__owner = snapshot.__owner
+        self.__health = snapshot.__health
+        self.__upgraded = snapshot.__upgraded
+        self.__mobile_count = snapshot.__mobile_count
+        self.__shared = shared
+        self.__blocking_signature = snapshot.__blocking_signature
+        for x, y in changed:
+            for listener in self.__change_listeners:
+                listener(x, y)
+        return True
+
+    def __refresh_location(self, x, y):
+        index = x * self.ARENA_SIZE + y
+        structure_type = -1
+        owner = -1
+        health = 0.0
+        upgraded = 0
+        mobile_count = [0, 0]
+        for unit in self.__map[x][y]:
+            if unit.stationary:
+                structure_type = self.__type_index.get(unit.unit_type, -1)
+                owner = unit.player_index if unit.player_index in (0, 1) else -1
+                health = unit.health
+                upgraded = 1 if unit.upgraded else 0
+            elif unit.player_index in (0, 1):
+                mobile_count[unit.player_index] += 1
+        if self.__structure_type[index] != structure_type:
+            self.__structure_type[index] = structure_type
+            self.__blocking_signature = None
+        self.__owner[index] = owner
+        self.__health[index] = health
+        self.__upgraded[index] = upgraded
+        self.__mobile_count[0][index] = mobile_count[0]
+        self.__mobile_count[1][index] = mobile_count[1]
+        for listener in self.__change_listeners:
+            listener(x, y)
+
     def _invalid_coordinates(self, location):
         self.warn("{} is out of bounds.".format(str(location)))
 
@@ -89,19 +285,9 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        if type(x) is int and type(y) is int:
+            return 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_ARENA[x * ARENA_SIZE + y]
+        return _diamond_contains(x, y)
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -117,8 +303,7 @@ class GameMap:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [list(location) for location in EDGE_LOCATIONS[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -127,27 +312,7 @@ class GameMap:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
         """
-        top_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = self.ARENA_SIZE - 1 - num
-            top_right.append([int(x), int(y)])
-        top_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = self.ARENA_SIZE - 1 - num
-            top_left.append([int(x), int(y)])
-        bottom_left = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA - 1 - num
-            y = num
-            bottom_left.append([int(x), int(y)])
-        bottom_right = []
-        for num in range(0, self.HALF_ARENA):
-            x = self.HALF_ARENA + num
-            y = num
-            bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return [[list(location) for location in edge] for edge in EDGE_LOCATIONS]
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -166,12 +331,47 @@ class GameMap:
         if player_index < 0 or player_index > 1:
             self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
 
-        x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
-        if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+        if new_unit.stationary:
+            self.__map[location[0]][location[1]] = []
+            self.__shared[location[0] * self.ARENA_SIZE + location[1]] = 0
+        self.place_unit(new_unit)
+
+    def place_unit(self, unit):
+        """Place an existing GameUnit on the map at its own x and y coordinates.
+
+        Args:
+            unit: The GameUnit to place. It is added alongside any units already at its location.
+
+        Like add_unit, this only changes the data stored in GameMap. It is used by GameState
+        to fill in the map while parsing the game state.
+        """
+        x, y = unit.x, unit.y
+        if not self.in_arena_bounds([x, y]):
+            self._invalid_coordinates([x, y])
+            return
+
+        self.__tile(x, y).append(unit)
+        if not unit.stationary and unit.player_index in (0, 1):
+            self.__mobile_count[unit.player_index][x * self.ARENA_SIZE + y] += 1
+            for listener in self.__change_listeners:
+                listener(x, y)
         else:
-            self.__map[x][y] = [new_unit]
+            self.__refresh_location(x, y)
+
+    def refresh_location(self, location):
+        """Recompute the per-tile arrays for a location from the units stored there.
+
+        Args:
+            location: The location to refresh
+
+        Call this after changing the units at a location without going through GameMap,
+        for example after appending to game_map[x, y] or upgrading a unit in place.
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+        self.__refresh_location(location[0], location[1])
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -187,13 +387,133 @@ class GameMap:
         
         x, y = location
         self.__map[x][y] = []
+        self.__shared[x * self.ARENA_SIZE + y] = 0
+        self.__refresh_location(x, y)
+
+    def add_change_listener(self, listener):
+        """Register a function to be called whenever the units at a location change through GameMap
+
+        Args:
+            listener: A function taking the x and y coordinates of the changed location
+
+        """
+        self.__change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        """Stop calling a function registered with add_change_listener
+
+        Args:
+            listener: The function to remove
+
+        """
+        if listener in self.__change_listeners:
+            self.__change_listeners.remove(listener)
 
-    def get_locations_in_range(self, location, radius):
+    def get_unit_type_index(self, unit_type):
+        """Gets the index of a unit type in config["unitInformation"]
+
+        Args:
+            unit_type: A unit type shorthand, WALL, SCOUT, etc.
+
+        Returns:
+            The index used for this unit type in get_structure_grid, or -1 for an unknown type
+
+        """
+        return self.__type_index.get(unit_type, -1)
+
+    def get_structure(self, location):
+        """Gets the structure at a location, without scanning tiles that hold no structure
+
+        Args:
+            location: The location to check
+
+        Returns:
+            The stationary GameUnit at the location, or None if there is none
+
+        """
+        x, y = location
+        if self.__structure_type[x * self.ARENA_SIZE + y] < 0:
+            return None
+        for unit in self.__tile(x, y):
+            if unit.stationary:
+                return unit
+        return None
+
+    def get_structure_grid(self):
+        """Gets a read-only view of the structure type on every tile
+
+        The view, like all the get_*_grid views, is indexed by x * ARENA_SIZE + y and
+        stays up to date as the map changes. Locations outside of the arena are always empty.
+
+        Returns:
+            For each tile, the index of its structure's type in config["unitInformation"], or -1 if the tile has no structure
+
+        """
+        return memoryview(self.__structure_type).toreadonly()
+
+    def get_blocking_signature(self):
+        """Gets a compact description of which tiles are blocked by structures
+
+        Two maps with the same signature have structures on exactly the same tiles, so
+        pathing results can be cached using the signature as a key.
+
+        Returns:
+            A bytes object with one byte per grid index (x * ARENA_SIZE + y), 1 if the tile has a structure and 0 otherwise
+
+        """
+        if self.__blocking_signature is None:
+            self.__blocking_signature = self.__structure_type.tobytes().translate(_BLOCKED_TABLE)
+        return self.__blocking_signature
+
+    def get_owner_grid(self):
+        """Gets a read-only view of the owner of the structure on every tile
+
+        Returns:
+            For each tile, the player index of its structure's owner, or -1 if the tile has no structure
+
+        """
+        return memoryview(self.__owner).toreadonly()
+
+    def get_health_grid(self):
+        """Gets a read-only view of the health of the structure on every tile
+
+        Returns:
+            For each tile, the health of its structure, or 0 if the tile has no structure
+
+        """
+        return memoryview(self.__health).toreadonly()
+
+    def get_upgraded_grid(self):
+        """Gets a read-only view of whether the structure on every tile is upgraded
+
+        Returns:
+            For each tile, 1 if it has an upgraded structure, 0 otherwise
+
+        """
+        return memoryview(self.__upgraded).toreadonly()
+
+    def get_mobile_count_grid(self, player_index):
+        """Gets a read-only view of the number of mobile units a player has on every tile
+
+        Args:
+            player_index: The index corresponding to the player whos units are counted, 0 for you 1 for the enemy
+
+        Returns:
+            For each tile, the number of mobile units the given player has there
+
+        """
+        if player_index < 0 or player_index > 1:
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            return
+        return memoryview(self.__mobile_count[player_index]).toreadonly()
+
+    def get_locations_in_range(self, location, radius, as_indices=False):
         """Gets locations in a circular area around a location
 
         Args:
             location: The center of our search area
             radius: The radius of our search area
+            as_indices: If True, return grid indices (x * ARENA_SIZE + y) instead of [x, y] lists
 
         Returns:
             The locations that are within our search area
@@ -206,14 +526,23 @@ class GameMap:
 
         x, y = location
         locations = []
+        if type(x) is int and type(y) is int:
+            # A unit with a given range affects all locations who's centers are within that range + get hit radius
+            for dx, dy in get_range_stencil(radius, self.__hit_radius):
+                i = x + dx
+                j = y + dy
+                if 0 <= i < ARENA_SIZE and 0 <= j < ARENA_SIZE and IN_ARENA[i * ARENA_SIZE + j]:
+                    locations.append(i * ARENA_SIZE + j if as_indices else [i, j])
+            return locations
+
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
+        getHitRadius = self.__hit_radius
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
                 # A unit with a given range affects all locations who's centers are within that range + get hit radius
                 if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
-                    locations.append(new_location)
+                    locations.append(i * ARENA_SIZE + j if as_indices else new_location)
         return locations
 
     def distance_between_locations(self, location_1, location_2):
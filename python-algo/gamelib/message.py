@@ -0,0 +1,97 @@
+import json
+
+# The kinds of messages the engine sends. The game state kinds match turnInfo[0]
+CONFIG = -1
+TURN = 0
+ACTION_FRAME = 1
+END = 2
+UNKNOWN = -2
+
+_TURN_INFO_KEY = '"turnInfo"'
+_EVENTS_KEY = '"events"'
+
+
+class GameMessage(str):
+    """A message from the game engine, which is still the raw string it was read as
+
+    The kind of message is found by locating turnInfo in the string, without decoding the
+    rest of it. The full JSON is decoded the first time data is accessed and kept, so the
+    message is parsed at most once however many times it is read. GameState accepts a
+    GameMessage in place of the serialized string and reuses the decoded data.
+
+    Attributes :
+        * message_type (int): CONFIG, TURN, ACTION_FRAME, END or UNKNOWN
+        * turn_info (list): The turnInfo of a game state message as [type, turn, frame], None for other messages
+
+    """
+    def __new__(cls, line):
+        message = super().__new__(cls, line)
+        message._data = None
+        message.turn_info = None
+        message.message_type = UNKNOWN
+
+        key_index = line.find(_TURN_INFO_KEY)
+        if key_index != -1:
+            start = line.find('[', key_index + len(_TURN_INFO_KEY))
+            end = line.find(']', start)
+            if start != -1 and end != -1:
+                try:
+                    message.turn_info = json.loads(line[start:end + 1])
+                    message.message_type = int(message.turn_info[0])
+                except (ValueError, TypeError, IndexError):
+                    message.turn_info = None
+                if message.message_type not in (TURN, ACTION_FRAME, END):
+                    message.message_type = UNKNOWN
+        elif "replaySave" in line:
+            message.message_type = CONFIG
+        return message
+
+    @property
+    def data(self):
+        """The decoded JSON of the message. It is shared by every reader of the message, so don't modify it
+        """
+        if self._data is None:
+            self._data = json.loads(self)
+        return self._data
+
+    def has_events(self, event_types):
+        """Checks whether a game state message holds any event of the given types, without decoding it
+
+        Args:
+            event_types: Names of event lists, such as "breach" or "death"
+
+        Returns:
+            True if at least one of the event lists is not empty
+
+        """
+        events_index = self.find(_EVENTS_KEY)
+        if events_index == -1:
+            return False
+        for event_type in event_types:
+            index = self.find('"{}"'.format(event_type), events_index)
+            if index == -1:
+                continue
+            index = self.find('[', index)
+            if index == -1:
+                continue
+            index += 1
+            while index < len(self) and self[index] in " \t\r\n":
+                index += 1
+            if index < len(self) and self[index] != ']':
+                return True
+        return False
+
+
+def load_message(message):
+    """Decodes a message from the game engine
+
+    Args:
+        message: A GameMessage or a JSON string
+
+    Returns:
+        The decoded message, only decoded once for a GameMessage
+
+    """
+    if isinstance(message, GameMessage):
+        return message.data
+    return json.loads(message)
@@ -0,0 +1,144 @@
+import functools
+import sys
+import time
+
+from .game_state import GameState
+
+# The GameState functions timed by a Profiler, by the name they are reported under
+PROFILED_FUNCTIONS = {
+    "parse_state": (GameState, "_GameState__parse_state"),
+    "find_path_to_edge": (GameState, "find_path_to_edge"),
+    "get_attackers": (GameState, "get_attackers"),
+    "get_target": (GameState, "get_target"),
+    "can_spawn": (GameState, "can_spawn"),
+    "attempt_spawn": (GameState, "attempt_spawn"),
+    "attempt_spawn_batch": (GameState, "attempt_spawn_batch"),
+    "submit_turn": (GameState, "submit_turn"),
+}
+
+
+class Profiler:
+    """Counts and times calls to the gamelib functions strategies spend most of their turn in
+
+    Nothing is measured until enable is called, which replaces the functions in
+    PROFILED_FUNCTIONS with timed versions, so a disabled profiler costs nothing.
+    Times include the functions called from the timed function, for example attempt_spawn
+    includes its call to attempt_spawn_batch. AlgoCore.enable_profiling sets up a profiler that
+    groups calls by turn and writes a summary when the game ends.
+
+    Attributes :
+        * turns (list): For each finished turn, a (turn number, turn time, stats) tuple, where stats maps
+          function names to [calls, total seconds]
+        * current (dict): The stats of the turn being played
+
+    """
+    def __init__(self, functions=None):
+        """Creates a disabled profiler
+
+        Args:
+            functions: A dict mapping names to (class, attribute) pairs to time, PROFILED_FUNCTIONS by default
+
+        """
+        self.__functions = PROFILED_FUNCTIONS if functions is None else functions
+        self.__originals = {}
+        self.turns = []
+        self.current = {}
+        self.__turn_number = None
+        self.__turn_started = None
+
+    @property
+    def enabled(self):
+        """True while the profiled functions are replaced by timed versions
+        """
+        return bool(self.__originals)
+
+    def enable(self):
+        """Starts timing the profiled functions
+        """
+        for name, (owner, attribute) in self.__functions.items():
+            if name in self.__originals:
+                continue
+            original = owner.__dict__[attribute]
+            self.__originals[name] = original
+            setattr(owner, attribute, self.__timed(name, original))
+
+    def disable(self):
+        """Puts the original functions back
+        """
+        for name, original in self.__originals.items():
+            owner, attribute = self.__functions[name]
+            setattr(owner, attribute, original)
+        self.__originals = {}
+
+    def __timed(self, name, function):
+        current = self.__current_stats
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stats = current(name)
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+        return timed
+
+    def __current_stats(self, name):
+        stats = self.current.get(name)
+        if stats is None:
+            stats = [0, 0.0]
+            self.current[name] = stats
+        return stats
+
+    def start_turn(self, turn_number):
+        """Starts grouping calls under a new turn
+        """
+        self.__turn_number = turn_number
+        self.__turn_started = time.perf_counter()
+        self.current = {}
+
+    def end_turn(self):
+        """Stores the calls made since start_turn
+        """
+        if self.__turn_started is None:
+            return
+        self.turns.append((self.__turn_number, time.perf_counter() - self.__turn_started, self.current))
+        self.__turn_started = None
+        self.current = {}
+
+    def summary(self):
+        """Builds a table of the calls made during the game, with totals and the slowest turn
+
+        Returns:
+            The summary as a string
+        """
+        totals = {}
+        for _, _, stats in self.turns:
+            for name, (calls, seconds) in stats.items():
+                total = totals.setdefault(name, [0, 0.0])
+                total[0] += calls
+                total[1] += seconds
+        turn_time = sum(turn[1] for turn in self.turns)
+        lines = ["Profile of {} turns, {:.3f}s in on_turn".format(len(self.turns), turn_time)]
+        lines.append("{:<20}{:>10}{:>12}{:>12}".format("function", "calls", "total ms", "per call us"))
+        for name, (calls, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append("{:<20}{:>10}{:>12.1f}{:>12.1f}".format(name, calls, seconds * 1000, seconds * 1e6 / calls if calls else 0))
+        if self.turns:
+            turn_number, seconds, stats = max(self.turns, key=lambda turn: turn[1])
+            busiest = ", ".join("{} {:.1f}ms".format(name, stats[name][1] * 1000) for name in sorted(stats, key=lambda name: -stats[name][1])[:3])
+            lines.append("Slowest turn: {} in {:.1f}ms ({})".format(turn_number, seconds * 1000, busiest))
+        return "\n".join(lines)
+
+    def write_summary(self, path=None):
+        """Writes the summary to a file, or to stderr where the game's debug output goes
+
+        Args:
+            path: The file to write to, None for stderr
+        """
+        summary = self.summary() + "\n"
+        if path is None:
+            sys.stderr.write(summary)
+            sys.stderr.flush()
+        else:
+            with open(path, "w") as summary_file:
+                summary_file.write(summary)
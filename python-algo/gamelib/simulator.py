@@ -0,0 +1,402 @@
+import math
+from array import array
+from .game_map import ARENA_SIZE, IN_ARENA, EDGE_LOCATIONS, get_range_stencil
+from .navigation import ShortestPathFinder, GRID_X, GRID_Y, NUM_GRID_TILES
+from .unit import get_unit_stats
+
+# The number of distance fields kept between simulations before the cache is cleared
+FIELD_CACHE_SIZE = 64
+
+_HORIZONTAL = 1
+_VERTICAL = 2
+
+
+class SimulationResult:
+    """The outcome of an action phase played out by ActionSimulator
+
+    Attributes :
+        * frames (int): The number of frames simulated
+        * player_health ([float, float]): The health of you and your opponent at the end of the action phase
+        * resources_gained ([float, float]): The SP each player earned by breaching
+        * breaches (list): Every breach as [x, y, unit_type, player_index, damage]
+        * self_destructs (list): Every self destruct as [x, y, unit_type, player_index]
+        * destroyed_structures (list): Every destroyed structure as [x, y, unit_type, player_index]
+        * structure_damage ([float, float]): The damage each player's units dealt to enemy structures
+        * structure_type (array): The structure type index of every grid index (x * ARENA_SIZE + y) at the end, -1 for none
+        * structure_health (array): The structure health of every grid index at the end
+        * surviving_units ([int, int]): The mobile units of each player still alive when the simulation stopped
+        * events (list): If events were recorded, one dict per frame in the format of the engine's action frames, None otherwise
+
+    """
+    def __init__(self):
+        self.frames = 0
+        self.player_health = [0, 0]
+        self.resources_gained = [0, 0]
+        self.breaches = []
+        self.self_destructs = []
+        self.destroyed_structures = []
+        self.structure_damage = [0, 0]
+        self.structure_type = None
+        self.structure_health = None
+        self.surviving_units = [0, 0]
+        self.events = None
+
+
+class ActionSimulator:
+    """Plays out an action phase frame by frame to predict its outcome
+
+    The simulator reads the structures of a GameState once, then every call to simulate
+    works on copies of flat per-tile arrays and on parallel lists describing the mobile
+    units, so many candidate deploys can be compared within a turn. Units follow the rules
+    of the engine: they move once every 1/speed frames along the paths ShortestPathFinder
+    computes for the current board, supports shield friendly mobile units in range once each,
+    every unit attacks its target as chosen by GameState.get_target, units that reach their
+    edge breach and units that cannot move further self destruct.
+
+    Distance fields are cached by board and edge between calls, so rollouts that start from
+    the same board only compute their paths once.
+
+    Attributes :
+        * game_state (:obj: GameState): The state the simulations start from
+        * config (JSON): The game rules
+        * max_frames (int): Simulations stop after this many frames even if units are left
+
+    """
+    def __init__(self, game_state, max_frames=500):
+        """Reads the board of a GameState. Structures spawned or upgraded afterwards are not seen,
+        create a new simulator or call refresh after changing the game state.
+
+        Args:
+            game_state: The GameState to simulate from
+            max_frames: The largest number of frames to simulate
+
+        """
+        self.game_state = game_state
+        self.config = game_state.config
+        self.max_frames = max_frames
+        self._finder = ShortestPathFinder()
+        self._fields = {}
+        self._tile_units = [[] for _ in range(NUM_GRID_TILES)]
+        unit_information = self.config["unitInformation"]
+        self._hit_radius = unit_information[0].get('getHitRadius', 0)
+        resources = self.config.get("resources", {})
+        self._resources_per_damage = resources.get("coresForPlayerDamage", 0)
+
+        # Stats of every unit type, by type index then upgraded
+        self._stats = []
+        for type_index, type_config in enumerate(unit_information):
+            if "unitCategory" not in type_config:
+                break
+            base = self.__unit_stats(get_unit_stats(self.config, type_config["shorthand"]), type_config)
+            upgraded = self.__unit_stats(get_unit_stats(self.config, type_config["shorthand"], True), dict(type_config, **type_config.get("upgrade", {})))
+            self._stats.append((base, upgraded))
+        self._targeting_tiles_cache = {}
+        self.refresh()
+
+    def __unit_stats(self, unit_stats, type_config):
+        return (unit_stats.stationary, unit_stats.speed, unit_stats.max_health, unit_stats.damage_f, unit_stats.damage_i, unit_stats.attackRange,
+            unit_stats.shieldRange, unit_stats.shieldPerUnit, unit_stats.shieldBonusPerY,
+            type_config.get("playerBreachDamage", 0), type_config.get("selfDestructDamageWalker", 0),
+            type_config.get("selfDestructDamageTower", 0), type_config.get("selfDestructRange", 0),
+            type_config.get("selfDestructStepsRequired", 0))
+
+    def refresh(self):
+        """Reads the structures of the game state again, after they have been changed
+        """
+        game_map = self.game_state.game_map
+        self._structure_type = array('b', game_map.get_structure_grid())
+        self._owner = array('b', game_map.get_owner_grid())
+        self._health = array('d', game_map.get_health_grid())
+        self._upgraded = bytearray(game_map.get_upgraded_grid())
+        self._blocked = bytearray(game_map.get_blocking_signature())
+
+    def _targeting_tiles(self, position, radius):
+        # The tiles within range of an attacker, in get_locations_in_range order, with the distance to
+        # each and how far each is from the center of the board
+        key = (position, radius)
+        tiles = self._targeting_tiles_cache.get(key)
+        if tiles is None:
+            x, y = GRID_X[position], GRID_Y[position]
+            tiles = []
+            for dx, dy in get_range_stencil(radius, self._hit_radius):
+                index = self.__index(x + dx, y + dy)
+                if index >= 0:
+                    tiles.append((index, math.sqrt(dx**2 + dy**2), y + dy, -abs(ARENA_SIZE / 2 - 0.5 - (x + dx))))
+            tiles = tuple(tiles)
+            self._targeting_tiles_cache[key] = tiles
+        return tiles
+
+    def _get_field(self, blocked, edge):
+        key = (blocked, edge)
+        field = self._fields.get(key)
+        if field is None:
+            if len(self._fields) >= FIELD_CACHE_SIZE:
+                self._fields.clear()
+            field = self._finder.get_distance_field(EDGE_LOCATIONS[edge], blocked)
+            self._fields[key] = field
+        return field
+
+    def simulate(self, deploys=None, enemy_deploys=(), record_events=False):
+        """Plays out an action phase
+
+        Args:
+            deploys: Your mobile units as (unit_type, x, y) tuples, by default those spawned this turn with attempt_spawn
+            enemy_deploys: Your opponent's mobile units as (unit_type, x, y) tuples
+            record_events: If True, the result holds the events of every frame. Slower, meant for debugging
+
+        Returns:
+            A SimulationResult. Units that are not mobile units, or are on blocked or out of bounds locations, are ignored
+
+        """
+        game_state = self.game_state
+        if deploys is None:
+            deploys = [deploy for deploy in game_state._deploy_stack if self.__is_mobile(deploy[0])]
+        stats = self._stats
+        hit_radius = self._hit_radius
+        tile_units = self._tile_units
+        finder = self._finder
+
+        # Board state, copied so that the simulator can be reused
+        structure_type = array('b', self._structure_type)
+        owner = array('b', self._owner)
+        health = array('d', self._health)
+        upgraded = self._upgraded
+        blocked = bytearray(self._blocked)
+        signature = bytes(blocked)
+
+        # Mobile units, as parallel lists indexed by unit id
+        unit_type = []
+        unit_player = []
+        unit_position = []
+        unit_health = []
+        unit_edge = []
+        unit_period = []
+        unit_timer = []
+        unit_direction = []
+        unit_steps = []
+        unit_shielded = []
+        alive = []
+        get_type_index = game_state.game_map.get_unit_type_index
+        for player_index, player_deploys in ((0, deploys), (1, enemy_deploys)):
+            for shorthand, x, y in player_deploys:
+                if not self.__is_mobile(shorthand) or not game_state.game_map.in_arena_bounds([x, y]) or blocked[x * ARENA_SIZE + y]:
+                    continue
+                type_index = get_type_index(shorthand)
+                unit_stats = stats[type_index][0]
+                position = x * ARENA_SIZE + y
+                unit_type.append(type_index)
+                unit_player.append(player_index)
+                unit_position.append(position)
+                unit_health.append(unit_stats[2])
+                unit_edge.append(game_state.get_target_edge([x, y]))
+                unit_period.append(max(1, round(1 / unit_stats[1])) if unit_stats[1] > 0 else 0)
+                unit_timer.append(0)
+                unit_direction.append(0)
+                unit_steps.append(0)
+                unit_shielded.append(set())
+                alive.append(True)
+                tile_units[position].append(len(unit_type) - 1)
+        num_units = len(unit_type)
+        board = (structure_type, owner, health)
+        units = (unit_type, unit_player, unit_position, unit_health)
+        alive_count = [unit_player.count(0), unit_player.count(1)]
+
+        # Structures that attack or shield, by grid index
+        attackers = []
+        shielders = []
+        for index in range(NUM_GRID_TILES):
+            type_index = structure_type[index]
+            if type_index < 0:
+                continue
+            structure_stats = stats[type_index][upgraded[index]]
+            if structure_stats[3] > 0 or structure_stats[4] > 0:
+                attackers.append(index)
+            if structure_stats[6] > 0 and structure_stats[7] + structure_stats[8] > 0:
+                y = GRID_Y[index]
+                amount = structure_stats[7] + structure_stats[8] * (y if owner[index] == 0 else ARENA_SIZE - 1 - y)
+                covered = frozenset(self.__covered(index, get_range_stencil(structure_stats[6], hit_radius)))
+                shielders.append((index, type_index, owner[index], amount, covered))
+
+        result = SimulationResult()
+        player_health = [game_state.my_health, game_state.enemy_health]
+        events = [] if record_events else None
+        frame_events = None
+        frame = 0
+        while frame < self.max_frames and (alive_count[0] or alive_count[1]):
+            frame += 1
+            if record_events:
+                frame_events = {"attack": [], "breach": [], "damage": [], "death": [], "move": [], "selfDestruct": [], "shield": []}
+                events.append(frame_events)
+
+            # Supports shield every friendly mobile unit in range once
+            for index, type_index, shield_owner, amount, covered in shielders:
+                if structure_type[index] != type_index:
+                    continue
+                for unit in range(num_units):
+                    if alive[unit] and unit_player[unit] == shield_owner and unit_position[unit] in covered and index not in unit_shielded[unit]:
+                        unit_shielded[unit].add(index)
+                        unit_health[unit] += amount
+                        if record_events:
+                            frame_events["shield"].append([[GRID_X[index], GRID_Y[index]], [GRID_X[unit_position[unit]], GRID_Y[unit_position[unit]]],
+                                amount, type_index, None, unit, shield_owner + 1])
+
+            # Mobile units move once every 1/speed frames
+            self_destructed = False
+            for unit in range(num_units):
+                if not alive[unit] or not unit_period[unit]:
+                    continue
+                unit_timer[unit] += 1
+                if unit_timer[unit] < unit_period[unit]:
+                    continue
+                unit_timer[unit] = 0
+                position = unit_position[unit]
+                field = self._get_field(signature, unit_edge[unit])
+                next_position = finder.get_next_move(position, unit_direction[unit], field)
+                player_index = unit_player[unit]
+                unit_stats = stats[unit_type[unit]][0]
+                x, y = GRID_X[position], GRID_Y[position]
+                if next_position == position:
+                    # The unit can't move any further, so it self destructs
+                    result.self_destructs.append([x, y, unit_type[unit], player_index])
+                    if record_events:
+                        frame_events["selfDestruct"].append([[x, y], [], unit_stats[10], unit_type[unit], unit, player_index + 1])
+                    if unit_steps[unit] >= unit_stats[13]:
+                        for dx, dy in get_range_stencil(unit_stats[12], hit_radius):
+                            index = self.__index(x + dx, y + dy)
+                            if index < 0:
+                                continue
+                            if structure_type[index] >= 0 and owner[index] != player_index and health[index] > 0:
+                                health[index] -= unit_stats[11]
+                                result.structure_damage[player_index] += unit_stats[11]
+                            for target in tile_units[index]:
+                                if unit_player[target] != player_index:
+                                    unit_health[target] -= unit_stats[10]
+                    self.__remove_unit(unit, alive, alive_count, unit_player, unit_position)
+                    self_destructed = True
+                    if record_events:
+                        frame_events["death"].append([[x, y], unit_type[unit], unit, player_index + 1, False])
+                    continue
+
+                tile_units[position].remove(unit)
+                tile_units[next_position].append(unit)
+                unit_position[unit] = next_position
+                unit_steps[unit] += 1
+                unit_direction[unit] = _VERTICAL if GRID_X[position] == GRID_X[next_position] else _HORIZONTAL
+                if record_events:
+                    frame_events["move"].append([[x, y], [GRID_X[next_position], GRID_Y[next_position]], [], unit_type[unit], unit, player_index + 1])
+                if next_position in field.targets[1]:
+                    # The unit reached its edge and breaches
+                    damage = unit_stats[9]
+                    player_health[1 - player_index] -= damage
+                    result.resources_gained[player_index] += damage * self._resources_per_damage
+                    result.breaches.append([GRID_X[next_position], GRID_Y[next_position], unit_type[unit], player_index, damage])
+                    if record_events:
+                        frame_events["breach"].append([[GRID_X[next_position], GRID_Y[next_position]], damage, unit_type[unit], unit, player_index + 1])
+                    self.__remove_unit(unit, alive, alive_count, unit_player, unit_position)
+
+            # Every unit attacks its target
+            structure_damage = result.structure_damage[0] + result.structure_damage[1]
+            if alive_count[0] or alive_count[1]:
+                for index in attackers:
+                    type_index = structure_type[index]
+                    if type_index < 0 or not alive_count[1 - owner[index]]:
+                        continue
+                    self.__attack(None, type_index, index, owner[index], stats[type_index][upgraded[index]], board, units, result, frame_events)
+                for unit in range(num_units):
+                    if alive[unit]:
+                        self.__attack(unit, unit_type[unit], unit_position[unit], unit_player[unit], stats[unit_type[unit]][0], board, units, result, frame_events)
+
+            # Destroyed units are removed at the end of the frame
+            for unit in range(num_units):
+                if alive[unit] and unit_health[unit] <= 0:
+                    if record_events:
+                        position = unit_position[unit]
+                        frame_events["death"].append([[GRID_X[position], GRID_Y[position]], unit_type[unit], unit, unit_player[unit] + 1, False])
+                    self.__remove_unit(unit, alive, alive_count, unit_player, unit_position)
+            if structure_damage != result.structure_damage[0] + result.structure_damage[1] or self_destructed:
+                for index in range(NUM_GRID_TILES):
+                    if structure_type[index] >= 0 and health[index] <= 0:
+                        result.destroyed_structures.append([GRID_X[index], GRID_Y[index], structure_type[index], owner[index]])
+                        if record_events:
+                            frame_events["death"].append([[GRID_X[index], GRID_Y[index]], structure_type[index], None, owner[index] + 1, False])
+                        structure_type[index] = -1
+                        owner[index] = -1
+                        health[index] = 0
+                        blocked[index] = 0
+                        signature = None
+                if signature is None:
+                    signature = bytes(blocked)
+
+        for unit in range(num_units):
+            if alive[unit]:
+                tile_units[unit_position[unit]].remove(unit)
+        result.frames = frame
+        result.player_health = player_health
+        result.structure_type = structure_type
+        result.structure_health = health
+        result.surviving_units = alive_count
+        result.events = events
+        return result
+
+    def __is_mobile(self, shorthand):
+        type_index = self.game_state.game_map.get_unit_type_index(shorthand)
+        return 0 <= type_index < len(self._stats) and not self._stats[type_index][0][0]
+
+    def __index(self, x, y):
+        if 0 <= x < ARENA_SIZE and 0 <= y < ARENA_SIZE and IN_ARENA[x * ARENA_SIZE + y]:
+            return x * ARENA_SIZE + y
+        return -1
+
+    def __covered(self, index, stencil):
+        x, y = GRID_X[index], GRID_Y[index]
+        for dx, dy in stencil:
+            covered = self.__index(x + dx, y + dy)
+            if covered >= 0:
+                yield covered
+
+    def __remove_unit(self, unit, alive, alive_count, unit_player, unit_position):
+        alive[unit] = False
+        alive_count[unit_player[unit]] -= 1
+        self._tile_units[unit_position[unit]].remove(unit)
+
+    def __attack(self, unit, type_index, position, player_index, unit_stats, board, units, result, frame_events):
+        # Chooses a target with the priority of GameState.get_target and deals damage to it
+        structure_type, owner, health = board
+        unit_type, unit_player, unit_position, unit_health = units
+        damage_f, damage_i = unit_stats[3], unit_stats[4]
+        tile_units = self._tile_units
+        target = -1
+        target_is_structure = True
+        target_key = None
+        for index, distance, unit_y, x_key in self._targeting_tiles(position, unit_stats[5]):
+            # Nearest, then lowest health, then lowest y for player 0 and highest for player 1, then furthest from the center
+            y_key = unit_y if player_index == 0 else -unit_y
+            if damage_i > 0:
+                for candidate in tile_units[index]:
+                    if unit_player[candidate] == player_index or unit_health[candidate] <= 0:
+                        continue
+                    key = (distance, unit_health[candidate], y_key, x_key)
+                    # Mobile units are always preferred to structures
+                    if target_is_structure or key < target_key:
+                        target, target_is_structure, target_key = candidate, False, key
+            if damage_f > 0 and target_is_structure and structure_type[index] >= 0 and owner[index] != player_index and health[index] > 0:
+                key = (distance, health[index], y_key, x_key)
+                if target_key is None or key < target_key:
+                    target, target_key = index, key
+
+        if target < 0:
+            return
+        if target_is_structure:
+            damage = damage_f
+            health[target] -= damage
+            result.structure_damage[player_index] += damage
+            target_position = target
+        else:
+            damage = damage_i
+            unit_health[target] -= damage
+            target_position = unit_position[target]
+        if frame_events is not None:
+            target_id = None if target_is_structure else target
+            target_type = structure_type[target] if target_is_structure else unit_type[target]
+            frame_events["attack"].append([[GRID_X[position], GRID_Y[position]], [GRID_X[target_position], GRID_Y[target_position]], damage, type_index, unit, target_id, player_index + 1])
+            frame_events["damage"].append([[GRID_X[target_position], GRID_Y[target_position]], damage, target_type, target_id, 2 - player_index])
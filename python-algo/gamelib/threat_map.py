@@ -0,0 +1,192 @@
+import math
+from array import array
+from .game_map import ARENA_SIZE, ARENA_TILES, IN_ARENA
+
+class ThreatMap:
+    """Precomputed coverage of the board by every unit able to attack.
+
+    For each player, the threat map holds, on every tile, the enemy units that could attack
+    a unit of that player standing there, how many there are and how much damage they deal
+    per frame to mobile units and to structures. It is built once from a GameMap and then
+    kept up to date as units are added, removed or upgraded through GameMap and GameState.
+
+    Attributes :
+        * game_map (:obj: GameMap): The map this threat map follows
+        * max_range (float): The largest attackRange in the config, the search radius used by get_attackers
+        * hit_radius (float): The getHitRadius from the config
+
+    """
+    def __init__(self, game_map):
+        """Builds the threat map and registers it with the map to stay up to date
+
+        Args:
+            game_map: The GameMap to follow
+
+        """
+        self.game_map = game_map
+        unit_information = game_map.config["unitInformation"]
+        self.max_range = 0
+        for unit in unit_information:
+            if unit.get('attackRange', 0) >= self.max_range:
+                self.max_range = unit.get('attackRange', 0)
+        self.hit_radius = unit_information[0].get('getHitRadius', 0)
+
+        num_tiles = ARENA_SIZE * ARENA_SIZE
+        self.__count = [array('H', [0]) * num_tiles, array('H', [0]) * num_tiles]
+        self.__mobile_damage = [array('d', [0.0]) * num_tiles, array('d', [0.0]) * num_tiles]
+        self.__structure_damage = [array('d', [0.0]) * num_tiles, array('d', [0.0]) * num_tiles]
+        # For each player and tile, the attackers sorted by their grid index, and those grid indices
+        self.__attackers = [[[] for _ in range(num_tiles)] for _ in range(2)]
+        self.__attacker_sources = [[[] for _ in range(num_tiles)] for _ in range(2)]
+        # The offsets covered by each attack range, computed once per range
+        self.__offsets = {}
+        # For each source tile, the (unit, covered tiles, defending players) currently registered from it
+        self.__contributions = {}
+
+        for x, y in ARENA_TILES:
+            self.__add_location(x, y)
+        game_map.add_change_listener(self.__on_location_changed)
+
+    def detach(self):
+        """Stop following the map. The threat map keeps the values it had at this point.
+        """
+        self.game_map.remove_change_listener(self.__on_location_changed)
+
+    def __on_location_changed(self, x, y):
+        self.__remove_location(x, y)
+        self.__add_location(x, y)
+
+    def __covered_indices(self, x, y, attack_range):
+        # A unit at x, y attacks every tile within its own range that get_attackers would search
+        offsets = self.__offsets.get(attack_range)
+        if offsets is None:
+            window = math.ceil(min(attack_range, self.max_range + self.hit_radius))
+            offsets = []
+            for dx in range(-window, window + 1):
+                for dy in range(-window, window + 1):
+                    distance = math.sqrt(dx**2 + dy**2)
+                    if distance < self.max_range + self.hit_radius and distance <= attack_range:
+                        offsets.append((dx, dy))
+            self.__offsets[attack_range] = offsets
+        covered = []
+        for dx, dy in offsets:
+            i = x + dx
+            j = y + dy
+            if 0 <= i < ARENA_SIZE and 0 <= j < ARENA_SIZE and IN_ARENA[i * ARENA_SIZE + j]:
+                covered.append(i * ARENA_SIZE + j)
+        return covered
+
+    def __add_location(self, x, y):
+        source = x * ARENA_SIZE + y
+        contributions = []
+        for unit in self.game_map._units_at(x, y):
+            if unit.damage_i + unit.damage_f <= 0:
+                continue
+            defenders = [player for player in (0, 1) if player != unit.player_index]
+            covered = self.__covered_indices(x, y, unit.attackRange)
+            for player in defenders:
+                count = self.__count[player]
+                mobile_damage = self.__mobile_damage[player]
+                structure_damage = self.__structure_damage[player]
+                attackers = self.__attackers[player]
+                sources = self.__attacker_sources[player]
+                for index in covered:
+                    count[index] += 1
+                    mobile_damage[index] += unit.damage_i
+                    structure_damage[index] += unit.damage_f
+                    # Keep attackers in the order get_attackers would find them
+                    position = len(sources[index])
+                    while position > 0 and sources[index][position - 1] > source:
+                        position -= 1
+                    sources[index].insert(position, source)
+                    attackers[index].insert(position, unit)
+            contributions.append((unit, covered, defenders, unit.damage_i, unit.damage_f))
+        if contributions:
+            self.__contributions[source] = contributions
+
+    def __remove_location(self, x, y):
+        source = x * ARENA_SIZE + y
+        for unit, covered, defenders, damage_i, damage_f in self.__contributions.pop(source, []):
+            for player in defenders:
+                count = self.__count[player]
+                mobile_damage = self.__mobile_damage[player]
+                structure_damage = self.__structure_damage[player]
+                attackers = self.__attackers[player]
+                sources = self.__attacker_sources[player]
+                for index in covered:
+                    count[index] -= 1
+                    mobile_damage[index] -= damage_i
+                    structure_damage[index] -= damage_f
+                    for position, attacker in enumerate(attackers[index]):
+                        if attacker is unit:
+                            del attackers[index][position]
+                            del sources[index][position]
+                            break
+
+    def get_attackers(self, location, player_index):
+        """Gets the units threatening a given location
+
+        Args:
+            location: The location of a hypothetical defender, in the arena bounds
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A list of units that would attack a unit controlled by the given player at the given location.
+            The units may be shared with forks of the map and should not be modified
+
+        """
+        return list(self.__attackers[player_index][location[0] * ARENA_SIZE + location[1]])
+
+    def get_attacker_count(self, location, player_index):
+        """Gets the number of units threatening a given location
+
+        Args:
+            location: The location of a hypothetical defender, in the arena bounds
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            The number of units that would attack a unit controlled by the given player at the given location
+
+        """
+        return self.__count[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def get_mobile_damage(self, location, player_index):
+        """Gets the damage per frame a mobile unit would take at a given location
+
+        Args:
+            location: The location of a hypothetical mobile unit, in the arena bounds
+            player_index: The index corresponding to the player controlling the unit, 0 for you 1 for the enemy
+
+        Returns:
+            The sum of the damage to mobile units (damage_i) of every attacker of the location
+
+        """
+        return self.__mobile_damage[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def get_structure_damage(self, location, player_index):
+        """Gets the damage per frame a structure would take at a given location
+
+        Args:
+            location: The location of a hypothetical structure, in the arena bounds
+            player_index: The index corresponding to the player controlling the structure, 0 for you 1 for the enemy
+
+        Returns:
+            The sum of the damage to structures (damage_f) of every attacker of the location
+
+        """
+        return self.__structure_damage[player_index][location[0] * ARENA_SIZE + location[1]]
+
+    def get_attacker_count_grid(self, player_index):
+        """Gets a read-only view of get_attacker_count for every tile, indexed by x * ARENA_SIZE + y
+        """
+        return memoryview(self.__count[player_index]).toreadonly()
+
+    def get_mobile_damage_grid(self, player_index):
+        """Gets a read-only view of get_mobile_damage for every tile, indexed by x * ARENA_SIZE + y
+        """
+        return memoryview(self.__mobile_damage[player_index]).toreadonly()
+
+    def get_structure_damage_grid(self, player_index):
+        """Gets a read-only view of get_structure_damage for every tile, indexed by x * ARENA_SIZE + y
+        """
+        return memoryview(self.__structure_damage[player_index]).toreadonly()
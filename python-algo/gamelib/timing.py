@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+
+from .util import send_command, debug_write
+
+# The turn limit used when the config doesn't give one, in milliseconds
+DEFAULT_TURN_LIMIT = 5000
+
+# The TurnTimer of the turn being played, if AlgoCore started one
+_current_timer = None
+
+
+class TurnTimeout(Exception):
+    """Raised by TurnTimer.check when the turn is out of time
+    """
+    pass
+
+
+class TurnTimer:
+    """Tracks the time left in a turn
+
+    AlgoCore starts a timer as soon as it receives a turn message, so the deadline includes the
+    time spent parsing the game state. Iterative searches can use time_left or check to stop in
+    time. If a fallback margin is given, a watchdog submits the best turn registered with
+    set_fallback shortly before the deadline, unless the turn was submitted already. Turns are
+    only ever submitted once, so a submit_turn after the watchdog fired does nothing.
+
+    Attributes :
+        * turn_number (int): The turn being timed
+        * budget (float): The time allowed for the turn, in seconds
+        * started (float): The time.monotonic() at which the turn message was received
+        * deadline (float): The time.monotonic() by which the turn should be submitted
+        * submitted_at (float): The time.monotonic() at which the turn was submitted, None until then
+        * used_fallback (bool): True if the watchdog submitted the turn
+
+    """
+    def __init__(self, turn_number, budget, fallback_margin=None, started=None):
+        """Starts timing a turn
+
+        Args:
+            turn_number: The turn being timed
+            budget: The time allowed for the turn, in seconds
+            fallback_margin: If given, the watchdog submits the fallback turn this many seconds before the deadline
+            started: The time.monotonic() the turn started at, now by default
+
+        """
+        self.turn_number = turn_number
+        self.budget = budget
+        self.started = time.monotonic() if started is None else started
+        self.deadline = self.started + budget
+        self.submitted_at = None
+        self.used_fallback = False
+        self.__lock = threading.Lock()
+        self.__fallback = ("[]", "[]")
+        self.__watchdog = None
+        if fallback_margin is not None:
+            delay = max(0, self.deadline - fallback_margin - time.monotonic())
+            self.__watchdog = threading.Timer(delay, self.__submit_fallback)
+            self.__watchdog.daemon = True
+            self.__watchdog.start()
+
+    def elapsed(self):
+        """Gets the time spent on the turn so far, in seconds
+        """
+        return time.monotonic() - self.started
+
+    def time_left(self):
+        """Gets the time left before the deadline, in seconds. Negative once the deadline has passed
+        """
+        return self.deadline - time.monotonic()
+
+    def check(self, reserve=0):
+        """Raises TurnTimeout if the turn is out of time. Call it regularly during long searches
+
+        Args:
+            reserve: Raise this many seconds before the deadline, to keep time to finish the turn
+
+        """
+        if self.time_left() <= reserve or self.used_fallback:
+            raise TurnTimeout("Turn {} is out of time after {:.3f}s".format(self.turn_number, self.elapsed()))
+
+    @property
+    def submitted(self):
+        """True once the turn has been submitted
+        """
+        return self.submitted_at is not None
+
+    def set_fallback(self, game_state):
+        """Registers the turn the watchdog submits if the deadline gets close.
+        The build and deploy stacks are copied, so keep calling it as better turns are found.
+
+        Args:
+            game_state: A GameState holding the best turn found so far
+
+        """
+        fallback = (json.dumps(game_state._build_stack), json.dumps(game_state._deploy_stack))
+        with self.__lock:
+            self.__fallback = fallback
+
+    def submit(self, build_string, deploy_string):
+        """Sends a turn to the engine, unless this turn was already submitted
+
+        Returns:
+            True if the turn was sent
+        """
+        with self.__lock:
+            if self.submitted_at is not None:
+                return False
+            send_command(build_string)
+            send_command(deploy_string)
+            self.submitted_at = time.monotonic()
+        if self.__watchdog is not None:
+            self.__watchdog.cancel()
+        return True
+
+    def finish(self):
+        """Stops the watchdog. Called by AlgoCore once on_turn returns
+        """
+        if self.__watchdog is not None:
+            self.__watchdog.cancel()
+        with self.__lock:
+            if self.submitted_at is None:
+                # on_turn returned, so it has sent its turn one way or another
+                self.submitted_at = time.monotonic()
+
+    def __submit_fallback(self):
+        with self.__lock:
+            if self.submitted_at is not None:
+                return
+            build_string, deploy_string = self.__fallback
+            send_command(build_string)
+            send_command(deploy_string)
+            self.submitted_at = time.monotonic()
+            self.used_fallback = True
+        debug_write("Turn {} was about to run out of time, submitted the fallback turn after {:.3f}s".format(self.turn_number, self.elapsed()))
+
+
+def get_turn_timer():
+    """Gets the TurnTimer of the current turn
+
+    Returns:
+        The TurnTimer AlgoCore started for the turn being played, or None
+    """
+    return _current_timer
+
+
+def set_turn_timer(timer):
+    """Sets the TurnTimer of the current turn. Used by AlgoCore
+    """
+    global _current_timer
+    _current_timer = timer
+
+
+def submit(build_string, deploy_string):
+    """Sends a turn to the engine, through the current TurnTimer if there is one so that each turn is sent once
+
+    Returns:
+        True if the turn was sent
+    """
+    timer = _current_timer
+    if timer is None:
+        send_command(build_string)
+        send_command(deploy_string)
+        return True
+    return timer.submit(build_string, deploy_string)
@@ -0,0 +1,219 @@
+from .game_state import GameState
+from .message import load_message
+from .unit import GameUnit
+
+# Healths closer than this are treated as equal when checking the model against a turn message
+HEALTH_TOLERANCE = 0.01
+# The index of the remove and upgrade lists in a player's units, and of their types in spawn events
+REMOVE_INDEX = 6
+UPGRADE_INDEX = 7
+
+
+class WorldModel:
+    """Keeps one GameState up to date through the whole game instead of rebuilding it every turn
+
+    The board mostly changes through events the algo already sees during the action phase, so
+    the model applies the spawn, move, shield, damage and death events of every action frame to
+    its game state. When the next turn message arrives, start_turn checks every unit against it
+    by unit id and only rebuilds the locations that differ, so starting a turn costs a comparison
+    rather than creating every GameUnit again. AlgoCore.enable_world_model() creates a model and
+    passes every action frame to it.
+
+    Attributes :
+        * config (JSON): The game config
+        * game_state (:obj: GameState): The model of the board, None until the first turn. Use start_turn to get a copy to play with
+        * patched (list): The locations start_turn had to rebuild because the model was wrong about them, None after a full rebuild
+        * unmatched_events (int): The number of events since the last turn that referred to a unit the model did not know
+
+    """
+    def __init__(self, config):
+        """Creates an empty model, filled in by the first turn message
+
+        Args:
+            config (JSON): The game config
+
+        """
+        self.config = config
+        self.game_state = None
+        self.patched = None
+        self.unmatched_events = 0
+        self.__types = [unit_information.get("shorthand") for unit_information in config["unitInformation"]]
+        # For every unit on the board, its id mapped to [unit_type, player_index, x, y, health, upgraded, pending_removal]
+        self.__records = {}
+
+    def reset(self):
+        """Forgets the board, so that the next start_turn builds the game state from scratch
+        """
+        self.game_state = None
+        self.patched = None
+        self.__records = {}
+
+    def start_turn(self, turn_message):
+        """Brings the model in line with a turn message and gets a game state for the turn
+
+        Args:
+            turn_message: The turn message passed to on_turn
+
+        Returns:
+            A GameState.fork of the model, to spawn units on and submit like a GameState built from the message
+
+        """
+        state = load_message(turn_message)
+        records = self.__read_units(state)
+        if self.game_state is None or int(state["turnInfo"][1]) <= self.game_state.turn_number:
+            self.game_state = GameState(self.config, turn_message)
+            self.patched = None
+        else:
+            self.game_state._parse_stats(state)
+            self.game_state.serialized_string = turn_message
+            self.patched = self.__patch(records)
+        self.__records = records
+        self.unmatched_events = 0
+        return self.game_state.fork()
+
+    def __read_units(self, state):
+        # Builds the records of every unit in a decoded game state
+        records = {}
+        for player_index, units in enumerate((state["p1Units"], state["p2Units"])):
+            structures = {}
+            for type_index, unit_list in enumerate(units):
+                for unit_information in unit_list:
+                    x, y = int(unit_information[0]), int(unit_information[1])
+                    if type_index == REMOVE_INDEX or type_index == UPGRADE_INDEX:
+                        # The remove and upgrade lists come after the units they apply to
+                        record = structures.get((x, y))
+                        if record is not None:
+                            record[5 if type_index == UPGRADE_INDEX else 6] = True
+                        continue
+                    unit_type = self.__types[type_index]
+                    record = [unit_type, player_index, x, y, float(unit_information[2]), False, False]
+                    records[unit_information[3]] = record
+                    if type_index < 3:
+                        structures[(x, y)] = record
+        return records
+
+    def __patch(self, records):
+        # Rebuilds the locations where the model and the turn message disagree, and returns them
+        old_records = self.__records
+        dirty = set()
+        for unit_id, record in records.items():
+            old_record = old_records.get(unit_id)
+            if old_record is None:
+                dirty.add((record[2], record[3]))
+            elif old_record[:4] != record[:4] or old_record[5:] != record[5:] or abs(old_record[4] - record[4]) > HEALTH_TOLERANCE:
+                dirty.add((record[2], record[3]))
+                dirty.add((old_record[2], old_record[3]))
+        for unit_id, old_record in old_records.items():
+            if unit_id not in records:
+                dirty.add((old_record[2], old_record[3]))
+        if not dirty:
+            return []
+
+        tiles = {location: [] for location in dirty}
+        for record in records.values():
+            location = (record[2], record[3])
+            if location in tiles:
+                tiles[location].append(record)
+        game_map = self.game_state.game_map
+        for (x, y), tile_records in tiles.items():
+            units = []
+            for unit_type, player_index, _, _, health, upgraded, pending_removal in tile_records:
+                unit = GameUnit(unit_type, self.config, player_index, health, x, y)
+                if upgraded:
+                    unit.upgrade()
+                unit.pending_removal = pending_removal
+                units.append(unit)
+            game_map[x, y] = units
+        return sorted([x, y] for x, y in dirty)
+
+    def apply_frame(self, frame):
+        """Applies the events of an action frame to the model
+
+        Args:
+            frame: An action frame, as a GameMessage or a JSON string
+
+        """
+        if self.game_state is None:
+            return
+        events = load_message(frame).get("events", {})
+        for event in events.get("spawn", ()):
+            self.__spawn(event)
+        for event in events.get("move", ()):
+            self.__move(event)
+        for event in events.get("shield", ()):
+            self.__change_health(event[5], event[2])
+        for event in events.get("damage", ()):
+            self.__change_health(event[3], -event[1])
+        for event in events.get("death", ()):
+            self.__death(event)
+
+    def __find_unit(self, unit_id):
+        # Gets the record of a unit, its location's units and the unit itself
+        record = self.__records.get(unit_id)
+        if record is None:
+            self.unmatched_events += 1
+            return None, None, None
+        unit_type, player_index, x, y, health = record[:5]
+        tile = self.game_state.game_map[x, y]
+        found = None
+        for unit in tile:
+            if unit.unit_type == unit_type and unit.player_index == player_index:
+                # Units of the same type on a location only differ by their health
+                if found is None or abs(unit.health - health) < abs(found.health - health):
+                    found = unit
+        if found is None:
+            self.unmatched_events += 1
+        return record, tile, found
+
+    def __spawn(self, event):
+        location, type_index, unit_id, player = event[:4]
+        x, y = int(location[0]), int(location[1])
+        game_map = self.game_state.game_map
+        if type_index == REMOVE_INDEX or type_index == UPGRADE_INDEX:
+            structure = game_map.get_structure([x, y])
+            if structure is None:
+                self.unmatched_events += 1
+                return
+            if type_index == UPGRADE_INDEX:
+                structure.upgrade()
+                game_map.refresh_location([x, y])
+            else:
+                structure.pending_removal = True
+            for record in self.__records.values():
+                if record[2] == x and record[3] == y and record[0] == structure.unit_type:
+                    record[5 if type_index == UPGRADE_INDEX else 6] = True
+            return
+        unit = GameUnit(self.__types[type_index], self.config, player - 1, None, x, y)
+        game_map.place_unit(unit)
+        self.__records[unit_id] = [unit.unit_type, unit.player_index, x, y, unit.health, False, False]
+
+    def __move(self, event):
+        record, tile, unit = self.__find_unit(event[4])
+        if unit is None:
+            return
+        x, y = int(event[1][0]), int(event[1][1])
+        tile.remove(unit)
+        game_map = self.game_state.game_map
+        game_map.refresh_location([record[2], record[3]])
+        unit.x = x
+        unit.y = y
+        game_map.place_unit(unit)
+        record[2] = x
+        record[3] = y
+
+    def __change_health(self, unit_id, amount):
+        record, _, unit = self.__find_unit(unit_id)
+        if unit is None:
+            return
+        unit.health += amount
+        record[4] = unit.health
+        if unit.stationary:
+            self.game_state.game_map.refresh_location([unit.x, unit.y])
+
+    def __death(self, event):
+        record, tile, unit = self.__find_unit(event[2])
+        if unit is None:
+            return
+        tile.remove(unit)
+        self.game_state.game_map.refresh_location([record[2], record[3]])
+        del self.__records[event[2]]
@@ -156,6 +156,29 @@ The program also automatically formats the graph input so these run the same:
 
 ----------------------------------------------------------------------------------------
 
+The first time a replay is read, an index of its frames is saved next to it as [REPLAY_FILE].replay.idx
+(see replay_reader.py). Later runs use the index to read only the frames they need from the replay.
+
+The statistics of each replay are also cached next to it, as [REPLAY_FILE].replay.stats, so analyzing the same
+replays again does not read them at all. A cache is only used while its replay keeps the same size and modification
+time, and -nc (--no_cache) reads every replay again.
+
+----------------------------------------------------------------------------------------
+-r: Ratings
+
+Wins alone do not say much when algos have not all played the same opponents. With -r every replay in
+the replays folder is rated with TrueSkill: each algo has a rating (mu) and an uncertainty (sigma), which
+shrinks as it plays more games. Algos are ranked by mu - 3*sigma, a rating they are very likely to be above.
+>py scripts/contributions/get_results.py -r
+
+The ratings are saved in replays/ratings.json along with the modification time of the newest replay rated,
+so the next time only the replays written since are read (oldest first, since the order of the games
+matters). --ratings_file saves them somewhere else, and -rr (--reset_ratings) starts over from every
+replay, for example to include replays older than the newest one rated. Replays of unfinished games are
+remembered and rated once they are complete.
+
+----------------------------------------------------------------------------------------
+
 Everything is output using std.stderr.write, meaning it is safe to import and print
 this from your within game (although there is not really a reason to, since it looks at
 all the data after the replay is completed).
@@ -174,16 +197,25 @@ try:
 	import json
 	import glob
 	import math
+	import zlib
 	import argparse
+	from array import array
+	import multiprocessing as mp
 except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
 
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+from replay_reader import ReplayReader
+
 try:
 	import matplotlib.pyplot as plt
 	plt_installed = True
 except ImportError:
 	try:
+		# worker processes started by -j import this file again, only the main process asks
+		if __name__ != '__main__':
+			raise ImportError
 		usr_in = input('Matplotlib not found.\nWould you like this program to try and install matplotlib? (y/n) ')
 		if usr_in.lower() == 'y' or usr_in.lower() == 'yes':
 			import subprocess
@@ -216,6 +248,27 @@ def parse_args():
 		"-v", "--verbose",
 		action='store_true',
 		help="will force the program to run each replay seperately and print information individual games\n\n")
+	ap.add_argument(
+		"-j", "--jobs",
+		type=int,
+		default=os.cpu_count() or 1,
+		help="number of processes used to read replays when analyzing more than one (defaults to the number of cores)\n\n")
+	ap.add_argument(
+		"-nc", "--no_cache",
+		action='store_true',
+		help="read every replay again instead of using the statistics cached next to it\n\n")
+	ap.add_argument(
+		"-r", "--ratings",
+		action='store_true',
+		help="updates the TrueSkill ratings of every algo with the new replays and shows them\n\n")
+	ap.add_argument(
+		"-rr", "--reset_ratings",
+		action='store_true',
+		help="rates every replay again instead of only the new ones\n\n")
+	ap.add_argument(
+		"--ratings_file",
+		default=None,
+		help="file the ratings are saved in (defaults to replays/ratings.json)\n\n")
 	ap.add_argument(
 		"-avg", "--averages",
 		nargs="*",
@@ -388,6 +441,11 @@ class Algo:
 		if self_hp > other_hp:
 			self.wins += 1
 
+	# adds the data of another Algo with the same name, loaded in another process
+	def merge(self, wins, replays):
+		self.wins += wins
+		self.replays.update(replays)
+
 	def add_end_stats(self, replay, endStats):
 		self.replays[replay]['endStats'] = endStats;
 
@@ -440,15 +498,72 @@ class Algo:
 		return disp
 
 
+STATS_VERSION = 1
+STATS_EXTENSION = '.stats'
+STATS_COLUMNS = ['health', 'cores', 'bits', 'cores_on_board', 'cores_spent', 'bits_spent']
+INT_COLUMNS = ['cores_on_board', 'cores_spent', 'bits_spent']
+
+# The statistics of a replay are cached next to it as [REPLAY_FILE].replay.stats, and used as long as the replay
+# has the same size and modification time. The file is a JSON header line followed by zlib compressed columns:
+# for each player, the turn numbers then one array of floats per statistic, nan where a turn has no value.
+def read_stats_cache(f_name):
+	try:
+		stat = os.stat(f_name)
+		with open(f_name + STATS_EXTENSION, 'rb') as f:
+			header = json.loads(f.readline())
+			body = zlib.decompress(f.read())
+		if header['version'] != STATS_VERSION or header['size'] != stat.st_size or header['mtime'] != stat.st_mtime_ns or header['byteorder'] != sys.byteorder:
+			return None
+
+		players = []
+		pos = 0
+		for num_turns in header['turns']:
+			turns = array('i')
+			turns.frombytes(body[pos:pos + num_turns * turns.itemsize])
+			pos += num_turns * turns.itemsize
+			columns = {}
+			for column in STATS_COLUMNS:
+				columns[column] = array('d')
+				columns[column].frombytes(body[pos:pos + num_turns * columns[column].itemsize])
+				pos += num_turns * columns[column].itemsize
+			players.append((turns, columns))
+	except (OSError, ValueError, KeyError, zlib.error):
+		return None
+
+	header['players'] = players
+	return header
+
+def write_stats_cache(f_name, end_stats, players):
+	try:
+		stat = os.stat(f_name)
+		header = {
+			'version': STATS_VERSION,
+			'size': stat.st_size,
+			'mtime': stat.st_mtime_ns,
+			'byteorder': sys.byteorder,
+			'end_stats': end_stats,
+			'turns': [len(turns) for turns, columns in players]
+		}
+		body = b''.join(array('i', turns).tobytes() + b''.join(array('d', columns[column]).tobytes() for column in STATS_COLUMNS) for turns, columns in players)
+
+		# written to a temporary file first so a reader never sees half a cache
+		temp_name = '{}{}.{}.tmp'.format(f_name, STATS_EXTENSION, os.getpid())
+		with open(temp_name, 'wb') as f:
+			f.write(json.dumps(header).encode('utf-8') + b'\n')
+			f.write(zlib.compress(body))
+		os.replace(temp_name, f_name + STATS_EXTENSION)
+	except OSError:
+		pass
+
 # Stores data from a single replay and creates the Algo classes
 class Replay:
-	def __init__(self, f_name, algos):
+	def __init__(self, f_name, algos, use_cache=True):
 		self.fname = f_name;
-		self.ref = None
-		self.turns = {}
-		self.valid_turns = []
+		self.use_cache = use_cache
+		self.cached = None
+		self.__reader = None
 
-		self.load_data()				# handles loading all the data from file into python variables
+		self.load_data()				# loads the cached statistics, if there are any
 		self.unpack_data(algos)		# stores relevant data after it has been loaded
 
 	def __eq__(self, other):
@@ -460,41 +575,76 @@ class Replay:
 	def __repr__(self):
 		return self.__string()
 
+	# indexes the file when frames are first needed, frames are only read from it when they are needed
+	@property
+	def reader(self):
+		if self.__reader is None:
+			self.__reader = ReplayReader(self.fname)
+		return self.__reader
+
+	@property
+	def valid_turns(self):
+		return self.reader.keys
+
+	# the raw config of the replay, read from the file when asked for
+	@property
+	def ref(self):
+		return self.reader.get_config()
+
 	def load_data(self):
-		with open(self.fname) as f:
-			for line in f:
-				line = line.replace("\n", "")
-				line = line.replace("\t", "")
-
-				if (line != ''):
-					data = json.loads(line)
-
-					try:
-						data['debug']
-						self.ref = data
-					except:
-						turn_num = data['turnInfo'][1]
-						frame_num = data['turnInfo'][2]
-						self.turns[(turn_num, frame_num)] = data
-						if (turn_num, frame_num) not in self.valid_turns:
-							self.valid_turns.append((turn_num, frame_num))
+		if self.use_cache:
+			self.cached = read_stats_cache(self.fname)
+
+	def get_end_stats(self):
+		if self.cached is not None:
+			return self.cached['end_stats']
+		if self.reader.end_stats is None:
+			raise KeyError('endStats')
+		return self.reader.end_stats
+
+	# adds the cached statistics to the algos, the same way reading the frames would have
+	def add_cached_data(self):
+		for algo, (turns, columns) in zip(self.get_algos(), self.cached['players']):
+			for i, t in enumerate(turns):
+				for column in STATS_COLUMNS:
+					value = columns[column][i]
+					if not math.isnan(value):
+						algo.add_data(self.fname, t, column, int(value) if column in INT_COLUMNS else value)
+
+	def save_cached_data(self):
+		players = []
+		for algo in self.get_algos():
+			turns = [t for t in algo.replays[self.fname] if t != 'endStats']
+			columns = {column: [algo.replays[self.fname][t].get(column, float('nan')) for t in turns] for column in STATS_COLUMNS}
+			players.append((turns, columns))
+		write_stats_cache(self.fname, self.get_end_stats(), players)
+
+	# the frames unpack_data reads: the stats of each turn are taken from its last frame, and the spawns from frame 0
+	def get_data_frames(self):
+		last_frames = {}
+		for t, f in self.valid_turns:
+			last_frames[t] = (t, f)
+		return [(t, f) for t, f in self.valid_turns if f == 0 or last_frames[t] == (t, f)]
 
 	def get_cores_on_board(self, filters, encryptors, destructors):
 		return len(filters) + len(encryptors) * 4 + len(destructors) * 3
 
-	def get_bits_spent(self, algo, spawn):
+	# counts the units of each type spawned by the algo, in a single pass over the spawn events
+	def get_spawn_counts(self, algo, spawn):
 		p_index = 1 if algo == self.algo1 else 2
-		pings = [x for x in spawn if x[3] == p_index and x[1] == 3]
-		emps = [x for x in spawn if x[3] == p_index and x[1] == 4]
-		scramblers = [x for x in spawn if x[3] == p_index and x[1] == 5]
-		return len(pings) + len(emps) * 3 + len(scramblers)
+		counts = [0] * 8
+		for x in spawn:
+			if x[3] == p_index and 0 <= x[1] < 8:
+				counts[x[1]] += 1
+		return counts
 
-	def get_cores_spent(self, algo, spawn):
-		p_index = 1 if algo == self.algo1 else 2
-		filters = [x for x in spawn if x[3] == p_index and x[1] == 0]
-		encryptors = [x for x in spawn if x[3] == p_index and x[1] == 1]
-		destructors = [x for x in spawn if x[3] == p_index and x[1] == 2]
-		return len(filters) + len(encryptors) * 4 + len(destructors) * 3
+	def get_bits_spent(self, algo, spawn, counts=None):
+		pings, emps, scramblers = (counts or self.get_spawn_counts(algo, spawn))[3:6]
+		return pings + emps * 3 + scramblers
+
+	def get_cores_spent(self, algo, spawn, counts=None):
+		filters, encryptors, destructors = (counts or self.get_spawn_counts(algo, spawn))[0:3]
+		return filters + encryptors * 4 + destructors * 3
 
 	def add_data_to_algo(self, algo, t, f, stats, units, spawn):
 		algo.add_data(self.fname, t, 'health', stats[0])
@@ -506,39 +656,44 @@ class Replay:
 		algo.add_data(self.fname, t, 'cores_on_board', self.get_cores_on_board(filters, encryptors, destructors))
 
 		if f == 0:
-			algo.add_data(self.fname, t, 'cores_spent', self.get_cores_spent(algo, spawn), True)
-			algo.add_data(self.fname, t, 'bits_spent', self.get_bits_spent(algo, spawn), True)
+			counts = self.get_spawn_counts(algo, spawn)
+			algo.add_data(self.fname, t, 'cores_spent', self.get_cores_spent(algo, spawn, counts), True)
+			algo.add_data(self.fname, t, 'bits_spent', self.get_bits_spent(algo, spawn, counts), True)
 
 	def unpack_data(self, algos):
 		try:
 			self.algo1, self.algo2 = self.create_algos(algos)
 
-			for t, f in self.get_valid_turns():
-				turn = self.get_turn(t, f)
+			if self.cached is not None:
+				self.add_cached_data()
+			else:
+				for t, f, turn in self.reader.frames(keys=self.get_data_frames()):
+					turn_info = turn['turnInfo']
+					events = turn['events']
+					spawn = events['spawn']
 
-				turn_info = turn['turnInfo']
-				events = turn['events']
-				spawn = events['spawn']
+					p1_stats = turn['p1Stats']
+					p1_units = turn['p1Units']
 
-				p1_stats = turn['p1Stats']
-				p1_units = turn['p1Units']
+					p2_stats = turn['p2Stats']
+					p2_units = turn['p2Units']
 
-				p2_stats = turn['p2Stats']
-				p2_units = turn['p2Units']
+					self.add_data_to_algo(self.algo1, t, f, p1_stats, p1_units, spawn)
+					self.add_data_to_algo(self.algo2, t, f, p2_stats, p2_units, spawn)
 
-				self.add_data_to_algo(self.algo1, t, f, p1_stats, p1_units, spawn)
-				self.add_data_to_algo(self.algo2, t, f, p2_stats, p2_units, spawn)
+				if self.use_cache:
+					self.save_cached_data()
 
 			self.algo1.recored_final_data(self.fname, self.algo2)
 			self.algo2.recored_final_data(self.fname, self.algo1)
-			self.algo1.add_end_stats(self.fname, self.turns[self.valid_turns[-1]]['endStats']['player1'])
-			self.algo2.add_end_stats(self.fname, self.turns[self.valid_turns[-1]]['endStats']['player2'])
+			self.algo1.add_end_stats(self.fname, self.get_end_stats()['player1'])
+			self.algo2.add_end_stats(self.fname, self.get_end_stats()['player2'])
 		except Exception as e:
 			sys.stderr.write(str(e))
 
 	# only creates a new algo class if that algo does not already exist. Otherwise data is added to the existing one
 	def create_algos(self, algos):
-		end_stats = self.turns[self.valid_turns[-1]]['endStats']
+		end_stats = self.get_end_stats()
 		p1_algo = end_stats['player1']['name']
 		p2_algo = end_stats['player2']['name']
 
@@ -562,9 +717,255 @@ class Replay:
 	def get_valid_turns(self):
 		return self.valid_turns
 	def get_turns(self):
-		return self.turns
+		return {(t, f): turn for t, f, turn in self.reader.frames()}
 	def get_turn(self, turn, frame=-1):
-		return self.turns[(turn, frame)]
+		return self.reader.get_frame(turn, frame)
+
+# the result of loading a Replay in a worker process: it only keeps the file name and the Algos of the main process
+class ReplaySummary:
+	def __init__(self, f_name, algos):
+		self.fname = f_name
+		if len(algos) == 2:
+			self.algo1, self.algo2 = algos
+
+	def __eq__(self, other):
+		return self.fname == other.fname
+	def __string(self):
+		return self.fname
+	def __str__(self):
+		return self.__string()
+	def __repr__(self):
+		return self.__string()
+
+	def get_algos(self):
+		return [self.algo1, self.algo2]
+
+# loads a single replay in a worker process and returns the data of its Algos, to be merged in the main process
+# without keep_turns only the wins are sent back, so the main process holds the same amount of data however many replays there are
+def load_replay_data(job):
+	f_name, keep_turns, use_cache = job
+	algos = []
+	replay = Replay(f_name, algos, use_cache)
+	try:
+		names = [algo.name for algo in replay.get_algos()]
+	except AttributeError:
+		names = []
+	return f_name, names, [(algo.name, algo.wins, algo.replays if keep_turns else {}) for algo in algos]
+
+RATINGS_VERSION = 3
+RATINGS_FILE = 'ratings.json'
+# TrueSkill parameters: the starting rating and uncertainty, the spread of a single game's performance,
+# how much the uncertainty grows before every game so ratings can keep changing, and the chance of a draw
+TRUESKILL_MU = 25.0
+TRUESKILL_SIGMA = TRUESKILL_MU / 3
+TRUESKILL_BETA = TRUESKILL_SIGMA / 2
+TRUESKILL_TAU = TRUESKILL_SIGMA / 100
+TRUESKILL_DRAW_PROBABILITY = 0.01
+
+def get_replays_dir():
+	return os.path.abspath(os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, os.pardir, 'replays'))
+
+def norm_pdf(x):
+	return math.exp(-x*x / 2) / math.sqrt(2 * math.pi)
+
+def norm_cdf(x):
+	return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+# the inverse of norm_cdf, by bisection
+def norm_ppf(p):
+	low, high = -10.0, 10.0
+	for i in range(100):
+		mid = (low + high) / 2
+		if norm_cdf(mid) < p:
+			low = mid
+		else:
+			high = mid
+	return (low + high) / 2
+
+# how a win moves the mean (v) and shrinks the variance (w), t is the difference in rating and e the draw margin
+def trueskill_win(t, e):
+	denominator = norm_cdf(t - e)
+	if denominator < 1e-160:
+		return -(t - e), (1.0 if t < 0 else 0.0)
+	v = norm_pdf(t - e) / denominator
+	return v, v * (v + t - e)
+
+# the same for a draw
+def trueskill_draw(t, e):
+	t_abs = abs(t)
+	denominator = norm_cdf(e - t_abs) - norm_cdf(-e - t_abs)
+	if denominator < 1e-160:
+		return (-t - e if t < 0 else -t + e), 1.0
+	v = (norm_pdf(-e - t_abs) - norm_pdf(e - t_abs)) / denominator
+	w = v*v + ((e - t_abs) * norm_pdf(e - t_abs) - (-e - t_abs) * norm_pdf(-e - t_abs)) / denominator
+	return (-v if t < 0 else v), w
+
+# reads the names of the players and the winner (1, 2 or 0 for a draw) of a replay, without decoding its frames
+# returns None for the names if the game is not over
+def read_replay_result(f_name):
+	try:
+		reader = ReplayReader(f_name)
+	except (OSError, ValueError):
+		return f_name, None, None
+	if not reader.is_complete() or len(reader.keys) == 0:
+		return f_name, None, None
+	end_stats = reader.end_stats
+	names = (end_stats['player1']['name'], end_stats['player2']['name'])
+	# decided on the health left, the same way Algo.recored_final_data counts wins
+	p1_health, p2_health = reader.healths[0][-1], reader.healths[1][-1]
+	winner = 1 if p1_health > p2_health else (2 if p2_health > p1_health else 0)
+	return f_name, names, winner
+
+# TrueSkill ratings of every algo. Replays are rated in the order they were written, so the ratings are saved with
+# the modification time of the newest replay rated, and only newer replays are read the next time.
+class Ratings:
+	def __init__(self, f_name=None, reset=False):
+		self.fname = f_name if f_name is not None else os.path.join(get_replays_dir(), RATINGS_FILE)
+		self.ratings = {}				# keys are algo names, values are [mu, sigma, wins, draws, losses]
+		self.games = 0					# number of replays rated
+		self.mtime = -1					# modification time (ns) of the newest replay rated
+		self.at_mtime = set()			# paths of the replays rated with that modification time
+		self.pending = set()			# paths of replays of unfinished games, rated once they are complete
+		self.draw_margin = norm_ppf((TRUESKILL_DRAW_PROBABILITY + 1) / 2) * math.sqrt(2) * TRUESKILL_BETA
+		if not reset:
+			self.load()
+
+	def load(self):
+		try:
+			with open(self.fname) as f:
+				state = json.load(f)
+			if state['version'] != RATINGS_VERSION:
+				return False
+			self.ratings = state['ratings']
+			self.games = state['games']
+			self.mtime = state['mtime']
+			self.at_mtime = set(state['at_mtime'])
+			self.pending = set(state['pending'])
+		except (OSError, ValueError, KeyError):
+			return False
+		return True
+
+	def save(self):
+		state = {
+			'version': RATINGS_VERSION,
+			'ratings': self.ratings,
+			'games': self.games,
+			'mtime': self.mtime,
+			'at_mtime': list(self.at_mtime),
+			'pending': list(self.pending)
+		}
+		# written to a temporary file first so an interrupted save keeps the old ratings
+		temp_name = '{}.{}.tmp'.format(self.fname, os.getpid())
+		try:
+			with open(temp_name, 'w') as f:
+				json.dump(state, f)
+			os.replace(temp_name, self.fname)
+		except OSError as e:
+			sys.stderr.write('Could not save the ratings: {}\n'.format(e))
+
+	def get(self, name):
+		if name not in self.ratings:
+			self.ratings[name] = [TRUESKILL_MU, TRUESKILL_SIGMA, 0, 0, 0]
+		return self.ratings[name]
+
+	# updates the ratings of the two players of a game, winner is 1, 2 or 0 for a draw
+	def rate(self, name1, name2, winner):
+		if name1 == name2:
+			return
+		if winner == 2:
+			name1, name2 = name2, name1
+		rating1, rating2 = self.get(name1), self.get(name2)
+		var1 = rating1[1]**2 + TRUESKILL_TAU**2
+		var2 = rating2[1]**2 + TRUESKILL_TAU**2
+		c = math.sqrt(2 * TRUESKILL_BETA**2 + var1 + var2)
+		t = (rating1[0] - rating2[0]) / c
+		v, w = trueskill_draw(t, self.draw_margin / c) if winner == 0 else trueskill_win(t, self.draw_margin / c)
+
+		rating1[0] += var1 / c * v
+		rating2[0] -= var2 / c * v
+		rating1[1] = math.sqrt(var1 * max(1 - var1 / c**2 * w, 1e-6))
+		rating2[1] = math.sqrt(var2 * max(1 - var2 / c**2 * w, 1e-6))
+		if winner == 0:
+			rating1[3] += 1
+			rating2[3] += 1
+		else:
+			rating1[2] += 1
+			rating2[4] += 1
+
+	def is_new(self, path, mtime):
+		return mtime > self.mtime or (mtime == self.mtime and path not in self.at_mtime) or path in self.pending
+
+	# rates the replays that were written after the newest one rated, in the order they were written, and returns how many were added
+	def update(self, f_names, jobs=1):
+		new = []
+		for f_name in map(os.path.abspath, f_names):
+			try:
+				mtime = os.stat(f_name).st_mtime_ns
+			except OSError:
+				continue
+			if self.is_new(f_name, mtime):
+				new.append((mtime, f_name))
+		new.sort()
+		mtimes = [mtime for mtime, f_name in new]
+		f_names = [f_name for mtime, f_name in new]
+		if jobs <= 1 or len(f_names) < 2:
+			results = map(read_replay_result, f_names)
+			pool = None
+		else:
+			pool = mp.Pool(min(jobs, len(f_names)))
+			# imap keeps the order of the replays, which the ratings depend on
+			results = pool.imap(read_replay_result, f_names, max(1, len(f_names) // (jobs * 4)))
+
+		added = 0
+		try:
+			for mtime, (f_name, names, winner) in zip(mtimes, results):
+				if names is None:
+					# the game is not over, the replay is rated when it is complete even if newer ones were rated before
+					self.pending.add(f_name)
+					continue
+				self.pending.discard(f_name)
+				self.rate(names[0], names[1], winner)
+				self.games += 1
+				added += 1
+				if mtime > self.mtime:
+					self.mtime = mtime
+					self.at_mtime = set()
+				if mtime == self.mtime:
+					self.at_mtime.add(f_name)
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+
+		# replays of unfinished games that were deleted are forgotten
+		self.pending = set(x for x in self.pending if os.path.exists(x))
+		return added
+
+	def get_summary(self):
+		if len(self.ratings) == 0:
+			return 'No rated games\n'
+		fill_len = len(max(self.ratings, key=len)) + 9
+		rtn = 'Ratings by algo (TrueSkill, ranked by mu - 3*sigma):\n|\n'
+		rtn += '|{: >{fill}} : {: >7} {: >7} {: >7}   {}\n'.format('algo', 'rank', 'mu', 'sigma', 'W-D-L', fill=fill_len)
+		for name, (mu, sigma, wins, draws, losses) in sorted(self.ratings.items(), key=lambda e:-(e[1][0] - 3*e[1][1])):
+			rtn += '|{: >{fill}} : {: >7.2f} {: >7.2f} {: >7.2f}   {}-{}-{}\n'.format(name, mu - 3*sigma, mu, sigma, wins, draws, losses, fill=fill_len)
+		return rtn
+
+# reads the new replays into the saved ratings and shows them
+def run_ratings(args):
+	ratings = Ratings(args['ratings_file'], args['reset_ratings'])
+	if len(args['file']) > 0:
+		f_names = FileHandler().get_file_names(f_names=args['file'])
+	else:
+		f_names = glob.glob(os.path.join(get_replays_dir(), '*.replay'))
+	added = ratings.update(f_names, args['jobs'])
+	ratings.save()
+
+	sys.stderr.write('{:->75}\n'.format(''))
+	sys.stderr.write('Rated {} new matches, {} in total:\n'.format(added, ratings.games))
+	sys.stderr.write('{:->75}\n'.format(''))
+	sys.stderr.write(ratings.get_summary())
+	sys.stderr.write('\n\n')
 
 # handles opening multiple games (replays)
 class FileHandler:
@@ -593,23 +994,39 @@ class FileHandler:
 		return self.replays[i]
 
 	def __latest_replays(self, num=1, a=False):
-		replay_dir = os.path.dirname(os.path.realpath(__file__)).replace('scripts\\contributions', '')+'replays\\'
-		files = glob.glob('{}*.replay'.format(replay_dir))
+		files = glob.glob(os.path.join(get_replays_dir(), '*.replay'))
 		files = sorted(files, key=os.path.getctime, reverse=True)
 		if a:
 			return files
 		return files[:num]
 
-	def load_files(self, num=1, a=False, f_names=[]):
+	def get_algo(self, name):
+		if name not in self.algos:
+			self.algos.append(Algo(name))
+		return self.algos[self.algos.index(name)]
+
+	def get_file_names(self, num=1, a=False, f_names=[]):
 		if len(f_names) > 0:
+			return [f_name if f_name.find('replays') != -1 else 'replays/'+f_name for f_name in f_names]
+		return self.__latest_replays(num, a)
+
+	# loads replays one after another, or spreads them over a pool of jobs processes
+	# keep_turns can be turned off when only the summary is shown, so the turn by turn data is not kept
+	def load_files(self, num=1, a=False, f_names=[], jobs=1, keep_turns=True, use_cache=True):
+		f_names = self.get_file_names(num, a, f_names)
+		if jobs <= 1 or len(f_names) < 2:
 			for f_name in f_names:
-				if f_name.find('replays') == -1:
-					self.replays.append(Replay('replays/'+f_name, self.algos))
-				else:
-					self.replays.append(Replay(f_name, self.algos))
-		else:
-			for f_name in self.__latest_replays(num, a):
-				self.replays.append(Replay(f_name, self.algos))
+				self.replays.append(Replay(f_name, self.algos, use_cache))
+			return
+
+		jobs = min(jobs, len(f_names))
+		chunksize = max(1, len(f_names) // (jobs * 4))
+		with mp.Pool(jobs) as pool:
+			# imap hands back the results in order as they finish, so they are merged as they come
+			for f_name, names, data in pool.imap(load_replay_data, [(f_name, keep_turns, use_cache) for f_name in f_names], chunksize):
+				for name, wins, replays in data:
+					self.get_algo(name).merge(wins, replays)
+				self.replays.append(ReplaySummary(f_name, [self.get_algo(name) for name in names]))
 
 	def add_plot(self, lbl):
 		if lbl == 'wins':
@@ -708,10 +1125,17 @@ def get_graph_options(options):
 	return (v, s)
 
 def main(args):
+	if args['ratings'] or args['reset_ratings']:
+		run_ratings(args)
+		return
+
 	verbose_options, summary_options = get_graph_options(args['graph'])
 
+	# the turn by turn data is only needed to show individual replays
+	keep_turns = args['verbose'] or (not args['all'] and int(args['num']) == 1)
+
 	fh = FileHandler()
-	fh.load_files(int(args['num']), args['all'], args['file']) #loads the files - all JSON reading is here
+	fh.load_files(int(args['num']), args['all'], args['file'], args['jobs'], keep_turns, not args['no_cache']) #loads the files - all JSON reading is here
 
 	# check to see if matplotlib is installed
 	graphing_enabled = True if len(verbose_options) > 0 or len(summary_options) > 0 else False
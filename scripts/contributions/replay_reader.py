@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Short Description:
+A streaming reader for .replay files, shared by get_results.py and watch_replay.py.
+------------------------------------------------------------------------------------------------
+
+README:
+
+A .replay file holds the game config on its first line, then one JSON frame per line.
+Decoding every line up front holds the whole game in memory and decodes frames that are
+never looked at. ReplayReader instead scans the file once without decoding the frames,
+and records where each (turn, frame) is in the file, how many frames each turn has, both
+players' health on every frame and the end stats.
+
+This index is saved next to the replay as [REPLAY_FILE].replay.idx and reused as long as
+the replay has the same size and modification time, so opening the replay again only
+reads the index. Frames are then read and decoded one at a time, when they are asked for:
+
+	reader = ReplayReader('replays/[REPLAY_FILE].replay')
+	data = reader.get_frame(12, -1)
+	for turn, frame, data in reader.frames(start_turn=10, end_turn=20):
+		...
+
+Replays that are still being written, for example while watching a match in real-time,
+are indexed as far as they go. refresh() indexes the frames added since, and the index
+is only saved once the game is over.
+'''
+
+import os
+import json
+
+INDEX_VERSION = 1
+INDEX_EXTENSION = '.idx'
+
+
+# gets the flat list stored under a key in a raw frame line, without decoding the rest of the line
+def read_list(line, key):
+	start = line.find(key)
+	if start == -1:
+		return None
+	start = line.find(b'[', start + len(key))
+	end = line.find(b']', start)
+	if start == -1 or end == -1:
+		return None
+	return json.loads(line[start:end+1])
+
+# decodes a raw line, tabs are removed the same way the scripts always have
+def decode_line(line):
+	return json.loads(line.replace(b'\t', b'').decode('utf-8'))
+
+
+class ReplayReader:
+	def __init__(self, fname, save_index=True):
+		self.fname = fname 					# the file name of the replay
+		self.save_index = save_index		# whether the index is written next to the replay once the game is over
+		self.config_pos = None				# (offset, length) of the config line
+		self.keys = []						# (turn, frame) tuples, in the order they first appear in the file
+		self.positions = {}					# keys are (turn, frame) tuples, values are the (offset, length) of the frame's line
+		self.frames_in_turn = {}			# number of frames in each turn
+		self.healths = ([], [])				# the healths of player1 and player2 on every frame
+		self.end_stats = None				# the endStats of the game, None until the game is over
+		self.scanned = 0					# number of bytes of the replay indexed so far
+		self.size = -1
+		self.mtime = -1
+
+		if not self.load_index():
+			self.refresh()
+
+	def __string(self):
+		return self.fname
+	def __str__(self):
+		return self.__string()
+	def __repr__(self):
+		return self.__string()
+
+	def index_name(self):
+		return self.fname + INDEX_EXTENSION
+
+	def is_complete(self):
+		return self.end_stats is not None
+
+	# loads the saved index, returns False if there is none or the replay changed since it was saved
+	def load_index(self):
+		try:
+			stat = os.stat(self.fname)
+			with open(self.index_name()) as f:
+				index = json.load(f)
+			if index['version'] != INDEX_VERSION or index['size'] != stat.st_size or index['mtime'] != stat.st_mtime_ns:
+				return False
+		except (OSError, ValueError, KeyError):
+			return False
+
+		self.config_pos = tuple(index['config']) if index['config'] is not None else None
+		self.keys = []
+		self.positions = {}
+		for turn, frame, offset, length in index['frames']:
+			self.keys.append((turn, frame))
+			self.positions[(turn, frame)] = (offset, length)
+		self.frames_in_turn = {int(turn): num for turn, num in index['frames_in_turn']}
+		self.healths = tuple(index['healths'])
+		self.end_stats = index['end_stats']
+		self.scanned = self.size = index['size']
+		self.mtime = index['mtime']
+		return True
+
+	def write_index(self):
+		index = {
+			'version': INDEX_VERSION,
+			'size': self.size,
+			'mtime': self.mtime,
+			'config': self.config_pos,
+			'frames': [[turn, frame] + list(self.positions[(turn, frame)]) for turn, frame in self.keys],
+			'frames_in_turn': list(self.frames_in_turn.items()),
+			'healths': self.healths,
+			'end_stats': self.end_stats
+		}
+		# written to a temporary file first so a reader never sees half an index
+		temp_name = '{}.{}.tmp'.format(self.index_name(), os.getpid())
+		try:
+			with open(temp_name, 'w') as f:
+				json.dump(index, f, separators=(',', ':'))
+			os.replace(temp_name, self.index_name())
+		except OSError:
+			try:
+				os.remove(temp_name)
+			except OSError:
+				pass
+
+	# indexes the part of the replay that was not indexed yet (the whole file the first time)
+	def refresh(self):
+		stat = os.stat(self.fname)
+		if stat.st_size == self.size and stat.st_mtime_ns == self.mtime:
+			return
+		if stat.st_size < self.scanned:
+			# the file was replaced, start over
+			self.__init__(self.fname, self.save_index)
+			return
+
+		with open(self.fname, 'rb') as f:
+			f.seek(self.scanned)
+			offset = self.scanned
+			for line in f:
+				if not line.endswith(b'\n'):
+					# the engine may still be writing the last line
+					try:
+						decode_line(line)
+					except ValueError:
+						break
+				self.__index_line(line, offset)
+				offset += len(line)
+			self.scanned = offset
+
+		self.size = stat.st_size
+		self.mtime = stat.st_mtime_ns
+		if self.save_index and self.is_complete() and self.scanned == self.size:
+			self.write_index()
+
+	def __index_line(self, line, offset):
+		if line.strip() == b'':
+			return
+
+		turn_info = read_list(line, b'"turnInfo"')
+		if turn_info is None:
+			if b'"debug"' in line:
+				self.config_pos = (offset, len(line))
+			return
+
+		key = (turn_info[1], turn_info[2])
+		if key not in self.positions:
+			self.keys.append(key)
+		self.positions[key] = (offset, len(line))
+
+		p1_stats = read_list(line, b'"p1Stats"')
+		p2_stats = read_list(line, b'"p2Stats"')
+		self.healths[0].append(p1_stats[0] if p1_stats else None)
+		self.healths[1].append(p2_stats[0] if p2_stats else None)
+
+		try:
+			self.frames_in_turn[key[0]] += 1
+		except KeyError:
+			self.frames_in_turn[key[0]] = 1
+
+		if b'"endStats"' in line:
+			self.end_stats = decode_line(line)['endStats']
+
+	def __read(self, f, pos):
+		f.seek(pos[0])
+		return decode_line(f.read(pos[1]))
+
+	def get_config(self):
+		if self.config_pos is None:
+			return None
+		with open(self.fname, 'rb') as f:
+			return self.__read(f, self.config_pos)
+
+	def has_frame(self, turn, frame=-1):
+		return (turn, frame) in self.positions
+
+	# raises a KeyError if the replay has no such frame, like looking it up in a dict of frames would
+	def get_frame(self, turn, frame=-1):
+		pos = self.positions[(turn, frame)]
+		with open(self.fname, 'rb') as f:
+			return self.__read(f, pos)
+
+	def get_turns(self):
+		return list(self.frames_in_turn)
+
+	def get_last_key(self):
+		return self.keys[-1] if len(self.keys) > 0 else None
+
+	# yields (turn, frame, data) for the given keys, or every frame between start_turn and end_turn (included), in file order
+	def frames(self, start_turn=None, end_turn=None, keys=None):
+		if keys is None:
+			keys = [key for key in self.keys if (start_turn is None or key[0] >= start_turn) and (end_turn is None or key[0] <= end_turn)]
+		with open(self.fname, 'rb') as f:
+			for key in keys:
+				yield key[0], key[1], self.__read(f, self.positions[key])
+
+	def __iter__(self):
+		return self.frames()
@@ -49,9 +49,10 @@ algo3
 ...
 
 
-Lastly, the final argument you can (and should) in combination with each of these
-is -b, for batch_size. This controls how many games can run at one time to keep
-this from melting your computer. The default is 5.
+Lastly, you can use -b, for batch_size, in combination with each of these. This controls
+how many games can run at one time to keep this from melting your computer. By default it
+is picked from the number of cores (about two busy processes per game) and, on Linux, the
+available memory (about 1GB per game).
 
 For example:
 >py scripts/contributions/run_arena.py -a -b 6
@@ -60,6 +61,56 @@ This would run every single game like before, but 6 games at a time.
 
 DO NOT RUN WITH A LARGE BATCH SIZE (like >15, depending on your computer) or else it will take forever and crash.
 
+The engine is started directly for each game (no shell), and a new game starts as soon as
+one finishes, so the batch is always full. Matches are printed as they finish, which is
+not always the order they were started in. Stopping the script with Ctrl+C stops the games.
+
+
+Tournament mode:
+>py scripts/contributions/run_arena.py -s algo1 algo2 algo3 -n 10
+
+Games are not deterministic when algos use random numbers (the starter algo seeds random
+differently every game), so a single game per pairing says little. With -n every pairing
+plays N games with each algo as player 1 and N with it as player 2. The games of every
+pairing are queued together so the batch stays full until the end. Once they are done a
+table shows each pairing's wins-draws-losses, the score (a draw counts as half a win), its
+95% confidence interval, and the score as player 1 and as player 2, followed by each
+algo's score over all of its games.
+
+Every game gets a seed, passed to the algos in the ALGO_SEED environment variable (the
+starter algos use it instead of a random seed when it is set). By default the seeds are
+random, so the games vary. With --seed S game i of every pairing uses seed S+i on both
+sides, so a tournament can be run again with the same seeds; add --pin_seed to use S
+for every game.
+
+The winner of each game is read from its replay in the /replays/ directory, the same way
+get_results.py does (the player with the most health left). The replay of a game is the
+oldest new replay with the game's algos once it is over.
+
+
+A/B mode:
+>py scripts/contributions/run_arena.py --ab candidate production
+
+Runs games between a candidate algo and the one it should replace, alternating sides (and
+seeds, like tournament mode), and stops as soon as the results are conclusive instead of
+playing a fixed number of games. After every game a sequential probability ratio test
+(SPRT) compares "the candidate scores --p0 or less" (default 0.5, no better) against "the
+candidate scores --p1 or more" (default 0.6). Once either is accepted, the games still
+queued are cancelled, the games already running are finished, and the decision is shown
+with the number of games saved. If neither is accepted after --max_games games (default
+200) the test is undecided.
+
+--alpha and --beta (default 0.05) are the chances of wrongly accepting --p1 and wrongly
+accepting --p0. Smaller values, or --p0 and --p1 closer together, need more games.
+
+
+Engine start up:
+Every game starts a new JVM for the engine, and the engine starts the two algos; the engine
+can only play one game per JVM, so this cannot be avoided. With --cds the first game saves
+the engine's classes in engine.jsa (JVM class data sharing) and the following games load
+them from there, which cuts part of the JVM's start up time. It needs Java 13 or newer and
+is turned off by itself when the JVM does not support it.
+
 
 At the end I also run the get_results.py script that outputs some data. I recommend having
 matplotlib installed for graphs, etc.
@@ -76,71 +127,254 @@ try:
 	import subprocess
 	import argparse
 	import itertools
+	import threading
 	import time
-	import copy
-	import multiprocessing as mp
+	import math
+	import random
+	import concurrent.futures
 except ImportError as e:
 	print("WARNING: Module not found, full error:\n")
 	print(str(e))
 	sys.exit()
 
-
-# Runs a single game
-def run_single_game(process_command, algo1, algo2, max_name_len):
-	p = subprocess.Popen(
-		process_command,
-		shell=True,
-		stdout=subprocess.PIPE,
-		stderr=subprocess.PIPE
-		)
-	output, error = p.communicate()
-	# daemon necessary so game shuts down if this script is shut down by user
-	p.daemon = 1
-	p.wait()
-	print("{: <30}{: <{fill}}   vs   {}".format('Finished running match:', algo1, algo2, fill=str(max_name_len)))
-
-	# print (''.join(['{}\n'.format(x) for x in str(output).split('\\r\\n')])[1:])
-	if str(error) != "b''":
-		print ('Error with match - {} {}:\n\tError:\n{}'.format(algo1, algo2, error))
-
-def run_match(arg1='', arg2='', max_name_len=0):
-	# Get location of this run file
-	file_dir = os.path.dirname(os.path.realpath(__file__)).replace('\\contributions', '')
-	parent_dir = os.path.join(file_dir, os.pardir)
-	parent_dir = os.path.abspath(parent_dir)
-
-	# Get if running in windows OS
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+from replay_reader import ReplayReader
+
+
+# rough memory used by one game: the engine's JVM and the two algos
+GAME_MEMORY_MB = 1024
+# the environment variable the seed of a game is passed to the algos in
+SEED_VARIABLE = 'ALGO_SEED'
+# the class data sharing archive of the engine, in the root of the starter kit
+CDS_ARCHIVE = 'engine.jsa'
+# what the JVM writes when it does not know an option
+JVM_OPTION_ERRORS = ['Unrecognized VM option', 'Could not create the Java Virtual Machine']
+# z value of the confidence intervals, 95%
+CONFIDENCE_Z = 1.96
+
+# the engine processes that are running, so they can be stopped if this script is stopped
+running_processes = set()
+running_lock = threading.Lock()
+stopping = threading.Event()
+# the replays that were already matched to a game, with the time they were claimed
+claimed_replays = {}
+# the times the running games listed the replays directory, claims older than all of them are forgotten
+replay_snapshots = []
+claimed_lock = threading.Lock()
+
+# the root of the starter kit, where engine.jar is
+def get_parent_dir():
+	file_dir = os.path.dirname(os.path.realpath(__file__))
+	return os.path.abspath(os.path.join(file_dir, os.pardir, os.pardir))
+
+# gets the run file of an algo from its folder, based on the OS
+def get_run_file(algo):
 	is_windows = sys.platform.startswith('win')
-
-	# Set default path for algos if script is run with no params
-	default_algo = parent_dir + "\\algos\\starter-algo-ZIPME\\run.ps1" if is_windows else parent_dir + "/algos/starter-algo-ZIPME/run.sh" 
-	algo1 = default_algo
-	algo2 = default_algo
-
-	# If script run with params, use those algo locations when running the game
-	if arg1 != '':
-		algo1 = arg1
-	if arg2 != '':
-		algo2 = arg2
-
-	# If folder path is given instead of run file path, add the run file to the path based on OS
+	run_file = "run.ps1" if is_windows else "run.sh"
+	if run_file in algo:
+		return algo
 	# trailing_char deals with if there is a trailing \ or / or not after the directory name
-	if is_windows:
-		if "run.ps1" not in algo1:
-			trailing_char = "" if algo1.endswith("\\") else "\\"
-			algo1 = algo1 + trailing_char + "run.ps1"
-		if "run.ps1" not in algo2:
-			trailing_char = "" if algo2.endswith("\\") else "\\"
-			algo2 = algo2 + trailing_char + "run.ps1"
-	else:
-		if "run.sh" not in algo1:
-			trailing_char = "" if algo1.endswith('/') else "/"
-			algo1 = algo1 + trailing_char + "run.sh"
-		if "run.sh" not in algo2:
-			trailing_char = "" if algo2.endswith('/') else "/"
-			algo2 = algo2 + trailing_char + "run.sh"
+	trailing_char = "" if algo.endswith("\\") or algo.endswith('/') else ("\\" if is_windows else "/")
+	return algo + trailing_char + run_file
 
-	run_single_game("cd {} && java -jar engine.jar work {} {}".format(parent_dir, algo1, algo2), algo1.split('\\')[-2].replace('algos/',''),  algo2.split('\\')[-2].replace('algos/',''), max_name_len)
+# the memory that can be used without swapping in MB, including the page cache the kernel can free, None where it is not known
+def get_available_memory():
+	try:
+		with open('/proc/meminfo') as f:
+			for line in f:
+				if line.startswith('MemAvailable:'):
+					return int(line.split()[1]) // 1024
+	except (OSError, ValueError, IndexError):
+		pass			# only Linux has /proc/meminfo, use the cores only elsewhere
+	return None
+
+# the number of games to run at once when -b is not given, based on the cores and the memory available
+def get_auto_batch_size():
+	cores = os.cpu_count() or 1
+	# each game has the engine and two algos taking turns, about two busy processes
+	batch_size = max(1, cores // 2)
+	available_mb = get_available_memory()
+	if available_mb is not None:
+		batch_size = min(batch_size, max(1, available_mb // GAME_MEMORY_MB))
+	return batch_size
+
+# the path of an algo from the root of the starter kit: algos are looked for in the /algos/ directory, unless the path exists
+# raises a ValueError for algos outside of the starter kit, once links and '..' are resolved
+def get_algo_path(algo):
+	root = get_parent_dir()
+	path = algo if os.path.exists(os.path.join(root, algo)) else 'algos/{}'.format(algo)
+	real_path = os.path.realpath(os.path.join(root, path))
+	if os.path.commonpath([real_path, os.path.realpath(root)]) != os.path.realpath(root):
+		raise ValueError('{} is not in the starter kit'.format(algo))
+	return path
+
+# the name the engine gives an algo in the replay, the name of its folder
+def get_algo_name(algo):
+	return os.path.basename(os.path.dirname(get_run_file(algo)))
+
+# the names of the replays in the /replays/ directory
+def list_replays():
+	try:
+		return set(x for x in os.listdir(os.path.join(get_parent_dir(), 'replays')) if x.endswith('.replay'))
+	except OSError:
+		return set()
+
+# finds the replay a game between algo1 and algo2 wrote, among the replays that were not in before when it started
+# returns None if there is none
+def find_replay(algo1, algo2, before):
+	replays_dir = os.path.join(get_parent_dir(), 'replays')
+	names = (get_algo_name(algo1), get_algo_name(algo2))
+	candidates = []
+	for replay in list_replays() - before:
+		replay = os.path.join(replays_dir, replay)
+		try:
+			candidates.append((os.path.getmtime(replay), replay))
+		except OSError:
+			continue
+
+	# when the same pairing runs more than once at a time, the oldest of its replays is taken
+	for mtime, replay in sorted(candidates):
+		with claimed_lock:
+			if replay in claimed_replays:
+				continue
+		try:
+			reader = ReplayReader(replay)
+		except (OSError, ValueError):
+			continue
+		if not reader.is_complete():
+			continue
+		end_stats = reader.end_stats
+		if (end_stats['player1'].get('name'), end_stats['player2'].get('name')) == names:
+			# the lock is only held to claim the replay, another game of the same pairing may have taken it meanwhile
+			with claimed_lock:
+				if replay in claimed_replays:
+					continue
+				claimed_replays[replay] = time.monotonic()
+			return reader
+	return None
+
+# the winner of a replay, 1 or 2, 0 for a draw, the same way get_results.py decides it
+def get_winner(reader):
+	p1_health = reader.healths[0][-1]
+	p2_health = reader.healths[1][-1]
+	if p1_health is None or p2_health is None:
+		return None
+	if p1_health > p2_health:
+		return 1
+	if p2_health > p1_health:
+		return 2
+	return 0
+
+# JVM class data sharing: the first game saves the classes the engine loads in an archive, which the next games map
+# instead of loading and verifying them again, so the JVM starts faster. It needs Java 13 or newer, and is turned
+# off the first time the JVM refuses the options.
+class ClassDataSharing:
+	def __init__(self, archive=None):
+		self.archive = archive if archive is not None else os.path.join(get_parent_dir(), CDS_ARCHIVE)
+		self.enabled = True
+		self.creating = False
+		self.lock = threading.Lock()
+
+	# the java options of the next game
+	def get_options(self):
+		with self.lock:
+			if not self.enabled:
+				return []
+			# the archive is only put in place once the game writing it is over
+			if os.path.exists(self.archive):
+				return ['-XX:SharedArchiveFile={}'.format(self.archive)]
+			if self.creating:
+				return []			# only one game writes the archive
+			self.creating = True
+			return ['-XX:ArchiveClassesAtExit={}'.format(self.get_temp_archive())]
+
+	# where the archive is written before it is complete, other runs of the script write their own
+	def get_temp_archive(self):
+		return '{}.{}.tmp'.format(self.archive, os.getpid())
+
+	# checks the result of a game played with the options, returns True if the JVM refused them
+	def failed(self, result, options):
+		with self.lock:
+			if any(x.startswith('-XX:ArchiveClassesAtExit=') for x in options):
+				self.creating = False
+				temp_archive = self.get_temp_archive()
+				if os.path.exists(temp_archive):
+					if result['returncode'] == 0:
+						os.replace(temp_archive, self.archive)
+					else:
+						os.remove(temp_archive)		# the JVM may not have finished writing it
+			if result['returncode'] is not None and result['returncode'] != 0 and any(x in result['error'] for x in JVM_OPTION_ERRORS):
+				self.enabled = False
+				print ('Class data sharing is not supported by this java, turning it off')
+				return True
+		return False
+
+# Runs a single game, starting the engine directly, and returns its result once it is finished
+def run_single_game(algo1, algo2, seed=None, cds=None):
+	result = {'algo1': algo1, 'algo2': algo2, 'seed': seed, 'returncode': None, 'output': '', 'error': 'Cancelled', 'time': 0, 'replay': None, 'winner': None}
+	try:
+		path1, path2 = get_algo_path(algo1), get_algo_path(algo2)
+	except ValueError as e:
+		result['error'] = str(e)
+		return result
+	java_options = cds.get_options() if cds is not None else []
+	command = ['java'] + java_options + ['-jar', 'engine.jar', 'work', get_run_file(path1), get_run_file(path2)]
+	env = None
+	if seed is not None:
+		env = dict(os.environ)
+		env[SEED_VARIABLE] = str(seed)
+
+	snapshot_time, before = take_replay_snapshot()
+	try:
+		start = time.time()
+		with running_lock:
+			if stopping.is_set():
+				if len(java_options) > 0:
+					cds.failed(result, java_options)
+				return result
+			p = subprocess.Popen(command, cwd=get_parent_dir(), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+			running_processes.add(p)
+		try:
+			output, error = p.communicate()
+		finally:
+			with running_lock:
+				running_processes.discard(p)
+		result.update({'returncode': p.returncode, 'output': output.decode('utf-8', 'replace'),
+			'error': error.decode('utf-8', 'replace'), 'time': time.time() - start})
+
+		if len(java_options) > 0 and cds.failed(result, java_options):
+			return run_single_game(algo1, algo2, seed)
+
+		reader = find_replay(path1, path2, before)
+		if reader is not None:
+			result['replay'] = reader.fname
+			result['winner'] = get_winner(reader)
+	finally:
+		release_replay_snapshot(snapshot_time)
+	return result
+
+# lists the replays directory for a game about to start, returns the time of the listing and the names
+def take_replay_snapshot():
+	with claimed_lock:
+		snapshot_time = time.monotonic()
+		replay_snapshots.append(snapshot_time)
+	return snapshot_time, list_replays()
+
+# called once the game that took a snapshot is over
+def release_replay_snapshot(snapshot_time):
+	with claimed_lock:
+		replay_snapshots.remove(snapshot_time)
+		# a replay claimed before every running game listed the directory is in all of their listings already
+		oldest = min(replay_snapshots) if len(replay_snapshots) > 0 else float('inf')
+		for replay in [x for x, claim_time in claimed_replays.items() if claim_time < oldest]:
+			del claimed_replays[replay]
+
+# stops every game that is still running
+def stop_running_games():
+	stopping.set()
+	with running_lock:
+		for p in running_processes:
+			p.kill()
 
 # handles all the arguments
 def parse_args():
@@ -162,14 +396,63 @@ def parse_args():
 	ap.add_argument(
 		"-b", "--batch",
 		type=int,
-		default=5,
-		help="number of games to run at a single time (on seperate threads)\n\n")
+		default=None,
+		help="number of games to run at a single time, by default based on the cores and memory available\n\n")
+	ap.add_argument(
+		"-n", "--games",
+		type=int,
+		default=None,
+		help="tournament mode, every pairing plays this many games with each side assignment\n\n")
+	ap.add_argument(
+		"--seed",
+		type=int,
+		default=None,
+		help="seed of the first game of every pairing in tournament and A/B mode, game i uses seed+i (random by default)\n\n")
+	ap.add_argument(
+		"--pin_seed",
+		action='store_true',
+		help="use the --seed seed for every game in tournament and A/B mode\n\n")
+	ap.add_argument(
+		"--ab",
+		nargs=2,
+		default=None,
+		metavar=('CANDIDATE', 'BASELINE'),
+		help="A/B mode, plays the candidate against the baseline until a sequential test decides which is better\n\n")
+	ap.add_argument(
+		"--max_games",
+		type=int,
+		default=200,
+		help="most games to play in A/B mode\n\n")
+	ap.add_argument(
+		"--p0",
+		type=float,
+		default=0.5,
+		help="score of the candidate that means it is not better, in A/B mode\n\n")
+	ap.add_argument(
+		"--p1",
+		type=float,
+		default=0.6,
+		help="score of the candidate that means it is better, in A/B mode\n\n")
+	ap.add_argument(
+		"--alpha",
+		type=float,
+		default=0.05,
+		help="chance of wrongly deciding the candidate is better, in A/B mode\n\n")
+	ap.add_argument(
+		"--beta",
+		type=float,
+		default=0.05,
+		help="chance of wrongly deciding the candidate is not better, in A/B mode\n\n")
+	ap.add_argument(
+		"--cds",
+		action='store_true',
+		help="use JVM class data sharing to start the engine faster (Java 13 or newer)\n\n")
 	return vars(ap.parse_args())
 
 # called by the -a arg, runs every algo in directory
 def run_all():
-	algos_dir = os.path.dirname(os.path.realpath(__file__)).replace('scripts\\contributions', '')+'algos\\'
-	algos = os.listdir(algos_dir)
+	algos_dir = os.path.join(get_parent_dir(), 'algos')
+	algos = sorted(x for x in os.listdir(algos_dir) if os.path.isdir(os.path.join(algos_dir, x)))
 	matches = itertools.combinations(algos, 2)
 	return matches
 
@@ -188,47 +471,184 @@ def run_from_file(filePath):
 		print ('File {} was not found'.format(filePath))
 		sys.exit()
 
-# returns the number of processess that are active
-def get_num_running(processes):
-	c = 0
-	for i, proc in processes.items():
-		if proc.is_alive():
-			c += 1
-	return c
-
-# starts a subprocess for each match up to batch_size and then starts them as they finish
-def run_matches(matches, batch_size):
-	tmp = copy.deepcopy(matches)
-	max_name_len = len(max(tmp, key=lambda e:len(e[0]))[0])
+# called by the -n arg, turns the pairings into games games with each side assignment, as (algo1, algo2, seed) tuples
+def get_tournament_matches(pairings, games, seed=None, pin_seed=False):
+	pairings = list(pairings)
+	matches = []
+	# game i of every pairing is queued before game i+1 of any, so results come in for every pairing as the tournament goes
+	for i in range(games):
+		for algo1, algo2 in pairings:
+			if seed is None:
+				game_seed = random.randrange(2**31)
+			else:
+				game_seed = seed if pin_seed else seed + i
+			# both side assignments of a game use the same seed
+			matches.append((algo1, algo2, game_seed))
+			matches.append((algo2, algo1, game_seed))
+	return matches
 
-	algos = []
-	processes = {}
-	i = 0
-	for match in matches:
-		algos.append((match[0],match[1]))
-		algo1 = 'algos/{}'.format(match[0])
-		algo2 = 'algos/{}'.format(match[1])
-		processes[i] = mp.Process(target=run_match, args=(algo1, algo2, max_name_len))
-		i += 1
-
-	for i in range(len(processes)):
-		print ('{: <30}{: <{fill}}   vs   {}'.format('Starting match:', algos[i][0], algos[i][1], fill=str(max_name_len)))
-		processes[i].start()
-		i += 1
-		while get_num_running(processes) >= batch_size:
-			time.sleep(.1)
-
-	while get_num_running(processes) > 0:
-			time.sleep(.1)
+# runs the matches on a pool of batch_size workers, each waiting on one engine process, and yields the results as games finish
+# stop is called with every result, once it returns True the matches that did not start yet are cancelled
+# cds is a ClassDataSharing shared by the games, or None
+def run_matches(matches, batch_size=None, stop=None, cds=None):
+	matches = list(matches)
+	if len(matches) == 0:
+		return
+	if batch_size is None or batch_size < 1:
+		batch_size = get_auto_batch_size()
+	max_name_len = len(max(matches, key=lambda e:len(e[0]))[0])
+	print ('Running {} matches, {} at a time'.format(len(matches), batch_size))
+
+	with concurrent.futures.ThreadPoolExecutor(max_workers=batch_size) as pool:
+		futures = {}
+		for match in matches:
+			futures[pool.submit(run_single_game, *match, cds=cds)] = match
+		stopped = False
+		try:
+			for future in concurrent.futures.as_completed(futures):
+				if future.cancelled():
+					continue
+				result = future.result()
+				winner = {1: '  - winner: ' + result['algo1'], 2: '  - winner: ' + result['algo2'], 0: '  - draw'}.get(result['winner'], '')
+				print ("{: <30}{: <{fill}}   vs   {}  ({:.1f}s){}".format('Finished running match:', result['algo1'], result['algo2'], result['time'], winner, fill=str(max_name_len)))
+				if result['returncode'] != 0 or result['error'] != '':
+					print ('Error with match - {} {}:\n\tError:\n{}'.format(result['algo1'], result['algo2'], result['error']))
+				if stop is not None and not stopped and stop(result):
+					stopped = True
+					cancelled = len([x for x in futures if x.cancel()])
+					print ('Stopping early: cancelled {} queued matches, waiting for the running ones'.format(cancelled))
+				yield result
+		except KeyboardInterrupt:
+			# daemon-like behaviour: the games shut down if this script is shut down by the user
+			for future in futures:
+				future.cancel()
+			stop_running_games()
+			raise
 
 	print ()
 	print ('Finished all matches!')
 	print ()
 
+# the Wilson score interval of a score out of games
+def get_confidence_interval(score, games, z=CONFIDENCE_Z):
+	if games == 0:
+		return 0.0, 1.0
+	p = score / games
+	denominator = 1 + z*z / games
+	centre = (p + z*z / (2*games)) / denominator
+	margin = z * math.sqrt(p*(1-p) / games + z*z / (4*games*games)) / denominator
+	return max(0.0, centre - margin), min(1.0, centre + margin)
+
+# the score of algo in the results, wins count 1 and draws 0.5, along with the number of games
+def get_score(results, algo, side=None):
+	score = 0.0
+	games = 0
+	for result in results:
+		if result['winner'] is None:
+			continue
+		if (side is None or side == 1) and result['algo1'] == algo:
+			player = 1
+		elif (side is None or side == 2) and result['algo2'] == algo:
+			player = 2
+		else:
+			continue
+		games += 1
+		score += 1.0 if result['winner'] == player else (0.5 if result['winner'] == 0 else 0.0)
+	return score, games
+
+def format_score(score, games):
+	if games == 0:
+		return '-'
+	low, high = get_confidence_interval(score, games)
+	return '{:5.1f}% [{:5.1f}%, {:5.1f}%]'.format(100 * score / games, 100 * low, 100 * high)
+
+# sequential probability ratio test of the score of candidate, game by game
+class SPRT:
+	def __init__(self, candidate, p0=0.5, p1=0.6, alpha=0.05, beta=0.05):
+		self.candidate = candidate
+		self.p0 = p0
+		self.p1 = p1
+		self.alpha = alpha
+		self.beta = beta
+		self.lower = math.log(beta / (1 - alpha))		# p0 is accepted below this
+		self.upper = math.log((1 - beta) / alpha)		# p1 is accepted above this
+		self.llr = 0.0									# log likelihood ratio of p1 against p0
+		self.score = 0.0
+		self.games = 0
+		self.decision = None							# 'p0' or 'p1' once decided
+
+	# adds a result, returns True once the test is decided
+	def update(self, result):
+		if self.decision is not None:
+			return True
+		score, games = get_score([result], self.candidate)
+		if games == 0:
+			return False
+		self.score += score
+		self.games += games
+		# a draw counts as half a win, and half a loss
+		self.llr += score * math.log(self.p1 / self.p0) + (1 - score) * math.log((1 - self.p1) / (1 - self.p0))
+		if self.llr >= self.upper:
+			self.decision = 'p1'
+		elif self.llr <= self.lower:
+			self.decision = 'p0'
+		return self.decision is not None
+
+# runs the A/B games between candidate and baseline until the SPRT decides, or max_games games are played
+def run_ab_test(candidate, baseline, max_games, batch_size=None, seed=None, pin_seed=False, p0=0.5, p1=0.6, alpha=0.05, beta=0.05, cds=None):
+	test = SPRT(candidate, p0, p1, alpha, beta)
+	matches = get_tournament_matches([(candidate, baseline)], (max_games + 1) // 2, seed, pin_seed)[:max_games]
+	results = list(run_matches(matches, batch_size, test.update, cds))
+	print_ab_test(test, baseline, len(matches), len(results))
+	return results
+
+def print_ab_test(test, baseline, planned, played):
+	print ('SPRT: {} scores <= {} against >= {}, alpha {}, beta {}'.format(test.candidate, test.p0, test.p1, test.alpha, test.beta))
+	if test.decision == 'p1':
+		print ('Decision: {} is better than {} (score >= {} accepted)'.format(test.candidate, baseline, test.p1))
+	elif test.decision == 'p0':
+		print ('Decision: {} is not better than {} (score <= {} accepted)'.format(test.candidate, baseline, test.p0))
+	else:
+		print ('Decision: none, the test is undecided after {} games'.format(test.games))
+	print ('LLR: {:.2f} (bounds {:.2f}, {:.2f}) after {} games'.format(test.llr, test.lower, test.upper, test.games))
+	print ('Score of {}: {}'.format(test.candidate, format_score(test.score, test.games)))
+	print ('Games played: {} of {} planned, {} saved'.format(played, planned, planned - played))
+	print ()
+
+# prints the results of a tournament for every pairing and every algo
+def print_tournament(results, pairings):
+	pairings = list(pairings)
+	algos = []
+	for pairing in pairings:
+		algos += [x for x in pairing if x not in algos]
+	fill = max([len(x) for x in algos] + [len('opponent')]) + 2
+	unknown = len([x for x in results if x['winner'] is None])
+
+	print ('Tournament results ({:.0f}% confidence intervals):'.format(100 * (math.erf(CONFIDENCE_Z / math.sqrt(2)))))
+	if unknown > 0:
+		print ('{} games had no result (errors or replays that could not be found) and are not counted'.format(unknown))
+	print ()
+	print ('{: <{fill}}{: <{fill}}{: >6}  {: <10}{: <26}{: <26}{}'.format('algo', 'opponent', 'games', 'W-D-L', 'score', 'as player 1', 'as player 2', fill=fill))
+	for algo1, algo2 in pairings:
+		pairing_results = [x for x in results if {x['algo1'], x['algo2']} == {algo1, algo2}]
+		score, games = get_score(pairing_results, algo1)
+		wins = len([x for x in pairing_results if (x['winner'], x['algo1']) in ((1, algo1), (2, algo2))])
+		draws = len([x for x in pairing_results if x['winner'] == 0])
+		print ('{: <{fill}}{: <{fill}}{: >6}  {: <10}{: <26}{: <26}{}'.format(algo1, algo2, games, '{}-{}-{}'.format(wins, draws, games - wins - draws),
+			format_score(score, games), format_score(*get_score(pairing_results, algo1, 1)), format_score(*get_score(pairing_results, algo1, 2)), fill=fill))
+	print ()
+	print ('{: <{fill}}{: >6}  {}'.format('algo', 'games', 'score', fill=fill))
+	for algo in sorted(algos, key=lambda x: -get_score(results, x)[0] / max(1, get_score(results, x)[1])):
+		score, games = get_score(results, algo)
+		print ('{: <{fill}}{: >6}  {}'.format(algo, games, format_score(score, games), fill=fill))
+	print ()
+
 if __name__ == '__main__':
 	args = parse_args() # get command line arguments
 
-	if args['all']:
+	if args['ab'] is not None:
+		matches = []
+	elif args['all']:
 		print ('Running all algos')
 		matches = run_all()
 	elif len(args['specific']) > 0:
@@ -239,8 +659,20 @@ if __name__ == '__main__':
 		print ('No arguments - no action taken')
 		sys.exit()
 
-	tmp = copy.deepcopy(matches)
-	run_matches(matches, args['batch'])		# run all matches
+	matches = list(matches)
+	pairings = matches
+	cds = ClassDataSharing() if args['cds'] else None
+	if args['ab'] is not None:
+		candidate, baseline = args['ab']
+		results = run_ab_test(candidate, baseline, args['max_games'], args['batch'], args['seed'], args['pin_seed'],
+			args['p0'], args['p1'], args['alpha'], args['beta'], cds)
+	else:
+		if args['games'] is not None:
+			matches = get_tournament_matches(pairings, args['games'], args['seed'], args['pin_seed'])
+		results = list(run_matches(matches, args['batch'], cds=cds))		# run all matches
+
+		if args['games'] is not None:
+			print_tournament(results, pairings)
 
 	# if get_results is avalible, run a summary of the matches played
 	try:
@@ -249,7 +681,12 @@ if __name__ == '__main__':
 					'averages':	[], 				\
 					'file':		[],					\
 					'graph':	['wins'],	\
-					'num':		len(list(tmp))		\
+					'num':		len(results),		\
+					'jobs':		os.cpu_count() or 1,	\
+					'no_cache':	False,				\
+					'ratings':	False,				\
+					'reset_ratings':	False,		\
+					'ratings_file':	None			\
 				}
 		from get_results import main
 		main(args)
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import glob
+import shutil
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+from get_results import Ratings
+
+class RatingsTests(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.replays = os.path.join(self.dir, 'replays')
+		os.mkdir(self.replays)
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	# writes a replay of a game between name1 and name2 won by winner (1, 2 or 0 for a draw), last modified mtime seconds after the epoch
+	def write_replay(self, f_name, name1, name2, winner, mtime, complete=True):
+		f_name = os.path.join(self.replays, f_name)
+		healths = {1: (30.0, 25.0), 2: (25.0, 30.0), 0: (30.0, 30.0)}[winner]
+		lines = [json.dumps({'debug': {'printMapString': False}, 'unitInformation': []})]
+		for turn in range(3):
+			for frame in [-1, 0, 1]:
+				lines.append(json.dumps({'turnInfo': [0 if frame == -1 else 1, turn, frame], 'p1Stats': [30.0, 0, 0, 0], 'p2Stats': [30.0, 0, 0, 0],
+					'p1Units': [[] for i in range(7)], 'p2Units': [[] for i in range(7)], 'events': {}}))
+		if complete:
+			lines.append(json.dumps({'turnInfo': [2, 3, 0], 'p1Stats': [healths[0], 0, 0, 0], 'p2Stats': [healths[1], 0, 0, 0],
+				'endStats': {'player1': {'name': name1}, 'player2': {'name': name2}}}))
+		with open(f_name, 'w') as f:
+			f.write('\n'.join(lines) + '\n')
+		os.utime(f_name, ns=(mtime * 10**9, mtime * 10**9))
+		return f_name
+
+	def get_replays(self):
+		return glob.glob(os.path.join(self.replays, '*.replay'))
+
+	def assertSameRatings(self, expected, ratings):
+		self.assertEqual(expected.games, ratings.games)
+		self.assertEqual(sorted(expected.ratings), sorted(ratings.ratings))
+		for name in expected.ratings:
+			for expected_value, value in zip(expected.ratings[name], ratings.ratings[name]):
+				self.assertAlmostEqual(expected_value, value)
+
+	def test_incremental_ratings(self):
+		f_name = os.path.join(self.dir, 'ratings.json')
+		self.write_replay('a.replay', 'alpha', 'beta', 1, 1)
+		self.write_replay('b.replay', 'beta', 'gamma', 2, 2)
+		self.write_replay('c.replay', 'alpha', 'gamma', 0, 3)
+		ratings = Ratings(f_name, reset=True)
+		self.assertEqual(3, ratings.update(self.get_replays()))
+		ratings.save()
+
+		self.write_replay('d.replay', 'gamma', 'alpha', 1, 4)
+		self.write_replay('e.replay', 'beta', 'alpha', 2, 5, complete=False)
+		self.write_replay('f.replay', 'beta', 'gamma', 1, 6)
+		ratings = Ratings(f_name)
+		self.assertEqual(3, ratings.games, "The ratings should be loaded from the file")
+		self.assertEqual(2, ratings.update(self.get_replays()), "Only the new replays of finished games should be rated")
+		self.assertEqual({os.path.join(self.replays, 'e.replay')}, ratings.pending)
+		ratings.save()
+		self.assertEqual(0, Ratings(f_name).update(self.get_replays()), "Rated replays should not be rated again")
+
+		# the game is over, so the replay is rated even though newer replays were rated before it
+		self.write_replay('e.replay', 'beta', 'alpha', 2, 7)
+		ratings = Ratings(f_name)
+		self.assertEqual(1, ratings.update(self.get_replays()))
+		self.assertEqual(set(), ratings.pending)
+
+		expected = Ratings(os.path.join(self.dir, 'reset.json'), reset=True)
+		expected.update(self.get_replays())
+		self.assertSameRatings(expected, ratings)
+
+	def test_pending_replays_from_another_folder(self):
+		other = os.path.join(self.dir, 'other')
+		os.mkdir(other)
+		f_name = self.write_replay('a.replay', 'alpha', 'beta', 1, 1, complete=False)
+		moved = os.path.join(other, 'a.replay')
+		os.replace(f_name, moved)
+		ratings = Ratings(os.path.join(self.dir, 'ratings.json'), reset=True)
+		self.assertEqual(0, ratings.update([os.path.relpath(moved)]))
+		self.assertEqual({moved}, ratings.pending, "Unfinished replays should be kept with their full path")
+		self.assertEqual(0, ratings.update([]))
+		self.assertEqual({moved}, ratings.pending, "Unfinished replays outside of the replays folder should not be forgotten")
+		os.remove(moved)
+		ratings.update([])
+		self.assertEqual(set(), ratings.pending, "Deleted replays should be forgotten")
+
+if __name__ == '__main__':
+	unittest.main()
@@ -34,6 +34,15 @@ You can specify which file you would like to run by:
 where REPLAY_FILE is the file you'd like to look at. You can list more than one, but it will
 NOT display more than one replay.
 
+----------------------------------------------------------------------------------------
+-t: Start at a turn
+
+You can skip straight to a turn with:
+>py scripts/contributions/watch_replay.py -t 30
+
+Frames are read from the replay file as they are shown, so long replays open just as fast.
+The first time a replay is opened, an index of its frames is saved next to it as [REPLAY_FILE].replay.idx.
+
 ----------------------------------------------------------------------------------------
 -b: Blitting
 
@@ -201,6 +210,9 @@ except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
 
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+from replay_reader import ReplayReader
+
 try:
 	import matplotlib.pyplot as plt
 	import matplotlib.animation as animation
@@ -277,6 +289,11 @@ def parse_args():
 		nargs='*',
 		default=[],
 		help="specify a replay file you'd like to watch\n\n")
+	ap.add_argument(
+		'-t', '--turn',
+		type=int,
+		default=0,
+		help="specify the turn to start watching from\n\n")
 	ap.add_argument(
 		'-b', '--blit',
 		action='store_true',
@@ -676,7 +693,7 @@ class Plot:
 
 # this class contains all information regarding the entire window
 class Graph:
-	def __init__(self, data, frames_in_turn, healths, writers, keep_trying, save='', fh=None):
+	def __init__(self, data, frames_in_turn, healths, writers, keep_trying, save='', fh=None, start_turn=0):
 
 		# pretty clear, if no data, raise an Error
 		if len(data) < 1:
@@ -695,6 +712,8 @@ class Graph:
 		self.general_init(data, frames_in_turn, healths)							# handles general initialization (called again if in real-time)
 
 		self.head = (0,-1)															# tracks the current turn, frame pair
+		if start_turn in self.frames_in_turn:
+			self.head = (start_turn, -1)											# skip straight to the requested turn
 		self.end_of_game = False													# end of game flag
 		self.is_manual = False														# stores whether the user is manually moving the slider, keyboard, etc
 		self.single_advance = False													# true when user is scrubbing, but still want to move forward one frame
@@ -1141,16 +1160,47 @@ class Frame:
 		return self.data[key]
 
 
+# a dict-like view of the frames of a replay, each frame is only read from the file when it is looked up
+class Frames:
+	cache_size = 16						# the number of recently read frames kept, since the same frames are looked up several times in a row
+
+	def __init__(self, reader):
+		self.reader = reader
+		self.cache = {}
+
+	def __getitem__(self, key):
+		turn, frame = key
+		try:
+			return self.cache[(turn, frame)]
+		except KeyError:
+			pass
+
+		data = Frame(turn, frame, self.reader.get_frame(turn, frame))		# raises a KeyError for missing frames, like a dict
+		if len(self.cache) >= self.cache_size:
+			del self.cache[next(iter(self.cache))]
+		self.cache[(turn, frame)] = data
+		return data
+
+	def __contains__(self, key):
+		return tuple(key) in self.reader.positions
+
+	def __iter__(self):
+		return iter(self.reader.keys)
+
+	def __len__(self):
+		return len(self.reader.keys)
+
+
 # Stores data from a single replay
 class Replay:
-	def __init__(self, f_name):
+	def __init__(self, f_name, reader=None):
 		self.fname = f_name 			# the file name of the replay
-		self.ref = None					# stores the raw dict data as a reference
-		self.frames = {}				# dict containing all data, keys are turn, frame tuple with Frame objects as values
+		self.reader = reader			# the ReplayReader indexing the file, reused when a replay that is still being written is loaded again
+		self.frames = None				# dict-like, keys are turn, frame tuple with Frame objects as values
 		self.frames_in_turn = {}		# number of frames in each turn
 		self.healths = ([], [])			# contains the healths for player1 and player2
 
-		self.load_data()				# handles loading all the data from file into python variables
+		self.load_data()				# indexes the replay, frames are only read when they are shown
 
 	def __eq__(self, other):
 		return self.fname == other.fname
@@ -1161,37 +1211,27 @@ class Replay:
 	def __repr__(self):
 		return self.__string()
 
-	# loads all data from a replay into the python variables
+	# the raw config of the replay, read from the file when asked for
+	@property
+	def ref(self):
+		return self.reader.get_config()
+
+	# indexes the replay, or the part of it added since it was last loaded
 	def load_data(self):
-		with open(self.fname) as f:
-			i = 0
-			for line in f:
-				line = line.replace("\n", "")
-				line = line.replace("\t", "")
-
-				if (line != ''):
-					data = json.loads(line)
-
-					try:
-						data['debug']
-						self.ref = data
-					except:
-						turn_num = data['turnInfo'][1]
-						frame_num = data['turnInfo'][2]
-						self.frames[(turn_num, frame_num)] = Frame(turn_num, frame_num, data)
-
-						self.healths[0].append(data['p1Stats'][0])
-						self.healths[1].append(data['p2Stats'][0])
-
-						try:
-							self.frames_in_turn[turn_num] += 1
-						except KeyError:
-							self.frames_in_turn[turn_num] = 1
+		if self.reader is None:
+			self.reader = ReplayReader(self.fname)
+		else:
+			self.reader.refresh()
+
+		self.frames = Frames(self.reader)
+		self.frames_in_turn = dict(self.reader.frames_in_turn)
+		self.healths = (list(self.reader.healths[0]), list(self.reader.healths[1]))
 
 # handles opening multiple games (replays)
 class FileHandler:
 	def __init__(self):
 		self.replays = []		# all of the replays loaded
+		self.readers = {}		# the ReplayReader of every file loaded so far, so loading a file again only reads what was added to it
 
 	def get_replays(self):
 		return self.replays
@@ -1218,12 +1258,17 @@ class FileHandler:
 		if len(f_names) > 0:
 			for f_name in f_names:
 				if f_name.find('replays') == -1:
-					self.replays.append(Replay('replays/'+f_name))
+					self.replays.append(self.load_replay('replays/'+f_name))
 				else:
-					self.replays.append(Replay(f_name))
+					self.replays.append(self.load_replay(f_name))
 		else:
 			for f_name in self.__latest_replays(num, a):
-				self.replays.append(Replay(f_name))
+				self.replays.append(self.load_replay(f_name))
+
+	def load_replay(self, f_name):
+		replay = Replay(f_name, self.readers.get(f_name))
+		self.readers[f_name] = replay.reader
+		return replay
 
 
 # This is all almost directly copied from run_match.py
@@ -1319,7 +1364,7 @@ def main(args):
 			try:
 				fh.load_files(1,False,args['file'])
 				replay = fh.get_last_replay()
-				animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, fh=fh)		# create our Graph object
+				animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, fh=fh, start_turn=args['turn'])		# create our Graph object
 				break
 			except RuntimeError:																		# we raised this error when data was nothing in Graph init()
 				time.sleep(.5)
@@ -1336,7 +1381,7 @@ def main(args):
 		fh.load_files(1,False,args['file'])															# load latest replay
 		replay = fh.get_last_replay()																# get latest replay
 
-		animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, save=save)		# create our Graph object
+		animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, save=save, start_turn=args['turn'])		# create our Graph object
 
 
 if __name__ == '__main__':